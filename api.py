@@ -1,17 +1,23 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import json
+import uuid
 import logging
 from datetime import datetime
 
 from config import Config
-from models import get_session, Job
-from pdf_processor import PDFProcessor
-from llm_service import LLMService
+from models import session_scope, list_jobs, find_completed_duplicate, Job
+from pdf_processor import PDFProcessor, UploadRejectedError, is_in_memory
+from llm_service import LLMService, PROVIDERS
 from github_service import GitHubService
-from validators import validate_job_id, validate_file_upload
+from cache import tiered_cache, Counters, SQLiteCache, LatencyHistogram
+from http_client import pooled_session_from_config
+from circuit_breaker import breakers_from_config
+from job_events import LocalPubSub, StreamSlots, job_channel, status_stream, sse_response
+from validators import validate_job_id, parse_list_params
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,15 +32,52 @@ def create_app():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize services
-    pdf_processor = PDFProcessor(app.config['UPLOAD_FOLDER'])
+    pdf_processor = PDFProcessor(
+        app.config['UPLOAD_FOLDER'],
+        workers=app.config['PDF_EXTRACT_WORKERS'],
+        chunk_size=app.config['PDF_EXTRACT_CHUNK_SIZE'],
+        parallel_min_pages=app.config['PDF_PARALLEL_MIN_PAGES']
+    )
     llm_service = LLMService(
-        api_key=app.config.get('GEMINI_API_KEY') or app.config.get('HUGGINGFACE_API_KEY')
+        api_key=app.config.get('GEMINI_API_KEY') or app.config.get('HUGGINGFACE_API_KEY'),
+        cache=tiered_cache(
+            app.config['CACHE_DB_PATH'], 'llm',
+            memory_size=app.config['LLM_CACHE_MEMORY_SIZE'],
+            max_entries=app.config['LLM_CACHE_MAX_ENTRIES'],
+            ttl=app.config['LLM_CACHE_TTL']
+        ),
+        http=pooled_session_from_config(app.config),
+        local_confidence_threshold=app.config['LLM_LOCAL_CONFIDENCE_THRESHOLD'],
+        tier_stats=Counters(SQLiteCache(app.config['CACHE_DB_PATH'], namespace='llm_tiers') if app.config['CACHE_DB_PATH'] else None),
+        hedge_delay=app.config['LLM_HEDGE_DELAY'],
+        latency=LatencyHistogram(Counters(SQLiteCache(app.config['CACHE_DB_PATH'], namespace='llm_latency') if app.config['CACHE_DB_PATH'] else None)),
+        breakers=breakers_from_config(app.config, PROVIDERS, app.config['CACHE_DB_PATH'])
+    )
+    github_service = GitHubService(
+        token=app.config.get('GITHUB_TOKEN'),
+        http_cache=tiered_cache(
+            app.config['CACHE_DB_PATH'], 'github_http',
+            memory_size=app.config['GITHUB_CACHE_MEMORY_SIZE'],
+            max_entries=app.config['GITHUB_CACHE_MAX_ENTRIES'],
+            ttl=app.config['GITHUB_CACHE_TTL']
+        ),
+        cache_fresh_seconds=app.config['GITHUB_CACHE_FRESH_SECONDS'],
+        org_cache=tiered_cache(app.config['CACHE_DB_PATH'], 'github_orgs', ttl=app.config['GITHUB_ORG_CACHE_TTL']),
+        org_ttl=app.config['GITHUB_ORG_CACHE_TTL'],
+        org_negative_ttl=app.config['GITHUB_ORG_NEGATIVE_TTL'],
+        http=pooled_session_from_config(app.config),
+        member_concurrency=app.config['GITHUB_MEMBERS_CONCURRENCY'],
+        breaker=breakers_from_config(app.config, ['github'], app.config['CACHE_DB_PATH'])['github']
     )
-    github_service = GitHubService(token=app.config.get('GITHUB_TOKEN'))
+    # Jobs run inside this process, so status streams only need in-process channels
+    job_events = LocalPubSub()
+    app.extensions['job_events'] = job_events
+    # Open streams each hold a server thread; past the cap, clients poll through reconnects
+    stream_slots = StreamSlots(app.config['STATUS_STREAM_MAX'])
+    app.extensions['stream_slots'] = stream_slots
     
-    def allowed_file(filename):
-        return '.' in filename and \
-               filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    def publish_status(job_id, status):
+        job_events.publish(job_channel(job_id), {'job_id': job_id, 'status': status})
     
     @app.route('/')
     def index():
@@ -44,70 +87,108 @@ def create_app():
     def health_check():
         return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
     
+    @app.route('/api/stats', methods=['GET'])
+    def stats():
+        """Cache hit/miss counters"""
+        return jsonify({
+            'llm_cache': llm_service.cache_stats(),
+            'llm_tiers': llm_service.tier_breakdown(),
+            'llm_latency': llm_service.latency_stats(),
+            'github_cache': github_service.cache_stats(),
+            'breakers': {**llm_service.breaker_status(), **github_service.breaker_status()}
+        }), 200
+    
     @app.route('/api/documents/upload', methods=['POST'])
     def upload_document():
         """Upload a PDF document for processing"""
         try:
-            # Validate file upload
-            validation_errors = validate_file_upload(request)
-            if validation_errors:
-                return jsonify({'error': validation_errors[0]}), 400
-            
-            file = request.files['file']
-            
-            # Create new job
-            session = get_session()
-            job = Job(
-                pdf_filename=secure_filename(file.filename or ""),
-                status='pending'
-            )
-            session.add(job)
-            session.commit()
-            
-            # Save file
-            filename = f"{job.job_id}_{secure_filename(file.filename or '')}"
-            file_path = pdf_processor.save_uploaded_file(file, filename)
-            
-            # Store job info before processing
-            job_id = job.job_id
-            
-            # Process synchronously for now (will make async later)
+            # Stream the body in, checking name, pdf header and size on the way;
+            # a rejected upload never gets a job row. Small pdfs stay in memory
+            # (processing happens right here), larger ones are spooled to disk
+            job_id = str(uuid.uuid4())
             try:
-                # Update status to processing
-                setattr(job, "status", "processing")
+                filename, source, content_hash = pdf_processor.ingest_multipart(
+                    request.stream, request.mimetype_params.get('boundary'),
+                    lambda name: f"{job_id}_{secure_filename(name)}",
+                    max_bytes=app.config['MAX_CONTENT_LENGTH'],
+                    in_memory_max=app.config['PDF_IN_MEMORY_MAX_BYTES']
+                )
+            except UploadRejectedError as e:
+                return jsonify({'error': str(e)}), e.status_code
+            
+            with session_scope() as session:
+                # Create new job
+                job = Job(
+                    job_id=job_id,
+                    pdf_filename=secure_filename(filename),
+                    content_hash=content_hash,
+                    status='pending'
+                )
+                session.add(job)
                 session.commit()
                 
-                # Extract text from PDF
-                pdf_text = pdf_processor.process_pdf(file_path)
-                
-                # Extract company name using LLM
-                company_name = llm_service.extract_company_name(pdf_text)
+                # Reuse the results of an identical, recently completed upload
+                duplicate = find_completed_duplicate(
+                    session, content_hash, app.config['DEDUP_MAX_AGE_SECONDS']
+                )
+                if duplicate is not None:
+                    job.copy_results_from(duplicate)
+                    session.commit()
+                    if not is_in_memory(source):
+                        pdf_processor.remove_file(source)
+                    logger.info(f"Job {job_id} reused results of job {duplicate.job_id}")
+                    return jsonify({
+                        'job_id': job_id,
+                        'status': 'completed',
+                        'deduplicated_from': duplicate.job_id,
+                        'message': 'File uploaded successfully. Results reused from an identical document.'
+                    }), 201
                 
-                if company_name:
-                    setattr(job, "company_name", company_name)
+                # Process synchronously for now (will make async later)
+                try:
+                    # Update status to processing
+                    setattr(job, "status", "processing")
+                    session.commit()
+                    publish_status(job_id, 'processing')
                     
-                    # Get GitHub organization info
-                    org_info = github_service.get_organization_info(company_name)
-                    if org_info:
-                        setattr(job, "github_org_data", json.dumps(org_info))
+                    # Extract text from PDF
+                    pdf_text = pdf_processor.process_pdf(
+                        source, max_chars=app.config.get('PDF_TEXT_MAX_CHARS')
+                    )
+                    
+                    # Extract company name using LLM
+                    company_name = llm_service.extract_company_name(pdf_text)
+                    degraded = llm_service.degraded()
+                    
+                    if company_name:
+                        setattr(job, "company_name", company_name)
                         
-                        # Get organization members
-                        members = github_service.get_organization_members(company_name)
-                        setattr(job, "github_members", json.dumps(members))
-                
-                setattr(job, "status", "completed")
-                session.commit()
-                
-            except Exception as e:
-                logger.error(f"Error processing job {job.job_id}: {str(e)}")
-                setattr(job, "status", "failed")
-                setattr(job, "error_message", str(e))
-                session.commit()
-                
-            # Get the final status before closing session
-            status = job.status
-            
-            session.close()
+                        # Get GitHub organization info and members concurrently
+                        enrichment = github_service.enrich(
+                            company_name,
+                            info_timeout=app.config['GITHUB_INFO_TIMEOUT'],
+                            members_timeout=app.config['GITHUB_MEMBERS_TIMEOUT']
+                        )
+                        if enrichment['org_info']:
+                            setattr(job, "github_org_data", json.dumps(enrichment['org_info']))
+                            job.set_members(enrichment['members'])
+                        degraded = degraded or github_service.degraded(enrichment)
+                    
+                    # Partial results are kept for this job but never reused by dedup
+                    setattr(job, "degraded", 1 if degraded else 0)
+                    setattr(job, "status", "completed")
+                    session.commit()
+                    publish_status(job_id, 'completed')
+                    
+                except Exception as e:
+                    logger.error(f"Error processing job {job.job_id}: {str(e)}")
+                    setattr(job, "status", "failed")
+                    setattr(job, "error_message", str(e))
+                    session.commit()
+                    publish_status(job_id, 'failed')
+                    
+                # Get the final status before closing session
+                status = job.status
             
             return jsonify({
                 'job_id': job_id,
@@ -115,92 +196,125 @@ def create_app():
                 'message': 'File uploaded successfully. Processing started.'
             }), 201
             
+        except RequestEntityTooLarge:
+            raise
         except Exception as e:
             logger.error(f"Upload error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
     
+    def job_status(job):
+        """status payload for job, as served by the status endpoints"""
+        response = {
+            'job_id': job.job_id,
+            'status': job.status,
+            'pdf_filename': job.pdf_filename,
+            'timestamp': job.timestamp.isoformat() if getattr(job, "timestamp", None) is not None else None
+        }
+
+        if getattr(job, "status", None) == 'completed':
+            response['company_name'] = job.company_name
+
+            github_org_data = getattr(job, "github_org_data", None)
+            if github_org_data is not None and isinstance(github_org_data, str):
+                response['github_org_data'] = json.loads(github_org_data)
+            else:
+                response['github_org_data'] = None
+
+            github_members = getattr(job, "github_members", None)
+            if github_members is not None and isinstance(github_members, str):
+                members_list = json.loads(github_members)
+                response['github_members'] = members_list
+                response['members_count'] = len(members_list)
+            else:
+                response['github_members'] = None
+                response['members_count'] = 0
+
+        elif getattr(job, "status", None) == 'failed':
+            response['error_message'] = job.error_message
+        return response
+    
     @app.route('/api/documents/status/<job_id>', methods=['GET'])
     @validate_job_id
     def get_job_status(job_id):
         """Get the status of a processing job"""
         try:
-            session = get_session()
-            job = session.query(Job).filter_by(job_id=job_id).first()
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
             
-            if not job:
-                return jsonify({'error': 'Job not found'}), 404
+                if not job:
+                    return jsonify({'error': 'Job not found'}), 404
             
-            response = {
-                'job_id': job.job_id,
-                'status': job.status,
-                'pdf_filename': job.pdf_filename,
-                'timestamp': job.timestamp.isoformat() if getattr(job, "timestamp", None) is not None else None
-            }
-
-            if getattr(job, "status", None) == 'completed':
-                response['company_name'] = job.company_name
-
-                github_org_data = getattr(job, "github_org_data", None)
-                if github_org_data is not None and isinstance(github_org_data, str):
-                    response['github_org_data'] = json.loads(github_org_data)
-                else:
-                    response['github_org_data'] = None
-
-                github_members = getattr(job, "github_members", None)
-                if github_members is not None and isinstance(github_members, str):
-                    members_list = json.loads(github_members)
-                    response['github_members'] = members_list
-                    response['members_count'] = len(members_list)
-                else:
-                    response['github_members'] = None
-                    response['members_count'] = 0
-
-            elif getattr(job, "status", None) == 'failed':
-                response['error_message'] = job.error_message
-            
-            session.close()
-            return jsonify(response), 200
+                return jsonify(job_status(job)), 200
             
         except Exception as e:
             logger.error(f"Status check error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
     
+    @app.route('/api/documents/status/<job_id>/stream', methods=['GET'])
+    @validate_job_id
+    def stream_job_status(job_id):
+        """Stream a job's status as server-sent events until it completes or fails"""
+        def load_status():
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
+                return job_status(job) if job else None
+        
+        # Subscribe before the first read so no transition slips in between
+        subscription = job_events.subscribe(job_channel(job_id))
+        try:
+            found = load_status() is not None
+        except Exception as e:
+            subscription.close()
+            logger.error(f"Status stream error: {str(e)}")
+            return jsonify({'error': 'Internal server error'}), 500
+        if not found:
+            subscription.close()
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return sse_response(status_stream(
+            load_status, subscription,
+            timeout=app.config['STATUS_STREAM_TIMEOUT'],
+            keepalive=app.config['STATUS_STREAM_KEEPALIVE'],
+            slots=stream_slots
+        ))
+    
     @app.route('/api/documents', methods=['GET'])
     def list_documents():
-        """List all processed documents"""
+        """List processed documents, newest first, one keyset page at a time"""
+        params, errors = parse_list_params(
+            request,
+            default_limit=app.config['DOCUMENTS_PAGE_SIZE'],
+            max_limit=app.config['DOCUMENTS_MAX_PAGE_SIZE']
+        )
+        if errors:
+            return jsonify({'error': errors[0]}), 400
+        
         try:
-            session = get_session()
-            jobs = session.query(Job).order_by(Job.timestamp.desc()).all()
+            with session_scope() as session:
+                rows, next_cursor = list_jobs(session, **params)
             
             documents = []
-            for job in jobs:
-                doc = {
-                    'job_id': job.job_id,
-                    'pdf_filename': job.pdf_filename,
-                    'status': job.status,
-                    'timestamp': job.timestamp.isoformat() if getattr(job, "timestamp", None) is not None else None,
-                    'company_name': job.company_name
-                }
-                
-                github_members = getattr(job, "github_members", None)
-                if github_members is not None and isinstance(github_members, str):
-                    members_list = json.loads(github_members)
-                    doc['members_count'] = len(members_list)
-                else:
-                    doc['members_count'] = 0
-
-                documents.append(doc)
+            for row in rows:
+                documents.append({
+                    'job_id': row.job_id,
+                    'pdf_filename': row.pdf_filename,
+                    'status': row.status,
+                    'timestamp': row.timestamp.isoformat() if row.timestamp is not None else None,
+                    'company_name': row.company_name,
+                    'members_count': row.members_count or 0
+                })
             
-            session.close()
-            return jsonify({'documents': documents}), 200
+            return jsonify({'documents': documents, 'next_cursor': next_cursor}), 200
             
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logger.error(f"List documents error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
     
     @app.errorhandler(413)
     def request_entity_too_large(error):
-        return jsonify({'error': 'File too large. Maximum size is 16MB'}), 413
+        return jsonify({'error': f"File too large. Maximum size is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"}), 413
     
     return app
 
@@ -1,23 +1,42 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Request, current_app, request, jsonify, render_template
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from celery import group
 import os
 import json
+import uuid
 import logging
 from datetime import datetime
 
 from config import Config
-from models import get_session, Job
-from pdf_processor import PDFProcessor
-from tasks import process_pdf_async, get_task_status
-from validators import validate_job_id, validate_file_upload
+from models import session_scope, list_jobs, find_completed_duplicate, find_completed_duplicates, batch_summary, Job
+from pdf_processor import (
+    PDFProcessor, UploadRejectedError, FileTooLargeError, NotAPDFError, iter_pdf_uploads, iter_multipart_files
+)
+from tasks import schedule_processing, processing_signature, resume_signature
+from cache import MISS, LRUCache, tiered_cache, SQLiteCache, Counters, LatencyHistogram
+from llm_service import tier_fractions, PROVIDERS
+from circuit_breaker import breakers_from_config
+from job_events import StreamSlots, pubsub_from_config, job_channel, status_stream, sse_response
+from validators import validate_job_id, validate_batch_id, parse_list_params
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class UploadRequest(Request):
+    """request whose body limit is BULK_MAX_CONTENT_LENGTH on the bulk endpoint"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'upload_bulk':
+            return current_app.config['BULK_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
 def create_async_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(Config)
     CORS(app)
     
@@ -25,11 +44,29 @@ def create_async_app():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize services
-    pdf_processor = PDFProcessor(app.config['UPLOAD_FOLDER'])
-    
-    def allowed_file(filename):
-        return '.' in filename and \
-               filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    pdf_processor = PDFProcessor(
+        app.config['UPLOAD_FOLDER'],
+        workers=app.config['PDF_EXTRACT_WORKERS'],
+        chunk_size=app.config['PDF_EXTRACT_CHUNK_SIZE'],
+        parallel_min_pages=app.config['PDF_PARALLEL_MIN_PAGES']
+    )
+    # Workers publish job status changes here; status streams wait on it
+    job_events = pubsub_from_config(app.config)
+    app.extensions['job_events'] = job_events
+    # Open streams each hold a server thread; past the cap, clients poll through reconnects
+    stream_slots = StreamSlots(app.config['STATUS_STREAM_MAX'])
+    app.extensions['stream_slots'] = stream_slots
+    status_cache = LRUCache(maxsize=app.config['STATUS_CACHE_SIZE'])
+    app.extensions['status_cache'] = status_cache
+    # Read-only views of the workers' shared counters and breakers for /api/stats
+    cache_db = app.config['CACHE_DB_PATH']
+    shared_caches = {
+        name: tiered_cache(cache_db, namespace, memory_size=0)
+        for name, namespace in (('llm_cache', 'llm'), ('github_cache', 'github_http'))
+    }
+    tier_counts = SQLiteCache(cache_db, namespace='llm_tiers') if cache_db else None
+    latency = LatencyHistogram(Counters(SQLiteCache(cache_db, namespace='llm_latency'))) if cache_db else None
+    breakers = breakers_from_config(app.config, PROVIDERS + ('github',), cache_db)
     
     @app.route('/')
     def index():
@@ -39,144 +76,443 @@ def create_async_app():
     def health_check():
         return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
     
+    @app.route('/api/stats', methods=['GET'])
+    def stats():
+        """Cache hit/miss counters accumulated by all workers"""
+        stats = {name: shared.stats() if shared.persistent else None for name, shared in shared_caches.items()}
+        if tier_counts is not None:
+            stats['llm_tiers'] = {'shared': tier_fractions(tier_counts.read_stats())}
+            stats['llm_latency'] = {'shared': latency.summary()['shared']}
+        else:
+            stats['llm_tiers'] = None
+            stats['llm_latency'] = None
+        stats['breakers'] = {name: breaker.status() for name, breaker in breakers.items()}
+        return jsonify(stats), 200
+    
     @app.route('/api/documents/upload', methods=['POST'])
     def upload_document():
         """Upload a PDF document for async processing"""
         try:
-            # Validate file upload
-            validation_errors = validate_file_upload(request)
-            if validation_errors:
-                return jsonify({'error': validation_errors[0]}), 400
-            
-            file = request.files['file']
-            
-            # Create new job
-            session = get_session()
-            if file.filename is None:
-                return jsonify({'error': 'No file selected'}), 400
-            job = Job(
-                pdf_filename=secure_filename(file.filename),
-                status='pending'
-            )
-            session.add(job)
-            session.commit()
-            
-            # Save file
-            filename = f"{job.job_id}_{secure_filename(file.filename)}"
-            file_path = pdf_processor.save_uploaded_file(file, filename)
+            # Stream the body to disk, checking name, pdf header and size on the way;
+            # a rejected upload never gets a job row
+            job_id = str(uuid.uuid4())
+            try:
+                filename, file_path, content_hash = pdf_processor.ingest_multipart(
+                    request.stream, request.mimetype_params.get('boundary'),
+                    lambda name: f"{job_id}_{secure_filename(name)}",
+                    max_bytes=app.config['MAX_CONTENT_LENGTH']
+                )
+            except UploadRejectedError as e:
+                return jsonify({'error': str(e)}), e.status_code
             
-            # Queue async task
-            task = process_pdf_async.delay(job.job_id, file_path)
-            
-            # Store task ID in job for tracking
-            job.task_id = task.id
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                # Create new job
+                job = Job(
+                    job_id=job_id,
+                    pdf_filename=secure_filename(filename),
+                    content_hash=content_hash,
+                    status='pending'
+                )
+                session.add(job)
+                session.commit()
+                
+                # Reuse the results of an identical, recently completed upload
+                duplicate = find_completed_duplicate(
+                    session, content_hash, app.config['DEDUP_MAX_AGE_SECONDS']
+                )
+                if duplicate is not None:
+                    job.copy_results_from(duplicate)
+                    session.commit()
+                    pdf_processor.remove_file(file_path)
+                    logger.info(f"Job {job_id} reused results of job {duplicate.job_id}")
+                    return jsonify({
+                        'job_id': job_id,
+                        'status': 'completed',
+                        'deduplicated_from': duplicate.job_id,
+                        'message': 'File uploaded successfully. Results reused from an identical document.'
+                    }), 201
+                
+                # Queue async task; the simulated delay is a broker countdown
+                task = schedule_processing(job_id, file_path)
+                
+                # Store task ID in job for tracking
+                job.task_id = task.id
             
             return jsonify({
-                'job_id': job.job_id,
+                'job_id': job_id,
                 'status': 'pending',
                 'message': 'File uploaded successfully. Processing queued.',
                 'task_id': task.id
             }), 201
             
+        except RequestEntityTooLarge:
+            raise
         except Exception as e:
             logger.error(f"Upload error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
 
+    @app.route('/api/documents/bulk', methods=['POST'])
+    def upload_bulk():
+        """Upload many PDFs (multipart 'files' and/or ZIP archives) as one batch"""
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return jsonify({'error': 'No files in request'}), 400
+        
+        batch_id = str(uuid.uuid4())
+        accepted = []
+        rejected = []
+        try:
+            # Stream every pdf (or archive member) straight from the request body
+            # to disk, one part at a time, before touching the database
+            files = (
+                (filename, reader)
+                for field, filename, reader in iter_multipart_files(request.stream, boundary)
+                if field in ('files', 'file')
+            )
+            for name, stream, error in iter_pdf_uploads(files):
+                filename = secure_filename(name)
+                if error is None and not filename:
+                    error = 'Invalid file name'
+                if error is None and len(accepted) >= app.config['BULK_MAX_FILES']:
+                    error = f"Too many files. Maximum is {app.config['BULK_MAX_FILES']} per batch"
+                if error:
+                    rejected.append({'filename': name, 'error': error})
+                    continue
+                
+                job_id = str(uuid.uuid4())
+                try:
+                    file_path, content_hash = pdf_processor.save_stream(
+                        stream, f"{job_id}_{filename}", max_bytes=app.config['BULK_MAX_FILE_SIZE'], require_pdf=True
+                    )
+                except FileTooLargeError:
+                    rejected.append({'filename': name, 'error': 'File too large'})
+                    continue
+                except NotAPDFError as e:
+                    rejected.append({'filename': name, 'error': str(e)})
+                    continue
+                accepted.append({
+                    'job_id': job_id,
+                    'pdf_filename': filename,
+                    'file_path': file_path,
+                    'content_hash': content_hash,
+                    'task_id': str(uuid.uuid4())
+                })
+            
+            if not accepted and not rejected:
+                return jsonify({'error': 'No files in request'}), 400
+            if not accepted:
+                return jsonify({'error': 'No PDF files accepted', 'rejected': rejected}), 400
+            
+            # All job rows, task ids included, in a single transaction
+            with session_scope() as session:
+                duplicates = find_completed_duplicates(
+                    session, [item['content_hash'] for item in accepted], app.config['DEDUP_MAX_AGE_SECONDS']
+                )
+                jobs = []
+                for item in accepted:
+                    job = Job(
+                        job_id=item['job_id'],
+                        pdf_filename=item['pdf_filename'],
+                        status='pending',
+                        content_hash=item['content_hash'],
+                        batch_id=batch_id
+                    )
+                    duplicate = duplicates.get(item['content_hash'])
+                    if duplicate is not None:
+                        job.copy_results_from(duplicate)
+                        item['deduplicated_from'] = duplicate.job_id
+                    else:
+                        job.task_id = item['task_id']
+                    jobs.append(job)
+                session.add_all(jobs)
+            
+            queued = [item for item in accepted if 'deduplicated_from' not in item]
+            for item in accepted:
+                if 'deduplicated_from' in item:
+                    pdf_processor.remove_file(item['file_path'])
+            
+            # One group dispatch for the whole batch, after the rows are visible to workers
+            if queued:
+                try:
+                    group(
+                        processing_signature(item['job_id'], item['file_path'], task_id=item['task_id'])
+                        for item in queued
+                    ).apply_async()
+                except Exception as e:
+                    logger.error(f"Bulk dispatch error for batch {batch_id}: {str(e)}")
+                    with session_scope() as session:
+                        session.query(Job).filter(Job.job_id.in_([item['job_id'] for item in queued])).update(
+                            {'status': 'failed', 'error_message': 'Could not queue processing task'},
+                            synchronize_session=False
+                        )
+                    for item in queued:
+                        pdf_processor.remove_file(item['file_path'])
+                    return jsonify({'error': 'Could not queue processing tasks', 'batch_id': batch_id}), 503
+            
+            logger.info(f"Batch {batch_id}: {len(queued)} queued, {len(accepted) - len(queued)} deduplicated, {len(rejected)} rejected")
+            return jsonify({
+                'batch_id': batch_id,
+                'status': 'pending' if queued else 'completed',
+                'job_count': len(accepted),
+                'queued': len(queued),
+                'deduplicated': len(accepted) - len(queued),
+                'jobs': [{
+                    'job_id': item['job_id'],
+                    'pdf_filename': item['pdf_filename'],
+                    'status': 'completed' if 'deduplicated_from' in item else 'pending'
+                } for item in accepted],
+                'rejected': rejected
+            }), 201
+            
+        except RequestEntityTooLarge:
+            for item in accepted:
+                pdf_processor.remove_file(item['file_path'])
+            raise
+        except UploadRejectedError as e:
+            # A broken body rejects the whole batch
+            for item in accepted:
+                pdf_processor.remove_file(item['file_path'])
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Bulk upload error: {str(e)}")
+            for item in accepted:
+                pdf_processor.remove_file(item['file_path'])
+            return jsonify({'error': 'Internal server error'}), 500
+    
+    @app.route('/api/documents/batches/<string:batch_id>', methods=['GET'])
+    @validate_batch_id
+    def get_batch_status(batch_id: str):
+        """Aggregate status of a bulk upload and its documents"""
+        try:
+            with session_scope() as session:
+                summary = batch_summary(session, batch_id)
+            
+            if summary is None:
+                return jsonify({'error': 'Batch not found'}), 404
+            
+            counts = summary['counts']
+            finished = counts.get('completed', 0) + counts.get('failed', 0)
+            if finished == summary['total']:
+                status = 'completed'
+            elif counts.get('pending', 0) == summary['total']:
+                status = 'pending'
+            else:
+                status = 'processing'
+            
+            return jsonify({
+                'batch_id': batch_id,
+                'status': status,
+                'total': summary['total'],
+                'finished': finished,
+                'counts': counts,
+                'documents': [{
+                    'job_id': row.job_id,
+                    'pdf_filename': row.pdf_filename,
+                    'status': row.status,
+                    'company_name': row.company_name,
+                    'members_count': row.members_count or 0,
+                    'error_message': row.error_message
+                } for row in summary['rows']]
+            }), 200
+            
+        except Exception as e:
+            logger.error(f"Batch status error: {str(e)}")
+            return jsonify({'error': 'Internal server error'}), 500
+    
+    def job_status(job):
+        """status payload for job, as served by the status endpoints"""
+        response = {
+            'job_id': job.job_id,
+            'status': job.status,
+            'pdf_filename': job.pdf_filename,
+            'timestamp': job.timestamp.isoformat() if getattr(job, 'timestamp', None) is not None else None,
+            'stages': job.stage_status(),
+            'completed_stage': job.completed_stage,
+            'retry_count': job.retry_count or 0
+        }
+        if job.status == 'processing' and job.progress:
+            response['progress'] = json.loads(job.progress)
+        if getattr(job, 'status', None) == 'completed':
+            response['company_name'] = getattr(job, 'company_name', None)
+            github_org_data = getattr(job, 'github_org_data', None)
+            github_members = getattr(job, 'github_members', None)
+            response['github_org_data'] = json.loads(github_org_data) if github_org_data is not None else None
+            if github_members is not None:
+                try:
+                    members_list = json.loads(github_members)
+                    response['github_members'] = members_list
+                    response['members_count'] = len(members_list)
+                except Exception:
+                    response['github_members'] = None
+                    response['members_count'] = 0
+            else:
+                response['github_members'] = None
+                response['members_count'] = 0
+        elif getattr(job, 'error_message', None):
+            # failed, or the last error of a stage that is being retried
+            response['error_message'] = job.error_message
+        return response
+    
     @app.route('/api/documents/status/<string:job_id>', methods=['GET'])
     @validate_job_id
     def get_job_status(job_id: str):
         """Get the status of a processing job"""
+        # Hot job ids are answered from memory; the jobs table is the only store behind it
+        cached = status_cache.get(job_id)
+        if cached is not MISS:
+            return jsonify(cached), 200
         try:
-            session = get_session()
-            job = session.query(Job).filter_by(job_id=job_id).first()
-            
-            if not job:
-                return jsonify({'error': 'Job not found'}), 404
-            
-            response = {
-                'job_id': job.job_id,
-                'status': job.status,
-                'pdf_filename': job.pdf_filename,
-                'timestamp': job.timestamp.isoformat() if getattr(job, 'timestamp', None) is not None else None
-            }
-            # Check if we have a task_id stored
-            if job.task_id is not None:
-                task_status = get_task_status(str(job.task_id))
-                response['task_status'] = task_status
-            if getattr(job, 'status', None) == 'completed':
-                response['company_name'] = getattr(job, 'company_name', None)
-                github_org_data = getattr(job, 'github_org_data', None)
-                github_members = getattr(job, 'github_members', None)
-                response['github_org_data'] = json.loads(github_org_data) if github_org_data is not None else None
-                if github_members is not None:
-                    try:
-                        members_list = json.loads(github_members)
-                        response['github_members'] = members_list
-                        response['members_count'] = len(members_list)
-                    except Exception:
-                        response['github_members'] = None
-                        response['members_count'] = 0
-                else:
-                    response['github_members'] = None
-                    response['members_count'] = 0
-            elif getattr(job, 'status', None) == 'failed' and getattr(job, 'error_message', None):
-                response['error_message'] = job.error_message
-
-            session.close()
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
+            
+                if not job:
+                    return jsonify({'error': 'Job not found'}), 404
+            
+                response = job_status(job)
+            
+            # Completed is final; failed is not cached at all, since a retry handled by
+            # another process could not evict it here
+            if response['status'] == 'failed':
+                ttl = 0
+            elif response['status'] == 'completed':
+                ttl = app.config['STATUS_CACHE_FINISHED_TTL']
+            else:
+                ttl = app.config['STATUS_CACHE_TTL']
+            if ttl > 0:
+                status_cache.set(job_id, response, ttl=ttl)
             return jsonify(response), 200
             
         except Exception as e:
             logger.error(f"Status check error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
     
+    @app.route('/api/documents/status/<string:job_id>/stream', methods=['GET'])
+    @validate_job_id
+    def stream_job_status(job_id: str):
+        """Stream a job's status as server-sent events until it completes or fails"""
+        def load_status():
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
+                return job_status(job) if job else None
+        
+        # Subscribe before the first read so no transition slips in between
+        subscription = job_events.subscribe(job_channel(job_id))
+        try:
+            found = load_status() is not None
+        except Exception as e:
+            subscription.close()
+            logger.error(f"Status stream error: {str(e)}")
+            return jsonify({'error': 'Internal server error'}), 500
+        if not found:
+            subscription.close()
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return sse_response(status_stream(
+            load_status, subscription,
+            timeout=app.config['STATUS_STREAM_TIMEOUT'],
+            keepalive=app.config['STATUS_STREAM_KEEPALIVE'],
+            slots=stream_slots
+        ))
+    
+    @app.route('/api/documents/<string:job_id>/retry', methods=['POST'])
+    @validate_job_id
+    def retry_job(job_id: str):
+        """Re-queue a failed job from its last completed stage"""
+        try:
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
+                if not job:
+                    return jsonify({'error': 'Job not found'}), 404
+                if job.status != 'failed':
+                    return jsonify({'error': f'Only failed jobs can be retried (job is {job.status})'}), 409
+                
+                file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job.job_id}_{job.pdf_filename}")
+                if not job.stage_done('extract') and not os.path.exists(file_path):
+                    return jsonify({'error': 'Uploaded file is no longer available; upload it again'}), 409
+                
+                # Reset the row before dispatching, so a worker that starts right
+                # away is never overwritten by this request's commit
+                job.status = 'pending'
+                job.error_message = None
+                job.retry_count = 0
+                signature = resume_signature(job, file_path)
+                resumed_after = job.completed_stage
+            status_cache.delete(job_id)
+            
+            try:
+                task = signature.apply_async()
+            except Exception as e:
+                logger.error(f"Retry dispatch error for job {job_id}: {str(e)}")
+                with session_scope() as session:
+                    session.query(Job).filter_by(job_id=job_id).update(
+                        {'status': 'failed', 'error_message': 'Could not queue processing task'}
+                    )
+                status_cache.delete(job_id)
+                return jsonify({'error': 'Could not queue processing task'}), 503
+            
+            with session_scope() as session:
+                session.query(Job).filter_by(job_id=job_id).update({'task_id': task.id})
+            
+            return jsonify({
+                'job_id': job_id,
+                'status': 'pending',
+                'resumed_after': resumed_after,
+                'task_id': task.id
+            }), 202
+            
+        except Exception as e:
+            logger.error(f"Retry error: {str(e)}")
+            return jsonify({'error': 'Internal server error'}), 500
+    
     @app.route('/api/documents', methods=['GET'])
     def list_documents():
-        """List all processed documents"""
+        """List processed documents, newest first, one keyset page at a time"""
+        params, errors = parse_list_params(
+            request,
+            default_limit=app.config['DOCUMENTS_PAGE_SIZE'],
+            max_limit=app.config['DOCUMENTS_MAX_PAGE_SIZE']
+        )
+        if errors:
+            return jsonify({'error': errors[0]}), 400
+        
         try:
-            session = get_session()
-            jobs = session.query(Job).order_by(Job.timestamp.desc()).all()
+            with session_scope() as session:
+                rows, next_cursor = list_jobs(session, **params)
             
             documents = []
-            for job in jobs:
+            for row in rows:
                 # Skip jobs with task_id in error_message
-                error_message = getattr(job, 'error_message', None)
-                if error_message is not None and isinstance(error_message, str) and error_message.startswith('task_id:'):
-                    error_msg = None
-                else:
-                    error_msg = error_message
+                error_message = row.error_message
+                if error_message is not None and error_message.startswith('task_id:'):
+                    error_message = None
                 
                 doc = {
-                    'job_id': job.job_id,
-                    'pdf_filename': job.pdf_filename,
-                    'status': job.status,
-                    'timestamp': job.timestamp.isoformat() if getattr(job, 'timestamp', None) is not None else None,
-                    'company_name': getattr(job, 'company_name', None)
+                    'job_id': row.job_id,
+                    'pdf_filename': row.pdf_filename,
+                    'status': row.status,
+                    'timestamp': row.timestamp.isoformat() if row.timestamp is not None else None,
+                    'company_name': row.company_name,
+                    'members_count': row.members_count or 0
                 }
                 
-                if error_msg:
-                    doc['error_message'] = error_msg
-                
-                github_members = getattr(job, 'github_members', None)
-                if github_members is not None and isinstance(github_members, str):
-                    members_list = json.loads(github_members)
-                    doc['members_count'] = len(members_list)
-                else:
-                    doc['members_count'] = 0
+                if error_message:
+                    doc['error_message'] = error_message
                 
                 documents.append(doc)
             
-            session.close()
-            return jsonify({'documents': documents}), 200
+            return jsonify({'documents': documents, 'next_cursor': next_cursor}), 200
             
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logger.error(f"List documents error: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
     
     @app.errorhandler(413)
     def request_entity_too_large(error):
-        return jsonify({'error': 'File too large. Maximum size is 16MB'}), 413
+        # The limit that applied to this request (bulk uploads have their own)
+        limit = request.max_content_length or app.config['MAX_CONTENT_LENGTH']
+        return jsonify({'error': f"File too large. Maximum size is {limit // (1024 * 1024)}MB"}), 413
     
     return app
 
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Gazetteer matching: per-entry substring scans vs the single-pass GazetteerMatcher.
+
+usage: python benchmarks/bench_fallback_matcher.py [--megabytes 4] [--entries 20000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_service import TECH_COMPANIES
+from matcher import GazetteerMatcher
+
+WORDS = ("revenue platform growth cloud infrastructure developer customers quarter "
+         "pipeline metadata service teams product roadmap").split()
+
+def build_text(megabytes, gazetteer, seed=7):
+    rng = random.Random(seed)
+    terms = list(gazetteer)
+    words = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        word = rng.choice(terms) if rng.random() < 0.001 else rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    words.append('github.com/pallets')
+    return ' '.join(words)
+
+def legacy_scan(text, gazetteer):
+    """the old _fallback_extraction: one `in` scan per entry, then the url regex"""
+    text_lower = text.lower()
+    hits = [term for term in gazetteer if term in text_lower]
+    urls = re.findall(r'github\.com/([a-zA-Z0-9-]+)', text)
+    return hits, urls
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed * 1000:10.1f}ms")
+    return result, elapsed
+
+def run(name, gazetteer, megabytes):
+    text = build_text(megabytes, gazetteer)
+    print(f"{name}: {len(gazetteer)} entries, {len(text) / 1024 / 1024:.1f}MB text")
+    _, compile_time = timed('compile matcher', lambda: GazetteerMatcher(gazetteer))
+    matcher = GazetteerMatcher(gazetteer)
+    _, legacy = timed('legacy substring scans', lambda: legacy_scan(text, gazetteer))
+    result, single = timed('single pass', lambda: matcher.scan(text))
+    print(f"  {len(result['terms'])} hits, {len(result['urls'])} urls, speedup {legacy / single:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', type=float, default=4)
+    parser.add_argument('--entries', type=int, default=20000)
+    args = parser.parse_args()
+
+    run('builtin gazetteer', TECH_COMPANIES, args.megabytes)
+    large = {f'vendor{i:05d}': f'org{i}' for i in range(args.entries)}
+    large.update(TECH_COMPANIES)
+    run('large gazetteer', large, args.megabytes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Per-request latency: fresh connection per call vs the pooled keep-alive session.
+
+Runs against a local HTTP/1.1 stub, so the saving shown is TCP setup only;
+against api.github.com the TLS handshake makes the gap considerably larger.
+
+usage: python benchmarks/bench_http_pool.py [--requests 500]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+from http_client import PooledSession
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"login": "github"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def timed(label, get, url, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        get(url, timeout=10).content
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    mean = sum(timings) / n
+    print(f"{label:<10} mean={mean * 1e6:8.1f}us  p50={timings[n // 2] * 1e6:8.1f}us  p99={timings[int(n * 0.99) - 1] * 1e6:8.1f}us")
+    return mean
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/orgs/github"
+
+    try:
+        fresh = timed('fresh', requests.get, url, args.requests)
+        http = PooledSession()
+        http.get(url).content  #open the pooled connection
+        pooled = timed('pooled', http.get, url, args.requests)
+        print(f"saved {(fresh - pooled) * 1e6:.1f}us per request ({fresh / pooled:.1f}x)")
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Full-text extraction scaling with process-pool worker count.
+
+usage: python benchmarks/bench_parallel_extraction.py [--pages 200] [--chunk-size 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pdf_processor import parallel_read_pdf
+from bench_pdf_extraction import build_pdf
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=16)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1))) or [1]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pdf_path = os.path.join(tmpdir, 'bench.pdf')
+        build_pdf(pdf_path, args.pages)
+
+        baseline = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            pages = parallel_read_pdf(pdf_path, workers=workers, chunk_size=args.chunk_size, min_pages=1)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers:<3} {elapsed * 1000:9.2f}ms  speedup={baseline / elapsed:4.2f}x  ({len(pages)} pages)")
+
+    if cpus == 1:
+        print("only one cpu available; run on a multi-core host to see scaling")
+
+if __name__ == '__main__':
+    main()
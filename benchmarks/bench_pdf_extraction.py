@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""PDF text extraction cost: full read vs lazy prefix read.
+
+usage: python benchmarks/bench_pdf_extraction.py [--pages 500] [--max-chars 4000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz
+
+from pdf_processor import PDFProcessor
+
+LINE = "Acme Corp builds developer tooling on top of open source infrastructure. "
+
+def build_pdf(path, pages):
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 560, 800), f"Page {page_number}. " + LINE * 40, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+def timed(label, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<24} {best * 1000:9.2f}ms  ({len(result)} chars)")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--max-chars', type=int, default=4000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pdf_path = os.path.join(tmpdir, 'bench.pdf')
+        build_pdf(pdf_path, args.pages)
+        processor = PDFProcessor(upload_folder=tmpdir)
+
+        full = timed('full (sort=True, stats)', lambda: processor.process_pdf(pdf_path), repeat=1)
+        lazy = timed(f'lazy (max_chars={args.max_chars})', lambda: processor.process_pdf(pdf_path, max_chars=args.max_chars))
+        print(f"speedup: {full / lazy:.1f}x on {args.pages} pages")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Worker throughput: simulated delay slept inside the task vs a broker countdown.
+
+Runs a real celery worker (thread pool) against the in-memory broker with the
+processing pipeline stubbed out, so only the delay strategy differs.
+
+usage: python benchmarks/bench_scheduled_delay.py [--jobs 40] [--concurrency 4] [--min-delay 1] [--max-delay 2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from celery.contrib.testing.worker import start_worker
+
+from config import Config
+
+def run(label, submit, jobs, concurrency):
+    from tasks import celery_app
+    with start_worker(celery_app, pool='threads', concurrency=concurrency, perform_ping_check=False):
+        start = time.perf_counter()
+        results = [submit(f'job-{i}') for i in range(jobs)]
+        for result in results:
+            result.get(timeout=600)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<10} {jobs} jobs in {elapsed:6.2f}s  ({jobs / elapsed:6.2f} jobs/s)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--min-delay', type=int, default=1)
+    parser.add_argument('--max-delay', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Config.CACHE_DB_PATH = os.path.join(tmpdir, 'cache.db')
+        Config.PROCESSING_DELAY_MIN = args.min_delay
+        Config.PROCESSING_DELAY_MAX = args.max_delay
+
+        import tasks
+        tasks.celery_app.conf.update(broker_url='memory://', result_backend='cache+memory://')
+
+        @tasks.celery_app.task(name='bench_sleeping', ignore_result=False)
+        def sleeping(job_id):
+            """the old behaviour: the delay holds a worker slot"""
+            time.sleep(random.randint(args.min_delay, args.max_delay))
+            return job_id
+
+        @tasks.celery_app.task(name='bench_pipeline', ignore_result=False)
+        def pipeline(job_id):
+            """stand-in for process_pdf_async with the delay removed"""
+            return job_id
+
+        expected = args.jobs * (args.min_delay + args.max_delay) / 2 / args.concurrency
+        print(f"expected with sleep ~{expected:.1f}s (jobs * mean delay / concurrency), "
+              f"with countdown ~{args.max_delay}s (the longest delay)")
+        slept = run('sleep', lambda job_id: sleeping.delay(job_id), args.jobs, args.concurrency)
+        scheduled = run(
+            'countdown',
+            lambda job_id: pipeline.apply_async((job_id,), countdown=tasks.processing_delay()),
+            args.jobs, args.concurrency
+        )
+        print(f"speedup    {slept / scheduled:6.2f}x")
+
+if __name__ == '__main__':
+    main()
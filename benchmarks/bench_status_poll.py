@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Status-poll latency: per-request engine construction vs the shared engine registry.
+
+usage: python benchmarks/bench_status_poll.py [--requests 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from models import Base, Job
+
+def legacy_get_session(database_url):
+    """what get_session() used to do on every call"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+def poll(client, job_id, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get(f'/api/documents/status/{job_id}')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return timings
+
+def report(label, timings):
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<10} mean={mean * 1000:7.3f}ms  p50={p50 * 1000:7.3f}ms  p99={p99 * 1000:7.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        models.configure_db(db_url)
+
+        with models.session_scope() as session:
+            job = Job(pdf_filename='bench.pdf', status='completed', company_name='github',
+                      github_org_data='{"login": "github"}', github_members='[]')
+            session.add(job)
+            session.flush()
+            job_id = job.job_id
+
+        from api import create_app
+        app = create_app()
+        client = app.test_client()
+
+        #warm up
+        poll(client, job_id, 10)
+        report('registry', poll(client, job_id, args.requests))
+
+        #swap in the old behaviour: a fresh engine + create_all per request
+        original = models.get_session
+        models.get_session = lambda: legacy_get_session(db_url)
+        try:
+            report('legacy', poll(client, job_id, args.requests))
+        finally:
+            models.get_session = original
+
+        models.dispose_engines()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Load test: many clients polling GET /api/documents/status/<job_id>.
+
+Drives the async app in-process (Flask test clients on a thread pool) against
+a throwaway SQLite database, with and without the in-memory status cache, and
+reports throughput, latency percentiles and how many database reads were made.
+Neither run touches Redis: status comes from the jobs table only.
+
+usage: python benchmarks/bench_status_polling.py [--jobs 50] [--clients 16] [--seconds 5] [--ttl 1]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+
+def run(label, app, job_ids, clients, seconds):
+    import api_async
+    reads = []
+    session_scope = api_async.session_scope
+    def counting_scope(*args, **kwargs):
+        reads.append(1)
+        return session_scope(*args, **kwargs)
+    api_async.session_scope = counting_scope
+
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    def poll():
+        client = app.test_client()
+        mine = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.get(f'/api/documents/status/{random.choice(job_ids)}')
+            mine.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        with lock:
+            latencies.extend(mine)
+
+    try:
+        threads = [threading.Thread(target=poll) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        api_async.session_scope = session_scope
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<10} {len(latencies) / seconds:8.0f} req/s  p50 {p50:6.2f}ms  p99 {p99:6.2f}ms  "
+          f"db reads {len(reads):7d} ({len(reads) / len(latencies):.1%} of requests)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--ttl', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        import models
+        db_url = f"sqlite:///{os.path.join(tmpdir, 'jobs.db')}"
+        models._default_url = db_url
+        models.init_db(db_url)
+        Config.CACHE_DB_PATH = os.path.join(tmpdir, 'cache.db')
+        Config.UPLOAD_FOLDER = os.path.join(tmpdir, 'uploads')
+        Config.JOB_EVENTS_URL = ''
+
+        job_ids = []
+        with models.session_scope() as session:
+            for i in range(args.jobs):
+                job = models.Job(pdf_filename=f'doc-{i}.pdf', status=random.choice(['processing', 'completed']),
+                                 progress='{"stage": "extract", "current": 10, "total": 40}')
+                session.add(job)
+                session.flush()
+                job_ids.append(job.job_id)
+
+        from api_async import create_async_app
+        finished_ttl = Config.STATUS_CACHE_FINISHED_TTL
+        for label, ttl in (('no cache', 0), ('cache', args.ttl)):
+            Config.STATUS_CACHE_TTL = ttl
+            Config.STATUS_CACHE_FINISHED_TTL = finished_ttl if ttl else 0
+            run(label, create_async_app(), job_ids, args.clients, args.seconds)
+
+        models.dispose_engines()
+
+if __name__ == '__main__':
+    main()
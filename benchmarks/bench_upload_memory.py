@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Sync upload path: spool to UPLOAD_FOLDER and reopen vs process from memory.
+
+Streams the same multipart body through ingest_multipart + process_pdf
+(max_chars prefix read, as api.py does) both ways and reports the best time.
+
+usage: python benchmarks/bench_upload_memory.py [--pages 5] [--repeat 200] [--max-chars 4000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pdf_processor import PDFProcessor, is_in_memory
+from bench_pdf_extraction import build_pdf
+
+def multipart(data, boundary='bench'):
+    return (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="doc.pdf"\r\n\r\n'.encode()
+            + data + f'\r\n--{boundary}--\r\n'.encode())
+
+def timed(label, func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<8} {best * 1000:8.3f}ms per upload")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--max-chars', type=int, default=4000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pdf_path = os.path.join(tmpdir, 'bench.pdf')
+        build_pdf(pdf_path, args.pages)
+        with open(pdf_path, 'rb') as f:
+            body = multipart(f.read())
+        processor = PDFProcessor(upload_folder=tmpdir)
+
+        def upload(in_memory_max):
+            _, source, _ = processor.ingest_multipart(BytesIO(body), 'bench', lambda name: 'upload.pdf',
+                                                      in_memory_max=in_memory_max)
+            processor.process_pdf(source, max_chars=args.max_chars)
+            if not is_in_memory(source):
+                processor.remove_file(source)
+
+        print(f"{len(body)} byte body, {args.pages} pages")
+        disk = timed('disk', lambda: upload(None), args.repeat)
+        memory = timed('memory', lambda: upload(len(body)), args.repeat)
+        print(f"speedup: {disk / memory:.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,455 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+#returned by get() when a key is absent or expired, so that None can be cached
+MISS = object()
+
+class LRUCache:
+    """thread-safe in-process LRU with a per-entry ttl"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISS
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, key, fn, ttl=None):
+        """atomically replace key's value with fn(current value or MISS).
+
+        fn returning MISS leaves the entry untouched; returns the value now stored.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            current = MISS
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                current = entry[0]
+            value = fn(current)
+            if value is MISS:
+                return current
+            ttl = self.ttl if ttl is None else ttl
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+    
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    """json key/value store in a sqlite file shared by every worker process.
+
+    Entries expire after their ttl and the least recently used rows of a
+    namespace are evicted once it grows past max_entries. Connections are
+    opened per process and thread, so the cache is safe across fork.
+    """
+
+    def __init__(self, path, namespace='default', max_entries=100000, ttl=None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and getattr(self._local, 'pid', None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, '
+            'expires_at REAL, accessed_at REAL NOT NULL, '
+            'PRIMARY KEY (namespace, key))'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed '
+            'ON cache_entries (namespace, accessed_at)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_stats ('
+            'namespace TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (namespace, name))'
+        )
+
+    def get(self, key):
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return MISS
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key))
+                return MISS
+            conn.execute(
+                'UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                (now, self.namespace, key)
+            )
+            return json.loads(value)
+        except sqlite3.Error as e:
+            logger.error(f"Cache read error ({self.namespace}): {str(e)}")
+            return MISS
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+            self._writes += 1
+            #amortise eviction: sweep every 64 writes rather than on each one
+            if self._writes % 64 == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.error(f"Cache write error ({self.namespace}): {str(e)}")
+
+    def update(self, key, fn, ttl=None):
+        """atomically replace key's value with fn(current value or MISS), across processes.
+
+        The read and write happen in one IMMEDIATE transaction, so concurrent
+        workers serialize on the database write lock. fn returning MISS leaves
+        the entry untouched; returns the value now stored (MISS on error).
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                    (self.namespace, key)
+                ).fetchone()
+                current = MISS
+                if row is not None and (row[1] is None or row[1] > now):
+                    current = json.loads(row[0])
+                value = fn(current)
+                if value is not MISS:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (self.namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+                    )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return current if value is MISS else value
+        except sqlite3.Error as e:
+            logger.error(f"Cache update error ({self.namespace}): {str(e)}")
+            return MISS
+    
+    def delete(self, key):
+        try:
+            self._connect().execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Cache delete error ({self.namespace}): {str(e)}")
+
+    def evict(self):
+        """drop expired rows, then the least recently used rows over max_entries"""
+        conn = self._connect()
+        conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (self.namespace, time.time())
+        )
+        if self.max_entries is None:
+            return
+        conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key IN ('
+            'SELECT key FROM cache_entries WHERE namespace = ? '
+            'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.namespace, self.namespace, self.max_entries)
+        )
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def __len__(self):
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+
+    def incr_stat(self, name, amount=1):
+        self.incr_stats({name: amount})
+
+    def incr_stats(self, amounts: dict):
+        """add {name: amount} to the shared counters in a single transaction"""
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    'INSERT INTO cache_stats (namespace, name, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT (namespace, name) DO UPDATE SET value = value + excluded.value',
+                    [(self.namespace, name, amount) for name, amount in amounts.items()]
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"Cache stats error ({self.namespace}): {str(e)}")
+
+    def read_stats(self) -> dict:
+        rows = self._connect().execute(
+            'SELECT name, value FROM cache_stats WHERE namespace = ?', (self.namespace,)
+        ).fetchall()
+        return dict(rows)
+
+class TieredCache:
+    """in-process LRU in front of a shared SQLiteCache, with hit/miss counters.
+
+    Counters are kept per process and also accumulated in the persistent
+    tier so that totals across all workers can be read from any process.
+    """
+
+    COUNTERS = ('memory_hits', 'persistent_hits', 'misses', 'sets')
+
+    def __init__(self, memory: Optional[LRUCache] = None, persistent: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.persistent = persistent
+        self.counters = Counters(persistent)
+
+    def _count(self, name):
+        self.counters.incr(name)
+
+    def get(self, key) -> Any:
+        if self.memory is not None:
+            value = self.memory.get(key)
+            if value is not MISS:
+                self._count('memory_hits')
+                return value
+
+        if self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not MISS:
+                if self.memory is not None:
+                    self.memory.set(key, value)
+                self._count('persistent_hits')
+                return value
+
+        self._count('misses')
+        return MISS
+
+    def set(self, key, value, ttl=None):
+        if self.memory is not None:
+            self.memory.set(key, value, ttl)
+        if self.persistent is not None:
+            self.persistent.set(key, value, ttl)
+        self._count('sets')
+
+    def delete(self, key):
+        if self.memory is not None:
+            self.memory.delete(key)
+        if self.persistent is not None:
+            self.persistent.delete(key)
+
+    def stats(self) -> dict:
+        snapshot = self.counters.snapshot()
+        process = {name: snapshot['process'].get(name, 0) for name in self.COUNTERS}
+        lookups = process['memory_hits'] + process['persistent_hits'] + process['misses']
+        process['hit_rate'] = round((lookups - process['misses']) / lookups, 4) if lookups else 0.0
+
+        result = {'process': process}
+        if self.persistent is not None:
+            result['shared'] = snapshot['shared']
+            result['entries'] = len(self.persistent)
+        return result
+
+#live Counters with a shared store; whatever they still buffer is written at exit
+_buffered_counters = weakref.WeakSet()
+
+@atexit.register
+def _flush_counters():
+    for counters in list(_buffered_counters):
+        counters.flush()
+
+class Counters:
+    """named event counters, per process and (optionally) shared via SQLiteCache stats.
+
+    Counting only touches memory. Increments for the shared store are
+    buffered and written in one transaction once flush_every events have
+    accumulated or flush_interval seconds have passed since the last
+    write, so hot paths (an LRU hit, every provider call) stay off the
+    database's write lock. Shared totals lag by at most that much; this
+    process's own buffer is flushed before every snapshot and at exit.
+    """
+
+    def __init__(self, persistent: Optional[SQLiteCache] = None, flush_every=100, flush_interval=5.0):
+        self.persistent = persistent
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._counts = {}
+        self._pending = {}
+        self._pending_events = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        if persistent is not None:
+            _buffered_counters.add(self)
+
+    def incr(self, name, amount=1):
+        self.incr_many({name: amount})
+
+    def incr_many(self, amounts: dict):
+        """add {name: amount} as a single event"""
+        with self._lock:
+            for name, amount in amounts.items():
+                self._counts[name] = self._counts.get(name, 0) + amount
+            if self.persistent is None:
+                return
+            for name, amount in amounts.items():
+                self._pending[name] = self._pending.get(name, 0) + amount
+            self._pending_events += 1
+            due = (self._pending_events >= self.flush_every
+                   or time.monotonic() - self._flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """write buffered increments to the shared store"""
+        if self.persistent is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_events = 0
+            self._flushed_at = time.monotonic()
+        if pending:
+            self.persistent.incr_stats(pending)
+
+    def snapshot(self) -> dict:
+        self.flush()
+        with self._lock:
+            result = {'process': dict(self._counts)}
+        if self.persistent is not None:
+            result['shared'] = self.persistent.read_stats()
+        return result
+
+class LatencyHistogram:
+    """per-name latency histograms with fixed millisecond buckets, stored as Counters.
+
+    Each observation increments one bucket (non-cumulative) plus a count,
+    a millisecond sum and, for failed calls, an error counter.
+    """
+
+    DEFAULT_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self, counters: Optional[Counters] = None, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.counters = counters or Counters()
+        self.buckets_ms = tuple(sorted(buckets_ms))
+
+    def observe(self, name, seconds, ok=True):
+        elapsed_ms = seconds * 1000
+        bucket = next((f'le_{bound}' for bound in self.buckets_ms if elapsed_ms <= bound), 'le_inf')
+        amounts = {f'{name}|{bucket}': 1, f'{name}|count': 1, f'{name}|sum_ms': int(round(elapsed_ms))}
+        if not ok:
+            amounts[f'{name}|errors'] = 1
+        self.counters.incr_many(amounts)
+
+    def summary(self) -> dict:
+        """{scope: {name: {'count', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'buckets'}}}
+
+        Percentiles are bucket upper bounds (None past the last bucket).
+        """
+        return {scope: self._summarize(counts) for scope, counts in self.counters.snapshot().items()}
+
+    def _summarize(self, counts: dict) -> dict:
+        names = {}
+        for key, value in counts.items():
+            name, _, field = key.rpartition('|')
+            if name:
+                names.setdefault(name, {})[field] = value
+
+        summary = {}
+        bucket_names = [f'le_{bound}' for bound in self.buckets_ms] + ['le_inf']
+        for name, fields in names.items():
+            total = fields.get('count', 0)
+            buckets = {bucket: fields.get(bucket, 0) for bucket in bucket_names}
+            summary[name] = {
+                'count': total,
+                'errors': fields.get('errors', 0),
+                'mean_ms': round(fields.get('sum_ms', 0) / total, 1) if total else None,
+                'p50_ms': self._percentile(buckets, total, 0.5),
+                'p95_ms': self._percentile(buckets, total, 0.95),
+                'buckets': buckets,
+            }
+        return summary
+
+    def _percentile(self, buckets: dict, total, quantile):
+        if not total:
+            return None
+        seen = 0
+        for bound, bucket in zip(self.buckets_ms + (None,), buckets):
+            seen += buckets[bucket]
+            if seen >= quantile * total:
+                return bound
+        return None
+
+def tiered_cache(path, namespace, memory_size=1024, max_entries=100000, ttl=None) -> TieredCache:
+    """LRU + sqlite cache for one namespace of the shared cache database"""
+    return TieredCache(
+        memory=LRUCache(maxsize=memory_size, ttl=ttl) if memory_size else None,
+        persistent=SQLiteCache(path, namespace=namespace, max_entries=max_entries, ttl=ttl) if path else None
+    )
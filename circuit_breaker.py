@@ -0,0 +1,144 @@
+import time
+import logging
+
+import requests
+
+from cache import MISS, LRUCache, SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """the provider's breaker is open; the call was not attempted"""
+
+def is_provider_failure(error: Exception) -> bool:
+    """whether an exception says the provider is unhealthy.
+
+    Transport errors, 5xx and 429 count; other 4xx answers are the
+    caller's problem and say nothing about the provider's health.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status >= 500 or status == 429
+    return isinstance(error, requests.exceptions.RequestException)
+
+class CircuitBreaker:
+    """consecutive-failure circuit breaker with half-open probing.
+
+    After failure_threshold consecutive failures the breaker opens and
+    allow() refuses calls for reset_timeout seconds. Then exactly one
+    caller is let through as a probe (half-open): its success closes the
+    breaker, its failure re-opens it for another reset_timeout.
+
+    State lives in `store` (an LRUCache by default, or a SQLiteCache so
+    every worker process sees the same breaker) and transitions use the
+    store's atomic update(), so only one process wins the probe.
+    """
+
+    def __init__(self, name, store=None, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.store = store if store is not None else LRUCache()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def _state(self):
+        current = self.store.get(self.name)
+        return {'state': CLOSED, 'failures': 0} if current is MISS else current
+
+    def allow(self) -> bool:
+        """whether a call may go ahead now; may claim the half-open probe"""
+        current = self._state()
+        if current['state'] == CLOSED or not self._cooled_down(current, time.time()):
+            return current['state'] == CLOSED
+
+        claimed = {}
+        def claim_probe(state):
+            now = time.time()
+            if state is MISS or state['state'] == CLOSED:
+                claimed['allow'] = True
+                return MISS
+            if not self._cooled_down(state, now):
+                claimed['allow'] = False
+                return MISS
+            claimed['allow'] = True
+            return {**state, 'state': HALF_OPEN, 'probe_at': now}
+
+        self.store.update(self.name, claim_probe)
+        if claimed.get('allow') and current['state'] != CLOSED:
+            logger.info(f"Circuit '{self.name}' half-open, probing")
+        #a failed store update must not take the provider down with it
+        return claimed.get('allow', True)
+
+    def _cooled_down(self, state, now) -> bool:
+        """open long enough to probe, or the last probe never reported back"""
+        if state['state'] == OPEN:
+            return now - state['opened_at'] >= self.reset_timeout
+        return now - state.get('probe_at', 0) >= self.reset_timeout
+
+    def is_open(self) -> bool:
+        """open or half-open, without claiming a probe"""
+        return self._state()['state'] != CLOSED
+
+    def record_success(self):
+        current = self._state()
+        if current['state'] == CLOSED and not current['failures']:
+            return
+        if current['state'] != CLOSED:
+            logger.info(f"Circuit '{self.name}' closed")
+        self.store.update(self.name, lambda state: {'state': CLOSED, 'failures': 0})
+
+    def record_failure(self):
+        def fail(state):
+            now = time.time()
+            if state is MISS:
+                state = {'state': CLOSED, 'failures': 0}
+            if state['state'] == OPEN:
+                return MISS
+            failures = state['failures'] + 1
+            if state['state'] == HALF_OPEN or failures >= self.failure_threshold:
+                logger.warning(f"Circuit '{self.name}' opened after {failures} consecutive failures")
+                return {'state': OPEN, 'failures': failures, 'opened_at': now}
+            return {'state': CLOSED, 'failures': failures}
+
+        self.store.update(self.name, fail)
+
+    def call(self, fn, *args, **kwargs):
+        """run fn through the breaker; raises CircuitOpenError instead of calling while open"""
+        if not self.allow():
+            raise CircuitOpenError(f"circuit '{self.name}' is open")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_provider_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def status(self) -> dict:
+        current = self._state()
+        status = {'state': current['state'], 'failures': current['failures']}
+        if current['state'] == OPEN:
+            status['retry_in'] = round(max(current['opened_at'] + self.reset_timeout - time.time(), 0), 1)
+        return status
+
+def breakers_from_config(config, names, path=None) -> dict:
+    """CircuitBreakers for names, sharing state through the cache db at path (if any)"""
+    def setting(name):
+        return config[name] if isinstance(config, dict) else getattr(config, name)
+
+    store = SQLiteCache(path, namespace='breakers') if path else None
+    return {
+        name: CircuitBreaker(
+            name,
+            store=store,
+            failure_threshold=setting('BREAKER_FAILURE_THRESHOLD'),
+            reset_timeout=setting('BREAKER_RESET_TIMEOUT')
+        )
+        for name in names
+    }
@@ -5,21 +5,119 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///pdf_processor.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///pdf_processor.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     #llm configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     HUGGINGFACE_API_KEY = os.environ.get('HUGGINGFACE_API_KEY')
+    #provider answers cached per (provider, prompt): in-process lru size,
+    #shared sqlite entry cap and ttl in seconds
+    LLM_CACHE_MEMORY_SIZE = int(os.environ.get('LLM_CACHE_MEMORY_SIZE', 1024))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 100000))
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 30 * 24 * 3600))
+    #local gazetteer matches scoring at least this (0..1) skip the llm calls
+    LLM_LOCAL_CONFIDENCE_THRESHOLD = float(os.environ.get('LLM_LOCAL_CONFIDENCE_THRESHOLD', 0.75))
+    #seconds before hugging face is asked alongside a slow gemini call (0 = both at once, empty = sequential)
+    LLM_HEDGE_DELAY = os.environ.get('LLM_HEDGE_DELAY', '2')
+    LLM_HEDGE_DELAY = float(LLM_HEDGE_DELAY) if LLM_HEDGE_DELAY else None
+    #queued extractions running together in one worker share a gemini request
+    LLM_BATCH_SIZE = int(os.environ.get('LLM_BATCH_SIZE', 8))  #1 disables batching
+    LLM_BATCH_WINDOW = float(os.environ.get('LLM_BATCH_WINDOW', 0.1))  #seconds to wait for a batch to fill
     
     #github configuration
     GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+    #conditional response cache: entries younger than FRESH seconds are served
+    #without a request, older ones are revalidated with If-None-Match
+    GITHUB_CACHE_MEMORY_SIZE = int(os.environ.get('GITHUB_CACHE_MEMORY_SIZE', 256))
+    GITHUB_CACHE_MAX_ENTRIES = int(os.environ.get('GITHUB_CACHE_MAX_ENTRIES', 20000))
+    GITHUB_CACHE_TTL = int(os.environ.get('GITHUB_CACHE_TTL', 7 * 24 * 3600))
+    GITHUB_CACHE_FRESH_SECONDS = int(os.environ.get('GITHUB_CACHE_FRESH_SECONDS', 60))
+    #company name -> github login memo; misses are remembered for less time
+    GITHUB_ORG_CACHE_TTL = int(os.environ.get('GITHUB_ORG_CACHE_TTL', 7 * 24 * 3600))
+    GITHUB_ORG_NEGATIVE_TTL = int(os.environ.get('GITHUB_ORG_NEGATIVE_TTL', 24 * 3600))
+    #member list pages fetched concurrently per job
+    GITHUB_MEMBERS_CONCURRENCY = int(os.environ.get('GITHUB_MEMBERS_CONCURRENCY', 4))
+    #per-lookup deadlines (seconds) for the concurrent info / members enrichment
+    GITHUB_INFO_TIMEOUT = float(os.environ.get('GITHUB_INFO_TIMEOUT', 20))
+    GITHUB_MEMBERS_TIMEOUT = float(os.environ.get('GITHUB_MEMBERS_TIMEOUT', 30))
+    
+    #sqlite file shared by all worker processes for caches (empty disables)
+    CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', 'cache.db')
+    
+    #outbound http: keep-alive pool per service and process, plus
+    #transport-level retries for connection errors and 502/503/504
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))
+    HTTP_POOL_BLOCK = os.environ.get('HTTP_POOL_BLOCK', 'false').lower() == 'true'
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+    HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.3))
+    
+    #circuit breakers around gemini, hugging face and github (state shared via CACHE_DB_PATH)
+    BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+    BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
     
     #celery configuration
     CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    #lifetime of any task result that is stored at all (pipeline tasks store none)
+    CELERY_RESULT_EXPIRES = int(os.environ.get('CELERY_RESULT_EXPIRES', 3600))
+    #redis pub/sub carrying job status changes from workers to status streams;
+    #empty keeps them in-process (enough when jobs run inside the web process)
+    JOB_EVENTS_URL = os.environ.get('JOB_EVENTS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    #a status stream ends after STATUS_STREAM_TIMEOUT seconds (clients reconnect)
+    #and re-checks the job every STATUS_STREAM_KEEPALIVE seconds while idle
+    STATUS_STREAM_TIMEOUT = int(os.environ.get('STATUS_STREAM_TIMEOUT', 60))
+    STATUS_STREAM_KEEPALIVE = int(os.environ.get('STATUS_STREAM_KEEPALIVE', 15))
+    #open streams per process; each holds a server thread, so keep this well
+    #below GUNICORN_THREADS (further clients poll through reconnects; 0 = no cap)
+    STATUS_STREAM_MAX = int(os.environ.get('STATUS_STREAM_MAX', 4))
+    #per-process cache of status responses: hot job ids are served from memory
+    #for STATUS_CACHE_TTL seconds (STATUS_CACHE_FINISHED_TTL once completed; failed jobs,
+    #which a retry can restart from any process, are never cached)
+    STATUS_CACHE_SIZE = int(os.environ.get('STATUS_CACHE_SIZE', 10000))
+    STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', 1))
+    STATUS_CACHE_FINISHED_TTL = float(os.environ.get('STATUS_CACHE_FINISHED_TTL', 60))
+    #queues of the extract -> classify -> enrich pipeline stages
+    CELERY_QUEUE_EXTRACT = os.environ.get('CELERY_QUEUE_EXTRACT', 'pdf_extract')
+    CELERY_QUEUE_CLASSIFY = os.environ.get('CELERY_QUEUE_CLASSIFY', 'llm_classify')
+    CELERY_QUEUE_ENRICH = os.environ.get('CELERY_QUEUE_ENRICH', 'github_enrich')
+    #automatic retries of a failed pipeline stage (transient errors only),
+    #waiting TASK_RETRY_BACKOFF * 2**n seconds, capped at TASK_RETRY_BACKOFF_MAX
+    TASK_MAX_RETRIES = int(os.environ.get('TASK_MAX_RETRIES', 3))
+    TASK_RETRY_BACKOFF = int(os.environ.get('TASK_RETRY_BACKOFF', 10))
+    TASK_RETRY_BACKOFF_MAX = int(os.environ.get('TASK_RETRY_BACKOFF_MAX', 600))
+    #minimum seconds between two progress writes of one task (stage changes are always written)
+    TASK_PROGRESS_INTERVAL = float(os.environ.get('TASK_PROGRESS_INTERVAL', 1.0))
+    #simulated processing delay in seconds, applied as a broker countdown so
+    #waiting jobs do not occupy worker slots (0/0 disables it)
+    PROCESSING_DELAY_MIN = int(os.environ.get('PROCESSING_DELAY_MIN', 30))
+    PROCESSING_DELAY_MAX = int(os.environ.get('PROCESSING_DELAY_MAX', 300))
     
     #upload configuration
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  #16 mb max file size
-    ALLOWED_EXTENSIONS = {'pdf'}
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'pdf'}
+    #reuse results of a completed job with identical pdf content uploaded
+    #within this many seconds (0 disables deduplication)
+    DEDUP_MAX_AGE_SECONDS = int(os.environ.get('DEDUP_MAX_AGE_SECONDS', 7 * 24 * 3600))
+    
+    #bulk uploads (multipart batches or zip archives)
+    BULK_MAX_CONTENT_LENGTH = int(os.environ.get('BULK_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+    BULK_MAX_FILES = int(os.environ.get('BULK_MAX_FILES', 1000))
+    BULK_MAX_FILE_SIZE = int(os.environ.get('BULK_MAX_FILE_SIZE', MAX_CONTENT_LENGTH))  #per pdf, checked while copying
+    
+    #pdf extraction: stop reading pages once this much text is collected
+    #(the llm prompts only use the first 1-2k characters); None reads everything
+    PDF_TEXT_MAX_CHARS = int(os.environ.get('PDF_TEXT_MAX_CHARS', 4000)) or None
+    #full-text extraction: process pool size, pages per task, and the page
+    #count below which documents are read serially
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 1))
+    PDF_EXTRACT_CHUNK_SIZE = int(os.environ.get('PDF_EXTRACT_CHUNK_SIZE', 16))
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 64))
+    #sync uploads up to this size are processed straight from memory instead of
+    #being written to UPLOAD_FOLDER first (0 always spools to disk)
+    PDF_IN_MEMORY_MAX_BYTES = int(os.environ.get('PDF_IN_MEMORY_MAX_BYTES', 8 * 1024 * 1024))
+    
+    #documents listing
+    DOCUMENTS_PAGE_SIZE = 50
+    DOCUMENTS_MAX_PAGE_SIZE = 200
\ No newline at end of file
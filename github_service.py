@@ -1,14 +1,33 @@
 import requests
 import json
+import hashlib
 import logging
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlparse, parse_qs
+from requests.structures import CaseInsensitiveDict
+
+from cache import MISS
+from circuit_breaker import CircuitBreaker
+from http_client import PooledSession
 
 logger = logging.getLogger(__name__)
 
+#largest page size the github rest api accepts
+MAX_PER_PAGE = 100
+
+#response headers kept alongside cached bodies
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+class GitHubUnavailableError(Exception):
+    """github could not be reached or refused the request (e.g. rate limited)"""
+
 class GitHubService:
-    def __init__(self, token=None):
+    def __init__(self, token=None, http_cache=None, cache_fresh_seconds=60,
+                 org_cache=None, org_ttl=7 * 24 * 3600, org_negative_ttl=24 * 3600, http=None,
+                 member_concurrency=4, breaker=None):
         self.token = token
         self.base_url = "https://api.github.com"
         self.headers = {
@@ -16,12 +35,55 @@ class GitHubService:
         }
         if token:
             self.headers["Authorization"] = f"token {token}"
+        #optional TieredCache of 200 responses, revalidated with ETag /
+        #Last-Modified once older than cache_fresh_seconds (304s are free)
+        self.http_cache = http_cache
+        self.cache_fresh_seconds = cache_fresh_seconds
+        #optional TieredCache of company name -> github login, including
+        #"no such org" results which expire sooner (org_negative_ttl)
+        self.org_cache = org_cache
+        self.org_ttl = org_ttl
+        self.org_negative_ttl = org_negative_ttl
+        #keep-alive connection pool to api.github.com
+        self.http = http or PooledSession()
+        #max member pages fetched in parallel
+        self.member_concurrency = member_concurrency
+        #trips after repeated transport errors / 5xx so jobs stop waiting on a down github
+        self.breaker = breaker or CircuitBreaker('github')
     
-    def get_organization_info(self, company_name: str) -> Optional[Dict]:
+    def resolve_organization(self, company_name: str, raise_errors: bool = False) -> Optional[str]:
+        """github login for company_name, memoized across jobs.
+
+        Resolve once per job and pass the login to get_organization_info and
+        get_organization_members so the search api is hit at most once. With
+        raise_errors, GitHubUnavailableError is raised instead of returning
+        None when github could not give a definitive answer.
+        """
+        key = self._normalize_company(company_name)
+        if self.org_cache is not None:
+            cached = self.org_cache.get(key)
+            if cached is not MISS:
+                return cached
+        
+        try:
+            org_login = self._find_organization(company_name)
+        except Exception as e:
+            #transient failures are not memoized
+            logger.error(f"Error searching for organization: {str(e)}")
+            if raise_errors:
+                raise GitHubUnavailableError(str(e)) from e
+            return None
+        
+        if self.org_cache is not None:
+            ttl = self.org_ttl if org_login else self.org_negative_ttl
+            self.org_cache.set(key, org_login, ttl=ttl)
+        return org_login
+    
+    def get_organization_info(self, company_name: str, org_login: Optional[str] = None) -> Optional[Dict]:
         """search for organization by name and get details"""
         try:
-            #first, search for the organization
-            org_username = self._search_organization(company_name)
+            #first, search for the organization unless already resolved
+            org_username = org_login or self.resolve_organization(company_name)
             
             if not org_username:
                 logger.warning(f"No GitHub organization found for company: {company_name}")
@@ -57,84 +119,137 @@ class GitHubService:
             logger.error(f"Error fetching organization info: {str(e)}")
             return None
     
-    def _search_organization(self, company_name: str) -> Optional[str]:
-        """search for github organization by company name"""
+    def enrich(self, company_name: str, limit: int = 100, info_timeout: Optional[float] = None,
+               members_timeout: Optional[float] = None, org_login: Optional[str] = None,
+               on_step: Optional[Callable[[str], None]] = None) -> Dict:
+        """resolve the login (unless given), then fetch org info and members concurrently.
+
+        Each lookup gets its own deadline measured from when both start; a
+        lookup that misses it is reported in 'timed_out' and left to finish
+        in the background without holding up the caller. on_step, if given,
+        is called on the caller's thread with 'org_info' and then 'members'
+        as each lookup is settled.
+        """
+        result = {'org_login': None, 'org_info': None, 'members': [], 'timed_out': []}
+        
+        org_login = org_login or self.resolve_organization(company_name)
+        if not org_login:
+            logger.warning(f"No GitHub organization found for company: {company_name}")
+            return result
+        result['org_login'] = org_login
+        
+        executor = ThreadPoolExecutor(max_workers=2)
         try:
-            #clean up company name for search
-            search_query = company_name.lower().replace(' ', '').replace(',', '').replace('.', '')
-            
-            #common mappings for tech companies
-            company_mappings = {
-                'google': 'google',
-                'microsoft': 'microsoft',
-                'facebook': 'facebook',
-                'meta': 'facebook',
-                'amazon': 'amzn',
-                'apple': 'apple',
-                'netflix': 'netflix',
-                'uber': 'uber',
-                'airbnb': 'airbnb',
-                'spotify': 'spotify',
-                'twitter': 'twitter',
-                'x': 'twitter',
-                'tesla': 'tesla',
-                'oracle': 'oracle',
-                'ibm': 'ibm',
-                'intel': 'intel',
-                'nvidia': 'nvidia',
-                'adobe': 'adobe',
-                'salesforce': 'salesforce',
-                'paypal': 'paypal',
-                'stripe': 'stripe',
-                'square': 'square',
-                'shopify': 'shopify',
-                'twilio': 'twilio',
-                'atlassian': 'atlassian',
-                'slack': 'slackhq',
-                'docker': 'docker',
-                'kubernetes': 'kubernetes',
-                'hashicorp': 'hashicorp',
-                'elastic': 'elastic',
-                'mongodb': 'mongodb',
-                'redis': 'redis',
-                'postgresql': 'postgresql',
-                'apache': 'apache',
-                'mozilla': 'mozilla',
-                'wordpress': 'wordpress',
-                'automattic': 'automattic'
-            }
-            
-            #check if we have a direct mapping
-            if search_query in company_mappings:
-                return company_mappings[search_query]
-            
-            #search using github search api
-            search_url = f"{self.base_url}/search/users"
-            params = {
-                'q': f"{company_name} type:org",
-                'per_page': 5
-            }
-            
-            response = self._make_request(search_url, params=params)
-            
-            if response and response.status_code == 200:
-                results = response.json()
-                if results.get('total_count', 0) > 0:
-                    #return the first result's login
-                    return results['items'][0]['login']
+            started = time.monotonic()
+            info_future = executor.submit(self.get_organization_info, company_name, org_login=org_login)
+            members_future = executor.submit(self.get_organization_members, company_name, limit, org_login=org_login)
             
-            #try exact match
-            test_url = f"{self.base_url}/orgs/{search_query}"
-            test_response = self._make_request(test_url)
-            if test_response and test_response.status_code == 200:
-                return search_query
+            result['org_info'] = self._wait_for(info_future, info_timeout, started, 'org_info', result)
+            if on_step:
+                on_step('org_info')
+            if not result['org_info']:
+                #members are only reported alongside org info
+                members_future.cancel()
+                return result
             
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error searching for organization: {str(e)}")
+            result['members'] = self._wait_for(members_future, members_timeout, started, 'members', result) or []
+            if on_step:
+                on_step('members')
+            return result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _wait_for(future, timeout, started, name, result):
+        remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0)
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            logger.warning(f"GitHub {name} lookup exceeded {timeout}s, continuing without it")
+            result['timed_out'].append(name)
             return None
     
+    @staticmethod
+    def _normalize_company(company_name: str) -> str:
+        return company_name.lower().replace(' ', '').replace(',', '').replace('.', '')
+    
+    def _find_organization(self, company_name: str) -> Optional[str]:
+        """search for github organization; raises GitHubUnavailableError when github can't answer"""
+        #clean up company name for search
+        search_query = self._normalize_company(company_name)
+        
+        #common mappings for tech companies
+        company_mappings = {
+            'google': 'google',
+            'microsoft': 'microsoft',
+            'facebook': 'facebook',
+            'meta': 'facebook',
+            'amazon': 'amzn',
+            'apple': 'apple',
+            'netflix': 'netflix',
+            'uber': 'uber',
+            'airbnb': 'airbnb',
+            'spotify': 'spotify',
+            'twitter': 'twitter',
+            'x': 'twitter',
+            'tesla': 'tesla',
+            'oracle': 'oracle',
+            'ibm': 'ibm',
+            'intel': 'intel',
+            'nvidia': 'nvidia',
+            'adobe': 'adobe',
+            'salesforce': 'salesforce',
+            'paypal': 'paypal',
+            'stripe': 'stripe',
+            'square': 'square',
+            'shopify': 'shopify',
+            'twilio': 'twilio',
+            'atlassian': 'atlassian',
+            'slack': 'slackhq',
+            'docker': 'docker',
+            'kubernetes': 'kubernetes',
+            'hashicorp': 'hashicorp',
+            'elastic': 'elastic',
+            'mongodb': 'mongodb',
+            'redis': 'redis',
+            'postgresql': 'postgresql',
+            'apache': 'apache',
+            'mozilla': 'mozilla',
+            'wordpress': 'wordpress',
+            'automattic': 'automattic'
+        }
+        
+        #check if we have a direct mapping
+        if search_query in company_mappings:
+            return company_mappings[search_query]
+        
+        #search using github search api
+        search_url = f"{self.base_url}/search/users"
+        params = {
+            'q': f"{company_name} type:org",
+            'per_page': 5
+        }
+        
+        response = self._make_request(search_url, params=params)
+        search_failed = response is None or response.status_code == 403 or response.status_code >= 500
+        
+        if response is not None and response.status_code == 200:
+            results = response.json()
+            if results.get('total_count', 0) > 0:
+                #return the first result's login
+                return results['items'][0]['login']
+        
+        #try exact match
+        test_url = f"{self.base_url}/orgs/{search_query}"
+        test_response = self._make_request(test_url)
+        if test_response is not None and test_response.status_code == 200:
+            return search_query
+        
+        #only a definitive "not found" may be memoized as a negative result
+        if search_failed or test_response is None or test_response.status_code >= 500:
+            raise GitHubUnavailableError(f"organization lookup failed for {company_name}")
+        return None
+    
     def _get_user_info(self, username: str) -> Optional[Dict]:
         """get user details if not an organization"""
         try:
@@ -165,47 +280,45 @@ class GitHubService:
             logger.error(f"Error fetching user info: {str(e)}")
             return None
     
-    def get_organization_members(self, company_name: str, limit: int = 100) -> List[Dict]:
-        """get public members of an organization"""
+    def get_organization_members(self, company_name: str, limit: int = 100,
+                                 org_login: Optional[str] = None) -> List[Dict]:
+        """get public members of an organization.
+
+        The first page is fetched at the maximum page size; its Link header
+        gives the last page, and the remaining pages needed for `limit` are
+        fetched concurrently (bounded by member_concurrency) in page order.
+        """
         try:
-            #first get the organization username
-            org_username = self._search_organization(company_name)
+            #first get the organization username unless already resolved
+            org_username = org_login or self.resolve_organization(company_name)
             if not org_username:
                 logger.warning(f"No GitHub organization found for company: {company_name}")
                 return []
             
-            members = []
-            page = 1
-            per_page = 30
+            url = f"{self.base_url}/orgs/{org_username}/members"
+            per_page = max(1, min(limit, MAX_PER_PAGE))
             
-            while len(members) < limit:
-                url = f"{self.base_url}/orgs/{org_username}/members"
-                params = {'page': page, 'per_page': per_page}
-                
-                response = self._make_request(url, params=params)
-                
-                if response and response.status_code == 200:
-                    page_members = response.json()
-                    if not page_members:
-                        break
-                    
-                    for member in page_members:
-                        members.append({
-                            'login': member.get('login'),
-                            'avatar_url': member.get('avatar_url'),
-                            'html_url': member.get('html_url'),
-                            'type': member.get('type')
-                        })
-                    
-                    if len(page_members) < per_page:
-                        break
-                    
-                    page += 1
-                elif response and response.status_code == 404:
-                    #if org not found, return empty list
-                    logger.warning(f"Organization {org_username} not found")
+            response = self._make_request(url, params={'page': 1, 'per_page': per_page})
+            if response and response.status_code == 404:
+                #if org not found, return empty list
+                logger.warning(f"Organization {org_username} not found")
+                return []
+            if not response or response.status_code != 200:
+                return []
+            
+            members = self._parse_members(response.json())
+            
+            pages_needed = -(-limit // per_page)
+            last_page = min(self._last_page(response), pages_needed)
+            if len(members) < per_page or last_page <= 1:
+                return members[:limit]
+            
+            for page_members in self._fetch_member_pages(url, per_page, range(2, last_page + 1), response):
+                #stop at the first missing page so the result stays a contiguous prefix
+                if not page_members:
                     break
-                else:
+                members.extend(page_members)
+                if len(page_members) < per_page:
                     break
             
             return members[:limit]
@@ -214,11 +327,79 @@ class GitHubService:
             logger.error(f"Error fetching organization members: {str(e)}")
             return []
     
+    def _fetch_member_pages(self, url: str, per_page: int, pages: range, first_response) -> List[List[Dict]]:
+        """fetch member pages, concurrently when the rate limit budget allows"""
+        def fetch(page):
+            response = self._make_request(url, params={'page': page, 'per_page': per_page})
+            if response and response.status_code == 200:
+                return self._parse_members(response.json())
+            return []
+        
+        #with too little budget left, go page by page so _make_request's
+        #reset-wait applies to one request at a time instead of a burst
+        remaining = first_response.headers.get('X-RateLimit-Remaining')
+        concurrency = min(self.member_concurrency, len(pages))
+        if concurrency <= 1 or (remaining is not None and int(remaining) < len(pages)):
+            results = []
+            for page in pages:
+                page_members = fetch(page)
+                results.append(page_members)
+                if len(page_members) < per_page:
+                    break
+            return results
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            #map() returns results in page order regardless of completion order
+            return list(executor.map(fetch, pages))
+    
+    @staticmethod
+    def _last_page(response) -> int:
+        """page number of rel="last" in the Link header, or 1 if there is none"""
+        last_url = response.links.get('last', {}).get('url')
+        if not last_url:
+            return 1
+        page = parse_qs(urlparse(last_url).query).get('page')
+        return int(page[0]) if page else 1
+    
+    @staticmethod
+    def _parse_members(page_members: List[Dict]) -> List[Dict]:
+        return [{
+            'login': member.get('login'),
+            'avatar_url': member.get('avatar_url'),
+            'html_url': member.get('html_url'),
+            'type': member.get('type')
+        } for member in page_members]
+    
     def _make_request(self, url: str, params: Dict = {}, retry_count: int = 3) -> Optional[requests.Response]:
-        """make http request with rate limit handling"""
+        """make http request with rate limit handling and conditional caching"""
+        cache_key = self._cache_key(url, params) if self.http_cache is not None else None
+        cached = self.http_cache.get(cache_key) if cache_key else MISS
+        
+        headers = self.headers
+        if cached is not MISS:
+            if time.time() - cached['stored_at'] < self.cache_fresh_seconds:
+                return self._cached_response(url, cached)
+            
+            headers = dict(self.headers)
+            if cached['headers'].get('ETag'):
+                headers['If-None-Match'] = cached['headers']['ETag']
+            if cached['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = cached['headers']['Last-Modified']
+        
         for attempt in range(retry_count):
+            if not self.breaker.allow():
+                if cached is not MISS:
+                    logger.warning(f"GitHub circuit open, serving stale cached response for {url}")
+                    return self._cached_response(url, cached)
+                logger.warning(f"GitHub circuit open, skipping request to {url}")
+                return None
+            
             try:
-                response = requests.get(url, headers=self.headers, params=params, timeout=10)
+                response = self.http.get(url, headers=headers, params=params, timeout=10)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
                 
                 #check rate limit
                 if response.status_code == 403 and 'X-RateLimit-Remaining' in response.headers:
@@ -230,11 +411,56 @@ class GitHubService:
                         sleep(sleep_time)
                         continue
                 
+                if response.status_code == 304 and cached is not MISS:
+                    #not modified: refresh the entry and serve the stored body
+                    cached['stored_at'] = time.time()
+                    self.http_cache.set(cache_key, cached)
+                    return self._cached_response(url, cached)
+                
+                if response.status_code == 200 and cache_key:
+                    self._store_response(cache_key, response)
+                
                 return response
                 
             except requests.exceptions.RequestException as e:
                 logger.error(f"Request error (attempt {attempt + 1}/{retry_count}): {str(e)}")
-                if attempt < retry_count - 1:
+                self.breaker.record_failure()
+                if attempt < retry_count - 1 and not self.breaker.is_open():
                     sleep(2 ** attempt)  #exponential backoff
                 
-        return None
\ No newline at end of file
+        return None
+    
+    def _cache_key(self, url: str, params: Dict) -> str:
+        #responses differ by credentials (e.g. private members), so key on them too
+        raw = json.dumps([url, sorted((params or {}).items()), self.headers.get('Authorization', '')])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _store_response(self, cache_key: str, response: requests.Response):
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return
+        self.http_cache.set(cache_key, {
+            'stored_at': time.time(),
+            'headers': headers,
+            'body': response.text
+        })
+    
+    def _cached_response(self, url: str, cached: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(cached['headers'])
+        response.encoding = 'utf-8'
+        response._content = cached['body'].encode('utf-8')
+        return response
+    
+    def cache_stats(self) -> Optional[Dict]:
+        """hit/miss counters of the conditional response cache, if configured"""
+        return self.http_cache.stats() if self.http_cache is not None else None
+    
+    def breaker_status(self) -> Dict:
+        return {self.breaker.name: self.breaker.status()}
+    
+    def degraded(self, enrichment: Optional[Dict] = None) -> bool:
+        """whether results may be partial: the breaker is open or a lookup of enrichment timed out"""
+        return self.breaker.is_open() or bool(enrichment and enrichment['timed_out'])
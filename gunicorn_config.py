@@ -2,5 +2,6 @@ import os
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
 workers = 1
-threads = 2
+#each open status stream holds a thread; STATUS_STREAM_MAX caps how many
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 timeout = 120
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+class PooledSession:
+    """lazily built requests.Session with a keep-alive connection pool.
+
+    The session is recreated in a forked child (celery prefork, gunicorn)
+    so that processes never share sockets inherited from their parent.
+    Transport-level retries cover connection failures and the given
+    gateway status codes; application-level retries stay with the caller.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=10, pool_block=False,
+                 max_retries=2, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                 allowed_methods=('GET', 'HEAD')):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.allowed_methods = allowed_methods
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _build(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            #non-idempotent requests (llm POSTs) are only retried when the
+            #connection failed before anything was sent
+            allowed_methods=frozenset(self.allowed_methods),
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+def pooled_session_from_config(config) -> PooledSession:
+    """PooledSession tuned by the HTTP_* settings of a Config-like object"""
+    def setting(name):
+        return config[name] if isinstance(config, dict) else getattr(config, name)
+
+    return PooledSession(
+        pool_maxsize=setting('HTTP_POOL_MAXSIZE'),
+        pool_block=setting('HTTP_POOL_BLOCK'),
+        max_retries=setting('HTTP_MAX_RETRIES'),
+        backoff_factor=setting('HTTP_RETRY_BACKOFF')
+    )
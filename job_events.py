@@ -0,0 +1,190 @@
+import json
+import queue
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterator, Optional
+
+import redis
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+class Subscription:
+    """messages published to one channel since subscribe(), in order"""
+
+    def __init__(self, hub, channel: str):
+        self.channel = channel
+        self._hub = hub
+        self._queue = queue.Queue()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """next message, or None if nothing arrived within timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._hub._unsubscribe(self)
+
+class LocalPubSub:
+    """in-process channels; publish() hands a message to every current subscriber"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, message: Dict):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel: str, message: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription._queue.put(message)
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+class RedisPubSub(LocalPubSub):
+    """LocalPubSub fed from redis, so celery workers in other processes can publish.
+
+    Each web process holds a single pattern subscription, started by the
+    first subscribe(), and fans incoming messages out to its local
+    subscribers; an open status stream costs a queue, not a redis
+    connection. Publishing is best effort: a lost message only delays a
+    stream until its next periodic check.
+    """
+
+    def __init__(self, url: str, prefix: str = 'job-events:', client=None):
+        super().__init__()
+        self.prefix = prefix
+        self.client = client or redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, channel: str, message: Dict):
+        try:
+            self.client.publish(self.prefix + channel, json.dumps(message))
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish event on {channel}: {str(e)}")
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = super().subscribe(channel)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='job-events', daemon=True)
+                self._listener.start()
+        return subscription
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._deliver(channel[len(self.prefix):], json.loads(message['data']))
+            except redis.RedisError as e:
+                logger.warning(f"Job event subscription lost, reconnecting: {str(e)}")
+                time.sleep(1)
+
+class StreamSlots:
+    """caps the status streams one process keeps open.
+
+    Each open stream holds a server thread for up to its timeout; with a
+    fixed thread pool, unbounded streams would starve every other request.
+    A limit of 0 or less means no cap.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def acquire(self) -> bool:
+        """claim a slot without waiting; False when all are taken"""
+        return self._slots is None or self._slots.acquire(blocking=False)
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+def pubsub_from_config(config):
+    """RedisPubSub when JOB_EVENTS_URL is set, else an in-process LocalPubSub"""
+    url = config['JOB_EVENTS_URL'] if isinstance(config, dict) else getattr(config, 'JOB_EVENTS_URL')
+    return RedisPubSub(url) if url else LocalPubSub()
+
+def job_channel(job_id: str) -> str:
+    return f'job:{job_id}'
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    lines = [f'event: {event}'] if event else []
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def status_stream(load_status: Callable[[], Optional[Dict]], subscription: Subscription,
+                  timeout: float, keepalive: float, slots: Optional[StreamSlots] = None) -> Iterator[str]:
+    """server-sent events for one job: its status now, then again after each change.
+
+    load_status reads the job from the database; it runs once up front and
+    then only when the subscription reports a transition, or every
+    `keepalive` seconds as a guard against lost messages. The stream ends
+    with an 'end' event once the job is completed or failed, or after
+    `timeout` seconds, when EventSource clients reconnect on their own.
+    When `slots` are all taken, the stream sends the current status and
+    closes straight away instead, so the client falls back to polling
+    through its reconnects.
+    """
+    held = False
+    try:
+        held = slots is None or slots.acquire()
+        deadline = time.monotonic() + (timeout if held else 0)
+        last = None
+        #tell EventSource how long to wait before reconnecting
+        yield 'retry: 2000\n\n'
+        while True:
+            status = load_status()
+            if status is None:
+                yield sse_event({'error': 'Job not found'}, event='end')
+                return
+            if status != last:
+                yield sse_event(status)
+                last = status
+            if status['status'] in TERMINAL_STATUSES:
+                yield sse_event({'status': status['status']}, event='end')
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if subscription.get(timeout=min(keepalive, remaining)) is None:
+                #comment line; keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+    finally:
+        subscription.close()
+        if held and slots is not None:
+            slots.release()
+
+def sse_response(events: Iterator[str]) -> Response:
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        #stop nginx-style proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
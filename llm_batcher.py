@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ExtractionBatcher:
+    """groups concurrent extract_company_name calls into multi-document requests.
+
+    Callers block as usual. Documents the local matcher is sure about are
+    answered straight away; for the rest, the first pending request starts
+    a `window` second timer, and the batch is sent when the timer fires or
+    as soon as `max_items` requests are waiting, whichever comes first.
+    Each caller gets its own document's answer back. Batches only form when
+    several extractions run at once in this process (threaded or gevent
+    workers); a lone request just waits out the window. max_items <= 1
+    disables batching.
+    """
+
+    def __init__(self, llm_service, window: float = 0.1, max_items: int = 8):
+        self.llm_service = llm_service
+        self.window = window
+        self.max_items = max_items
+        self._pending: List[Tuple[str, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def extract_company_name(self, text: str) -> Optional[str]:
+        #confident local matches never reach a provider, so never wait for a batch
+        if self.max_items <= 1 or self.llm_service.confident_local_match(text):
+            return self.llm_service.extract_company_name(text)
+
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((text, future))
+            if len(self._pending) >= self.max_items:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if batch:
+            #a full batch is sent on the thread that filled it
+            self._send(batch)
+        return future.result()
+
+    def _take(self) -> List[Tuple[str, Future]]:
+        """detach the pending batch; caller holds the lock"""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: List[Tuple[str, Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                results = [self.llm_service.extract_company_name(texts[0])]
+            else:
+                logger.info(f"Sending batched extraction for {len(texts)} documents")
+                results = self.llm_service.extract_company_names(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -1,29 +1,267 @@
 import os
 import json
+import time
+import hashlib
 import logging
-import requests
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cache import MISS, Counters, LatencyHistogram
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_client import PooledSession
+from matcher import GazetteerMatcher
 
 logger = logging.getLogger(__name__)
 
+#common tech company patterns: term found in text -> github org
+TECH_COMPANIES = {
+    'microsoft': 'microsoft',
+    'google': 'google',
+    'facebook': 'facebook',
+    'meta': 'facebook',
+    'amazon': 'amazon',
+    'aws': 'aws',
+    'apple': 'apple',
+    'netflix': 'netflix',
+    'uber': 'uber',
+    'airbnb': 'airbnb',
+    'spotify': 'spotify',
+    'twitter': 'twitter',
+    'tesla': 'tesla',
+    'oracle': 'oracle',
+    'ibm': 'ibm',
+    'intel': 'intel',
+    'nvidia': 'nvidia',
+    'adobe': 'adobe',
+    'salesforce': 'salesforce',
+    'paypal': 'paypal',
+    'stripe': 'stripe',
+    'github': 'github',
+    'gitlab': 'gitlab',
+    'docker': 'docker',
+    'kubernetes': 'kubernetes',
+    'tensorflow': 'tensorflow',
+    'pytorch': 'pytorch',
+    'react': 'facebook',
+    'angular': 'angular',
+    'vue': 'vuejs'
+}
+
+#remote llm providers, in the order they are asked
+PROVIDERS = ('gemini', 'huggingface')
+
+_default_matcher = None
+
+def default_matcher() -> GazetteerMatcher:
+    """matcher over TECH_COMPANIES, compiled once per process"""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = GazetteerMatcher(TECH_COMPANIES)
+    return _default_matcher
+
+def tier_fractions(counts: dict) -> dict:
+    """{tier: count} -> {tier: {'count', 'fraction'}}"""
+    total = sum(counts.values())
+    return {
+        tier: {'count': count, 'fraction': round(count / total, 4)}
+        for tier, count in counts.items()
+    } if total else {}
+
+def parse_batch_answers(raw: Optional[str], count: int) -> Optional[List[Optional[str]]]:
+    """per-document answers from a batch reply like {"1": "GitHub", "2": null}.
+
+    Tolerates markdown code fences and text around the object. Returns None
+    when no json object can be read. Explicit null, empty and 'none'
+    entries ("no company found") come back as None; documents the reply
+    leaves out, or answers with something other than a string, as MISS.
+    """
+    if not raw:
+        return None
+    start, end = raw.find('{'), raw.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        parsed = json.loads(raw[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    
+    answers = []
+    for number in range(1, count + 1):
+        answer = parsed.get(str(number), MISS)
+        if answer is None or (isinstance(answer, str) and answer.strip().lower() in ('', 'none')):
+            answers.append(None)
+        elif isinstance(answer, str):
+            answers.append(answer.strip())
+        else:
+            answers.append(MISS)
+    return answers
+
 class LLMService:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None, http=None, gazetteer=None,
+                 local_confidence_threshold=0.75, tier_stats=None, hedge_delay=None, latency=None,
+                 breakers=None):
         self.api_key = api_key
+        #optional TieredCache of provider answers keyed on (provider, prompt)
+        self.cache = cache
+        #keep-alive connection pool shared by all provider calls
+        self.http = http or PooledSession()
+        #local gazetteer matcher; extra entries extend TECH_COMPANIES
+        self.matcher = GazetteerMatcher({**TECH_COMPANIES, **gazetteer}) if gazetteer else default_matcher()
+        #local matches at or above this confidence skip the remote providers
+        self.local_confidence_threshold = local_confidence_threshold
+        #which tier resolved each extraction: local, gemini, huggingface, fallback, none
+        self.tier_stats = tier_stats or Counters()
+        #seconds to wait on gemini before also asking hugging face; 0 starts
+        #both at once and None keeps the providers strictly sequential
+        self.hedge_delay = hedge_delay
+        #per-provider request latency, used to tune hedge_delay
+        self.latency = latency or LatencyHistogram()
+        #per-provider circuit breakers; an open one skips straight to the next tier
+        self.breakers = breakers or {name: CircuitBreaker(name) for name in PROVIDERS}
         
     def extract_company_name(self, text: str) -> Optional[str]:
-        """extract tech company name from text using free LLM APIs"""
-        #first try with google gemini (free tier)
-        result = self._extract_with_gemini(text)
-        if result:
-            return result
-            
-        #fallback to hugging face free models
-        result = self._extract_with_huggingface_free(text)
-        if result:
-            return result
+        """extract tech company name from text, cheapest tier first.
+
+        A confident local gazetteer match is returned without any network
+        call; otherwise gemini, then hugging face, then the local match
+        regardless of confidence.
+        """
+        local_match, confidence = self.matcher.best_match_with_confidence(text)
+        if local_match and confidence >= self.local_confidence_threshold:
+            logger.info(f"Local match '{local_match}' (confidence {confidence}), skipping LLM providers")
+            return self._resolved('local', local_match)
+        
+        if self.hedge_delay is not None:
+            provider, result = self._extract_hedged(text)
+            if result:
+                return self._resolved(provider, result)
+        else:
+            #first try with google gemini (free tier)
+            result = self._extract_with_gemini(text)
+            if result:
+                return self._resolved('gemini', result)
+                
+            #fallback to hugging face free models
+            result = self._extract_with_huggingface_free(text)
+            if result:
+                return self._resolved('huggingface', result)
             
         #final fallback to pattern matching
-        return self._fallback_extraction(text)
+        return self._resolved('fallback' if local_match else 'none', local_match)
+    
+    def _extract_hedged(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """ask gemini, and hugging face too once hedge_delay passes without an answer.
+
+        Returns (provider, answer) for the first provider with a usable
+        answer, gemini winning ties. The other call is cancelled if it has
+        not started yet; an in-flight request cannot be interrupted, so it
+        finishes in the background and its answer is discarded.
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            pending = {executor.submit(self._extract_with_gemini, text): 'gemini'}
+            done, _ = wait(pending, timeout=self.hedge_delay)
+            
+            #gemini failing fast is no reason to keep waiting
+            for future in done:
+                if future.result():
+                    return pending[future], future.result()
+                del pending[future]
+            
+            pending[executor.submit(self._extract_with_huggingface_free, text)] = 'huggingface'
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: pending[f] != 'gemini'):
+                    provider = pending.pop(future)
+                    if future.result():
+                        if pending:
+                            logger.info(f"Hedged LLM call answered by {provider}, cancelling {', '.join(pending.values())}")
+                        return provider, future.result()
+            return None, None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def confident_local_match(self, text: str) -> Optional[str]:
+        """the local gazetteer match if it clears the confidence threshold"""
+        local_match, confidence = self.matcher.best_match_with_confidence(text)
+        return local_match if local_match and confidence >= self.local_confidence_threshold else None
+    
+    def extract_company_names(self, texts: List[str]) -> List[Optional[str]]:
+        """extract_company_name for several documents, sharing one gemini request.
+
+        Confident local matches are resolved first; the rest go to gemini as
+        a single numbered multi-document prompt. A document gemini answers
+        with null falls back to its local match, as in extract_company_name.
+        Documents the batch does not cover (unparseable reply, missing
+        entries, gemini unavailable) are retried one by one through
+        extract_company_name.
+        """
+        results = [None] * len(texts)
+        local_matches = {}
+        pending = []
+        for index, text in enumerate(texts):
+            local_match, confidence = self.matcher.best_match_with_confidence(text)
+            if local_match and confidence >= self.local_confidence_threshold:
+                results[index] = self._resolved('local', local_match)
+            else:
+                local_matches[index] = local_match
+                pending.append(index)
+        
+        if len(pending) > 1:
+            answers = self._extract_batch_with_gemini([texts[index] for index in pending])
+            if answers is not None:
+                for index, answer in zip(pending, answers):
+                    if answer is None:
+                        local_match = local_matches[index]
+                        results[index] = self._resolved('fallback' if local_match else 'none', local_match)
+                    elif answer is not MISS:
+                        results[index] = self._resolved('gemini', answer)
+                pending = [index for index, answer in zip(pending, answers) if answer is MISS]
+        
+        for index in pending:
+            results[index] = self.extract_company_name(texts[index])
+        return results
+    
+    def _extract_batch_with_gemini(self, texts: List[str]) -> Optional[List[Optional[str]]]:
+        """one gemini call for many documents; None when the batch could not be answered"""
+        if not self.api_key:
+            return None
+        
+        documents = "\n\n".join(f"Document {number}:\n{text[:2000]}" for number, text in enumerate(texts, 1))
+        prompt = (
+            "For each numbered document below, extract the name of any prominent tech company mentioned. "
+            "Answer with only a JSON object mapping each document number to the company name, "
+            "or to null if no tech company is found, e.g. {\"1\": \"GitHub\", \"2\": null}.\n\n"
+            f"{documents}"
+        )
+        
+        try:
+            raw = self._cached_call(
+                'gemini_batch', prompt,
+                lambda batch_prompt: self._generate_gemini(batch_prompt, max_output_tokens=50 * len(texts)),
+                breaker='gemini'
+            )
+        except CircuitOpenError as e:
+            logger.info(f"Skipping gemini batch: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Gemini batch API error: {str(e)}")
+            return None
+        
+        answers = parse_batch_answers(raw, len(texts))
+        if answers is None:
+            logger.warning(f"Unparseable gemini batch answer for {len(texts)} documents, falling back to single requests")
+        return answers
+    
+    def _resolved(self, tier: str, result: Optional[str]) -> Optional[str]:
+        self.tier_stats.incr(tier)
+        return result
+    
+    def tier_breakdown(self) -> dict:
+        """count and fraction of extractions resolved by each tier"""
+        return {scope: tier_fractions(counts) for scope, counts in self.tier_stats.snapshot().items()}
     
     def _extract_with_gemini(self, text: str) -> Optional[str]:
         """use google gemini free api for extraction"""
@@ -32,8 +270,6 @@ class LLMService:
             if not self.api_key:
                 logger.info("No Gemini API key provided, skipping Gemini")
                 return None
-                
-            url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
             
             prompt = (
                 "Extract the name of any prominent tech company mentioned in this text. "
@@ -42,129 +278,151 @@ class LLMService:
                 f"Text: {text[:2000]}"
             )
             
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": prompt
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": 0.1,
-                    "maxOutputTokens": 50
-                }
-            }
-            
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
-                f"{url}?key={self.api_key}",
-                headers=headers,
-                json=payload,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    extracted = result['candidates'][0]['content']['parts'][0]['text'].strip()
-                    return extracted if extracted.lower() != 'none' else None
+            return self._cached_call('gemini', prompt, self._request_gemini)
             
+        except CircuitOpenError as e:
+            logger.info(f"Skipping gemini: {str(e)}")
             return None
-            
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}")
             return None
     
+    def _request_gemini(self, prompt: str) -> Optional[str]:
+        """single gemini extraction; None when gemini finds no company"""
+        extracted = self._generate_gemini(prompt)
+        return extracted if extracted and extracted.lower() != 'none' else None
+    
+    def _generate_gemini(self, prompt: str, max_output_tokens: int = 50) -> Optional[str]:
+        """raw gemini generateContent text; raises on transport or http errors"""
+        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        
+        payload = {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": 0.1,
+                "maxOutputTokens": max_output_tokens
+            }
+        }
+        
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        response = self.http.post(
+            f"{url}?key={self.api_key}",
+            headers=headers,
+            json=payload,
+            timeout=10
+        )
+        response.raise_for_status()
+        
+        result = response.json()
+        if 'candidates' in result and len(result['candidates']) > 0:
+            return result['candidates'][0]['content']['parts'][0]['text'].strip()
+        
+        return None
+    
     def _extract_with_huggingface_free(self, text: str) -> Optional[str]:
         """use hugging face free inference api"""
         try:
             #using free hugging face inference api (no auth required for some models)
-            API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-base"
-            
             prompt = (
                 "Extract the name of the prominent tech company mentioned in this text. "
                 "Return only the company name. Text: " + text[:1000]
             )
             
-            headers = {}
-            if self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_length": 50,
-                    "temperature": 0.1
-                }
-            }
-            
-            response = requests.post(API_URL, headers=headers, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    extracted = result[0].get('generated_text', '').strip()
-                    return extracted if extracted and extracted.lower() != 'none' else None
-                elif isinstance(result, str):
-                    return result.strip() if result.strip() else None
+            return self._cached_call('huggingface', prompt, self._request_huggingface)
             
+        except CircuitOpenError as e:
+            logger.info(f"Skipping huggingface: {str(e)}")
             return None
-            
         except Exception as e:
             logger.error(f"Hugging Face free API error: {str(e)}")
             return None
     
-    
-    def _fallback_extraction(self, text: str) -> Optional[str]:
-        """fallback extraction using pattern matching"""
-        import re
-        
-        #common tech company patterns
-        tech_companies = {
-            'microsoft': 'microsoft',
-            'google': 'google',
-            'facebook': 'facebook',
-            'meta': 'facebook',
-            'amazon': 'amazon',
-            'aws': 'aws',
-            'apple': 'apple',
-            'netflix': 'netflix',
-            'uber': 'uber',
-            'airbnb': 'airbnb',
-            'spotify': 'spotify',
-            'twitter': 'twitter',
-            'tesla': 'tesla',
-            'oracle': 'oracle',
-            'ibm': 'ibm',
-            'intel': 'intel',
-            'nvidia': 'nvidia',
-            'adobe': 'adobe',
-            'salesforce': 'salesforce',
-            'paypal': 'paypal',
-            'stripe': 'stripe',
-            'github': 'github',
-            'gitlab': 'gitlab',
-            'docker': 'docker',
-            'kubernetes': 'kubernetes',
-            'tensorflow': 'tensorflow',
-            'pytorch': 'pytorch',
-            'react': 'facebook',
-            'angular': 'angular',
-            'vue': 'vuejs'
+    def _request_huggingface(self, prompt: str) -> Optional[str]:
+        """single hugging face inference call; raises on transport or http errors"""
+        API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-base"
+        
+        headers = {}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_length": 50,
+                "temperature": 0.1
+            }
         }
         
-        text_lower = text.lower()
-        for company, github_name in tech_companies.items():
-            if company in text_lower:
-                logger.info(f"Found company '{company}' mapped to GitHub org '{github_name}'")
-                return github_name
+        response = self.http.post(API_URL, headers=headers, json=payload, timeout=10)
+        response.raise_for_status()
+        
+        result = response.json()
+        if isinstance(result, list) and len(result) > 0:
+            extracted = result[0].get('generated_text', '').strip()
+            return extracted if extracted and extracted.lower() != 'none' else None
+        elif isinstance(result, str):
+            return result.strip() if result.strip() else None
         
-        #try to find github urls
-        github_pattern = r'github\.com/([a-zA-Z0-9-]+)'
-        matches = re.findall(github_pattern, text)
-        if matches:
-            return matches[0]
+        return None
+    
+    def _cached_call(self, provider: str, prompt: str, request: Callable[[str], Optional[str]],
+                     breaker: Optional[str] = None) -> Optional[str]:
+        """answer from cache when this exact prompt was already sent to provider.
+
+        Only completed answers (including 'no company found') are cached;
+        errors propagate to the caller uncached. `breaker` names the circuit
+        breaker to use when it differs from provider (e.g. batched calls).
+        """
+        if self.cache is None:
+            return self._guarded_call(provider, prompt, request, breaker)
         
-        return None
\ No newline at end of file
+        key = hashlib.sha256(f"{provider}\0{prompt}".encode('utf-8')).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            logger.info(f"LLM cache hit for {provider}")
+            return cached
+        
+        result = self._guarded_call(provider, prompt, request, breaker)
+        self.cache.set(key, result)
+        return result
+    
+    def _guarded_call(self, provider: str, prompt: str, request: Callable[[str], Optional[str]],
+                      breaker: Optional[str] = None) -> Optional[str]:
+        """timed provider call through its circuit breaker; raises CircuitOpenError while open"""
+        breaker = self.breakers.get(breaker or provider)
+        if breaker is None:
+            return self._timed_call(provider, prompt, request)
+        return breaker.call(self._timed_call, provider, prompt, request)
+    
+    def _timed_call(self, provider: str, prompt: str, request: Callable[[str], Optional[str]]) -> Optional[str]:
+        """call the provider, recording its latency whether it succeeds or raises"""
+        started = time.monotonic()
+        ok = False
+        try:
+            result = request(prompt)
+            ok = True
+            return result
+        finally:
+            self.latency.observe(provider, time.monotonic() - started, ok=ok)
+    
+    def latency_stats(self) -> dict:
+        """per-provider request latency histograms"""
+        return self.latency.summary()
+    
+    def breaker_status(self) -> dict:
+        return {name: breaker.status() for name, breaker in self.breakers.items()}
+    
+    def degraded(self) -> bool:
+        """whether any provider is being skipped right now (its breaker is open)"""
+        return any(breaker.is_open() for breaker in self.breakers.values())
+    
+    def cache_stats(self) -> Optional[dict]:
+        """hit/miss counters of the provider answer cache, if one is configured"""
+        return self.cache.stats() if self.cache is not None else None
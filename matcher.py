@@ -0,0 +1,122 @@
+import re
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+#github profile / org urls, e.g. github.com/pallets
+GITHUB_URL_PATTERN = r'github\.com/(?P<login>[a-zA-Z0-9-]+)'
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """regex alternation of terms with shared prefixes factored out.
+
+    A flat `a|b|c|...` makes the regex engine try every alternative at every
+    position; the trie form branches on one character at a time, so the cost
+    per position no longer grows with the number of terms.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        is_terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            #greedy optional tail: the longest term at a position wins
+            body = body + '?' if len(branches) == 1 and len(body) == 1 else '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+class GazetteerMatcher:
+    """finds every gazetteer term and github url in one pass over the text.
+
+    Terms match case-insensitively on word boundaries, so 'vue' does not
+    match inside 'revenue'. `gazetteer` maps a term to the value reported
+    for it (e.g. 'meta' -> 'facebook').
+    """
+
+    def __init__(self, gazetteer: Dict[str, str]):
+        self.gazetteer = {term.lower(): value for term, value in gazetteer.items() if term}
+        source = (
+            f'(?<!\\w)(?:(?P<url>{GITHUB_URL_PATTERN})'
+            f'|(?P<term>{_trie_pattern(sorted(self.gazetteer))})(?!\\w))'
+        )
+        #matching lowercased text without IGNORECASE is roughly twice as fast;
+        #the case-insensitive pattern is only for text whose length changes
+        #when lowercased (a few unicode characters), where offsets would drift
+        self.pattern = re.compile(source)
+        self._source = source
+        self._ignorecase_pattern = None
+
+    def _finditer(self, text: str):
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return self.pattern.finditer(lowered)
+        if self._ignorecase_pattern is None:
+            self._ignorecase_pattern = re.compile(self._source, re.IGNORECASE)
+        return self._ignorecase_pattern.finditer(text)
+
+    def scan(self, text: str) -> Dict:
+        """all hits in text order, plus per-value counts.
+
+        Returns {'terms': [{'term', 'value', 'start', 'end'}],
+                 'urls': [{'login', 'start', 'end'}],
+                 'counts': {value: hits}}
+        """
+        terms = []
+        urls = []
+        for match in self._finditer(text):
+            if match.group('url'):
+                #report the login as written, not lowercased
+                login_start, login_end = match.span('login')
+                urls.append({'login': text[login_start:login_end], 'start': match.start(), 'end': match.end()})
+            else:
+                term = match.group('term').lower()
+                terms.append({'term': term, 'value': self.gazetteer[term], 'start': match.start(), 'end': match.end()})
+
+        counts = Counter(hit['value'] for hit in terms)
+        return {'terms': terms, 'urls': urls, 'counts': dict(counts)}
+
+    def best_match(self, text: str) -> Optional[str]:
+        """most frequent gazetteer value (earliest on ties), else the first github url login"""
+        return self.best_match_with_confidence(text)[0]
+
+    def best_match_with_confidence(self, text: str) -> Tuple[Optional[str], float]:
+        """best_match plus a 0..1 confidence from hit frequency, position and url evidence"""
+        return score_matches(self.scan(text))
+
+def score_matches(result: Dict) -> Tuple[Optional[str], float]:
+    """pick the top value from a scan() result and score how sure we are of it.
+
+    - dominance: share of all gazetteer hits that went to the top value; a
+      document naming several companies is ambiguous
+    - frequency: 1 - 0.5**hits, so repeated mentions saturate towards 1
+    - position: mentions near the start (title, letterhead) count more
+    - url: a github.com/<login> link to the same org is strong evidence
+    """
+    urls = [url['login'].lower() for url in result['urls']]
+    if not result['terms']:
+        #a bare github link is a decent guess but never conclusive on its own
+        return (result['urls'][0]['login'], 0.5) if result['urls'] else (None, 0.0)
+
+    first_seen = {}
+    for hit in result['terms']:
+        first_seen.setdefault(hit['value'], hit['start'])
+    counts = result['counts']
+    value = max(counts, key=lambda candidate: (counts[candidate], -first_seen[candidate]))
+
+    dominance = counts[value] / sum(counts.values())
+    frequency = 1 - 0.5 ** counts[value]
+    position = 1 / (1 + first_seen[value] / 1000)
+    url = 1.0 if value.lower() in urls else 0.0
+
+    confidence = dominance * (0.6 * frequency + 0.25 * position + 0.15 * url)
+    return value, round(min(confidence, 1.0), 4)
@@ -1,13 +1,23 @@
-from datetime import datetime
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer
+import os
+import json
+import base64
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, inspect, text, func, Column, String, DateTime, Text, Integer, Index, and_, or_
 from sqlalchemy.orm import declarative_base, sessionmaker
 import uuid
 
+from config import Config
+
 Base = declarative_base()
 
+#processing pipeline stages, in order; Job.completed_stage holds the last one done
+STAGES = ('extract', 'classify', 'enrich')
+
 class Job(Base):
     __tablename__ = 'jobs'
-    
+
     job_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     pdf_filename = Column(String(255), nullable=False)
     company_name = Column(String(255))
@@ -17,6 +27,63 @@ class Job(Base):
     status = Column(String(50), default='pending')  #pending, processing, completed, failed
     error_message = Column(Text)
     task_id = Column(String(255))  # Celery task ID for async processing
+    members_count = Column(Integer, default=0)  #len(github_members), stored so listing never parses the blob
+    content_hash = Column(String(64))  #sha256 of the uploaded pdf, used for deduplication
+    batch_id = Column(String(36))  #set for jobs created together by a bulk upload
+    extracted_text = Column(Text)  #output of the extract stage, input of classify
+    org_login = Column(String(255))  #github login resolved by the enrich stage
+    completed_stage = Column(String(20))  #last pipeline stage whose output is checkpointed
+    retry_count = Column(Integer, default=0)  #automatic stage retries so far
+    progress = Column(Text)  #json progress of the running stage, written by the worker
+    degraded = Column(Integer, default=0)  #1 when a provider was down or a lookup timed out; never reused by dedup
+
+    __table_args__ = (
+        Index('ix_jobs_content_hash', 'content_hash', 'status', 'timestamp'),
+        Index('ix_jobs_timestamp_job_id', 'timestamp', 'job_id'),
+        Index('ix_jobs_status_timestamp', 'status', 'timestamp', 'job_id'),
+        Index('ix_jobs_company_timestamp', 'company_name', 'timestamp', 'job_id'),
+        Index('ix_jobs_batch_id', 'batch_id', 'status'),
+    )
+
+    def set_members(self, members):
+        """store the member list together with its summary count"""
+        self.github_members = json.dumps(members)
+        self.members_count = len(members)
+
+    def copy_results_from(self, other):
+        """reuse the extraction and github results of a completed job"""
+        self.company_name = other.company_name
+        self.github_org_data = other.github_org_data
+        self.github_members = other.github_members
+        self.members_count = other.members_count
+        self.org_login = other.org_login
+        self.completed_stage = STAGES[-1]
+        self.status = 'completed'
+
+    def stage_done(self, stage):
+        """whether stage's output is already checkpointed on the job"""
+        if self.completed_stage is None:
+            return False
+        return STAGES.index(self.completed_stage) >= STAGES.index(stage)
+    
+    def stage_status(self):
+        """{stage: done | running | retrying | failed | pending} for the processing pipeline"""
+        statuses = {}
+        current_found = False
+        for stage in STAGES:
+            if self.status == 'completed' or self.stage_done(stage):
+                statuses[stage] = 'done'
+            elif not current_found:
+                current_found = True
+                if self.status == 'failed':
+                    statuses[stage] = 'failed'
+                elif self.status == 'processing':
+                    statuses[stage] = 'retrying' if self.retry_count else 'running'
+                else:
+                    statuses[stage] = 'pending'
+            else:
+                statuses[stage] = 'pending'
+        return statuses
     
     def to_dict(self):
         return {
@@ -28,17 +95,221 @@ class Job(Base):
             'timestamp': self.timestamp.isoformat() if getattr(self, 'timestamp', None) is not None else None,
             'status': self.status,
             'error_message': self.error_message,
-            'task_id': self.task_id
+            'task_id': self.task_id,
+            'members_count': self.members_count,
+            'content_hash': self.content_hash,
+            'batch_id': self.batch_id,
+            'org_login': self.org_login,
+            'completed_stage': self.completed_stage
         }
 
+#process-wide engine registry: one engine + sessionmaker per database url,
+#rebuilt lazily in a child process after fork (gunicorn / celery prefork)
+_registry = {}
+_registry_lock = threading.Lock()
+_registry_pid = os.getpid()
+_default_url = Config.SQLALCHEMY_DATABASE_URI
+
+def _reset_after_fork():
+    """drop engines inherited from the parent without closing its connections"""
+    global _registry_pid
+    for engine, _ in _registry.values():
+        engine.dispose(close=False)
+    _registry.clear()
+    _registry_pid = os.getpid()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_engine(database_url=None):
+    """return the shared engine for database_url, creating it once per process"""
+    return _get_entry(database_url)[0]
+
+def _get_entry(database_url=None):
+    database_url = database_url or _default_url
+    if _registry_pid != os.getpid():
+        _reset_after_fork()
+
+    entry = _registry.get(database_url)
+    if entry is not None:
+        return entry
+
+    with _registry_lock:
+        entry = _registry.get(database_url)
+        if entry is None:
+            engine = create_engine(database_url, pool_pre_ping=True)
+            Base.metadata.create_all(engine)
+            _migrate(engine)
+            entry = (engine, sessionmaker(bind=engine))
+            _registry[database_url] = entry
+    return entry
+
+#columns added after the first release: name -> sqlite/postgres column ddl
+_ADDED_COLUMNS = {
+    'members_count': 'INTEGER DEFAULT 0',
+    'content_hash': 'VARCHAR(64)',
+    'batch_id': 'VARCHAR(36)',
+    'extracted_text': 'TEXT',
+    'org_login': 'VARCHAR(255)',
+    'completed_stage': 'VARCHAR(20)',
+    'retry_count': 'INTEGER DEFAULT 0',
+    'progress': 'TEXT',
+    'degraded': 'INTEGER DEFAULT 0',
+}
+
+def _migrate(engine):
+    """add columns and indexes introduced after a database was first created"""
+    existing = {column['name'] for column in inspect(engine).get_columns(Job.__tablename__)}
+    
+    with engine.begin() as conn:
+        for name, ddl in _ADDED_COLUMNS.items():
+            if name not in existing:
+                conn.execute(text(f'ALTER TABLE jobs ADD COLUMN {name} {ddl}'))
+        
+        if 'members_count' not in existing:
+            #one-off backfill from the stored member blobs
+            rows = conn.execute(text('SELECT job_id, github_members FROM jobs WHERE github_members IS NOT NULL')).all()
+            for job_id, github_members in rows:
+                try:
+                    count = len(json.loads(github_members))
+                except (TypeError, ValueError):
+                    count = 0
+                conn.execute(text('UPDATE jobs SET members_count = :count WHERE job_id = :job_id'),
+                             {'count': count, 'job_id': job_id})
+    
+    for index in Job.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
 #database initialization
-def init_db(database_url='sqlite:///pdf_processor.db'):
-    engine = create_engine(database_url)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session
+def init_db(database_url=None):
+    """create the schema (once per process) and return the shared sessionmaker"""
+    return _get_entry(database_url)[1]
+
+def configure_db(database_url):
+    """point get_session / session_scope at a different database"""
+    global _default_url
+    _default_url = database_url
+    return init_db(database_url)
+
+def dispose_engines():
+    """close every pooled connection and forget the registered engines"""
+    with _registry_lock:
+        for engine, _ in _registry.values():
+            engine.dispose()
+        _registry.clear()
 
 #helper function to get a session
 def get_session():
     Session = init_db()
-    return Session()
\ No newline at end of file
+    return Session()
+
+@contextmanager
+def session_scope():
+    """transactional scope: commit on success, rollback on error, always close"""
+    session = get_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+#keyset pagination for the documents listing
+LIST_COLUMNS = (
+    Job.job_id,
+    Job.pdf_filename,
+    Job.status,
+    Job.timestamp,
+    Job.company_name,
+    Job.members_count,
+    Job.error_message,
+)
+
+def encode_cursor(timestamp, job_id):
+    """opaque cursor pointing at the last row of a page"""
+    raw = f"{timestamp.isoformat()}|{job_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, job_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), job_id
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def list_jobs(session, limit=50, cursor=None, status=None, company=None):
+    """return (rows, next_cursor) ordered newest first by (timestamp, job_id)"""
+    query = session.query(*LIST_COLUMNS)
+    
+    if status:
+        query = query.filter(Job.status == status)
+    if company:
+        query = query.filter(Job.company_name == company)
+    if cursor:
+        timestamp, job_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Job.timestamp < timestamp,
+            and_(Job.timestamp == timestamp, Job.job_id < job_id),
+        ))
+    
+    rows = query.order_by(Job.timestamp.desc(), Job.job_id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].job_id)
+    return rows, next_cursor
+
+def _reusable():
+    """completed with github data, from a run that did not fall back anywhere"""
+    return and_(Job.status == 'completed', Job.github_org_data.isnot(None),
+                or_(Job.degraded.is_(None), Job.degraded == 0))
+
+def find_completed_duplicate(session, content_hash, max_age_seconds=None):
+    """newest reusable completed job for the same pdf content, or None.
+
+    Only fully enriched, non-degraded results are reused, so an empty or
+    partial run is never copied onto later uploads. max_age_seconds bounds
+    how old reusable results may be; 0 disables reuse and None accepts
+    results of any age.
+    """
+    if not content_hash or max_age_seconds == 0:
+        return None
+    
+    query = session.query(Job).filter(Job.content_hash == content_hash, _reusable())
+    if max_age_seconds is not None:
+        query = query.filter(Job.timestamp >= datetime.now() - timedelta(seconds=max_age_seconds))
+    return query.order_by(Job.timestamp.desc()).first()
+
+def find_completed_duplicates(session, content_hashes, max_age_seconds=None):
+    """find_completed_duplicate for many hashes in one query: {content_hash: newest completed job}"""
+    content_hashes = {content_hash for content_hash in content_hashes if content_hash}
+    if not content_hashes or max_age_seconds == 0:
+        return {}
+    
+    query = session.query(Job).filter(Job.content_hash.in_(content_hashes), _reusable())
+    if max_age_seconds is not None:
+        query = query.filter(Job.timestamp >= datetime.now() - timedelta(seconds=max_age_seconds))
+    
+    duplicates = {}
+    for job in query.order_by(Job.timestamp.desc()):
+        duplicates.setdefault(job.content_hash, job)
+    return duplicates
+
+def batch_summary(session, batch_id):
+    """per-status counts and job rows of a bulk upload, or None if the batch is unknown"""
+    counts = dict(
+        session.query(Job.status, func.count(Job.job_id))
+        .filter(Job.batch_id == batch_id)
+        .group_by(Job.status)
+        .all()
+    )
+    if not counts:
+        return None
+    
+    rows = session.query(*LIST_COLUMNS).filter(Job.batch_id == batch_id).order_by(Job.pdf_filename, Job.job_id).all()
+    return {'counts': counts, 'total': sum(counts.values()), 'rows': rows}
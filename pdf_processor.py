@@ -1,54 +1,416 @@
-import fitz  
-from tqdm.auto import tqdm
+import fitz
 import os
+import hashlib
 import logging
+import zipfile
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, Optional, Union
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
 
 logger = logging.getLogger(__name__)
 
+#every pdf starts with this header; readers accept it anywhere in the first 1 KB
+PDF_MAGIC = b'%PDF-'
+PDF_MAGIC_WINDOW = 1024
+
+class UploadRejectedError(ValueError):
+    """an upload failed a check while being streamed; nothing was kept on disk"""
+    status_code = 400
+
+class FileTooLargeError(UploadRejectedError):
+    status_code = 413
+
+class NotAPDFError(UploadRejectedError):
+    """the content has no pdf header, whatever the file is called"""
+
 def text_formatter(text: str) -> str:
     cleaned_text = text.replace("\n", " ").strip()
     return cleaned_text
 
-def open_and_read_pdf(pdf_path: str) -> list[dict]:
-    doc = fitz.open(pdf_path)
-    pages_and_texts = []
-    for page_number in tqdm(range(doc.page_count)):
-        page = doc.load_page(page_number)
-        text = page.get_text("text", sort=True)
-        text = text_formatter(text)
-        pages_and_texts.append({
-            "page_number": page_number,
-            "page_char_count": len(text),
-            "page_word_count": len(text.split()),
-                                "page_sentence_count_raw": len(text.split(". ")),
-                                "page_token_count": len(text) / 4,
-                                "text": text
-                                })
-    return pages_and_texts
+def page_stats(text: str) -> dict:
+    """word, sentence and token statistics for one page of formatted text"""
+    return {
+        "page_char_count": len(text),
+        "page_word_count": len(text.split()),
+        "page_sentence_count_raw": len(text.split(". ")),
+        "page_token_count": len(text) / 4,
+    }
+
+#progress callbacks receive (pages_done, page_count)
+Progress = Optional[Callable[[int, int], None]]
+
+#a pdf to read: a file path, or the document itself held in memory
+PDFSource = Union[str, bytes, bytearray, memoryview]
+
+def is_in_memory(source: PDFSource) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+def open_pdf(source: PDFSource):
+    """fitz document for a path, or for an in-memory pdf opened in place (stream mode, no copy)"""
+    if is_in_memory(source):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+def iter_pdf_pages(pdf_path: PDFSource, sort: bool = False, with_stats: bool = False,
+                   progress: Progress = None) -> Iterator[dict]:
+    """lazily yield formatted pages; closing the generator closes the document"""
+    doc = open_pdf(pdf_path)
+    try:
+        for page_number in range(doc.page_count):
+            page = doc.load_page(page_number)
+            text = text_formatter(page.get_text("text", sort=sort))
+            page_data = {"page_number": page_number, "text": text}
+            if with_stats:
+                page_data.update(page_stats(text))
+            if progress:
+                progress(page_number + 1, doc.page_count)
+            yield page_data
+    finally:
+        doc.close()
+
+def open_and_read_pdf(pdf_path: PDFSource, sort: bool = False, with_stats: bool = False,
+                      progress: Progress = None) -> list[dict]:
+    """every page at once; unsorted and without stats unless asked for"""
+    return list(iter_pdf_pages(pdf_path, sort=sort, with_stats=with_stats, progress=progress))
+
+def _read_page_range(task: tuple) -> list[dict]:
+    """process-pool worker: open a private document and extract [start, stop)"""
+    pdf_path, start, stop, sort, with_stats = task
+    doc = open_pdf(pdf_path)
+    try:
+        pages = []
+        for page_number in range(start, stop):
+            text = text_formatter(doc.load_page(page_number).get_text("text", sort=sort))
+            page_data = {"page_number": page_number, "text": text}
+            if with_stats:
+                page_data.update(page_stats(text))
+            pages.append(page_data)
+        return pages
+    finally:
+        doc.close()
+
+def parallel_read_pdf(pdf_path: PDFSource, workers: Optional[int] = None, chunk_size: int = 16,
+                      min_pages: int = 64, sort: bool = True, with_stats: bool = False,
+                      progress: Progress = None) -> list[dict]:
+    """extract every page, splitting page ranges across a process pool.
+
+    Documents shorter than min_pages, single-worker configs and callers that
+    are themselves daemonic pool children (e.g. celery prefork) are read serially.
+    An in-memory pdf that does go to the pool is spooled to a temporary file
+    first, so each worker opens it from disk instead of unpickling a copy.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(chunk_size, 1)
+
+    with open_pdf(pdf_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count < min_pages or multiprocessing.current_process().daemon:
+        pages = _read_page_range((pdf_path, 0, page_count, sort, with_stats))
+        if progress:
+            progress(page_count, page_count)
+        return pages
+
+    if is_in_memory(pdf_path):
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spool:
+            spool.write(pdf_path)
+        try:
+            return parallel_read_pdf(spool.name, workers=workers, chunk_size=chunk_size, min_pages=min_pages,
+                                     sort=sort, with_stats=with_stats, progress=progress)
+        finally:
+            os.remove(spool.name)
+
+    tasks = [
+        (pdf_path, start, min(start + chunk_size, page_count), sort, with_stats)
+        for start in range(0, page_count, chunk_size)
+    ]
+    pages = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        #map() yields chunk results in submission order, i.e. page order
+        for chunk in executor.map(_read_page_range, tasks):
+            pages.extend(chunk)
+            if progress:
+                progress(len(pages), page_count)
+    return pages
+
+def iter_pdf_uploads(files) -> Iterator[tuple]:
+    """yield (name, stream, error) for uploaded (name, stream) pairs, expanding zip archives.
+
+    PDF streams are passed through untouched, so a multipart part can be
+    copied straight to its final place. A zip archive needs random access,
+    so it is spooled to a temporary file first; its members are then opened
+    one at a time and decompressed straight to wherever the caller copies
+    the stream. Non-pdf files are yielded with an error rather than
+    skipped, so callers can report them; directories and hidden entries
+    (e.g. __MACOSX) are ignored.
+    """
+    for name, stream in files:
+        name = name or ''
+        if not name.lower().endswith('.zip'):
+            error = None if name.lower().endswith('.pdf') else 'Invalid file type. Only PDF files are allowed'
+            yield name, stream, error
+            continue
+        
+        with tempfile.TemporaryFile() as spool:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    break
+                spool.write(chunk)
+            spool.seek(0)
+            try:
+                archive = zipfile.ZipFile(spool)
+            except zipfile.BadZipFile:
+                yield name, None, 'Invalid ZIP archive'
+                continue
+            
+            with archive:
+                for member in archive.infolist():
+                    member_name = os.path.basename(member.filename)
+                    if member.is_dir() or not member_name or member_name.startswith('.') or '__MACOSX/' in member.filename:
+                        continue
+                    if not member_name.lower().endswith('.pdf'):
+                        yield member_name, None, 'Invalid file type. Only PDF files are allowed'
+                        continue
+                    with archive.open(member) as member_stream:
+                        yield member_name, member_stream, None
+
+class _PartReader:
+    """file-like view of one multipart part; body chunks are pulled from the request on demand"""
+
+    def __init__(self, next_event):
+        self._next_event = next_event
+        self._buffer = bytearray()
+        self._done = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._done and (size is None or size < 0 or len(self._buffer) < size):
+            event = self._next_event()
+            if not isinstance(event, Data):
+                raise UploadRejectedError('Malformed multipart body')
+            self._buffer += event.data
+            self._done = not event.more_data
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def drain(self):
+        while self.read(64 * 1024):
+            pass
+
+def iter_multipart_files(stream, boundary, chunk_size: int = 64 * 1024) -> Iterator[tuple]:
+    """yield (field_name, filename, reader) for each file part of a multipart body.
+
+    The body is read from stream chunk_size bytes at a time as the readers
+    are consumed, so nothing is buffered up front the way request.files
+    does. A reader is only valid until the next part is requested; whatever
+    the caller left unread is skipped. Plain form fields are discarded.
+    """
+    decoder = MultipartDecoder(boundary.encode() if isinstance(boundary, str) else boundary)
+    
+    def next_event():
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError:
+                raise UploadRejectedError('Incomplete multipart body' if decoder.complete else 'Malformed multipart body')
+            if not isinstance(event, NeedData):
+                return event
+            if decoder.complete:
+                raise UploadRejectedError('Incomplete multipart body')
+            decoder.receive_data(stream.read(chunk_size) or None)
+    
+    while True:
+        event = next_event()
+        if isinstance(event, Epilogue):
+            return
+        if isinstance(event, (File, Field)):
+            reader = _PartReader(next_event)
+            if isinstance(event, File):
+                yield event.name, event.filename, reader
+            reader.drain()
+
+def _read_head(stream, size: int) -> bytes:
+    """first size bytes of stream (fewer only at end of stream)"""
+    head = b''
+    while len(head) < size:
+        chunk = stream.read(size - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
 
 class PDFProcessor:
-    def __init__(self, upload_folder='uploads'):
+    def __init__(self, upload_folder='uploads', workers: int = 1, chunk_size: int = 16,
+                 parallel_min_pages: int = 64):
         self.upload_folder = upload_folder
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.parallel_min_pages = parallel_min_pages
         os.makedirs(upload_folder, exist_ok=True)
-    
-    def process_pdf(self, pdf_path: str) -> str:
-        """Process PDF and return combined text from all pages"""
+
+    def process_pdf(self, pdf_path: PDFSource, max_chars: Optional[int] = None, progress: Progress = None) -> str:
+        """Process PDF and return combined page text.
+
+        pdf_path is a file path or the pdf's bytes (bytes, bytearray or
+        memoryview), which are read in place without touching the disk.
+        With max_chars, pages are read lazily and extraction stops as soon as
+        at least max_chars characters have been collected. progress, if
+        given, is called with (pages_done, page_count) as pages are read.
+        """
         try:
-            logger.info(f"Processing PDF: {pdf_path}")
-            pages_data = open_and_read_pdf(pdf_path)
-            
+            logger.info(f"Processing PDF: {'<%d bytes in memory>' % len(pdf_path) if is_in_memory(pdf_path) else pdf_path}")
+            if max_chars is not None:
+                return self._read_prefix(pdf_path, max_chars, progress=progress)
+
+            if self.workers and self.workers > 1:
+                pages_data = parallel_read_pdf(
+                    pdf_path,
+                    workers=self.workers,
+                    chunk_size=self.chunk_size,
+                    min_pages=self.parallel_min_pages,
+                    sort=False,
+                    progress=progress
+                )
+            else:
+                pages_data = open_and_read_pdf(pdf_path, progress=progress)
+
             #combine all page texts
             combined_text = " ".join([page['text'] for page in pages_data])
-            
+
             logger.info(f"Successfully processed PDF with {len(pages_data)} pages")
             return combined_text
-            
+
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             raise
-    
-    def save_uploaded_file(self, file, filename):
-        """Save uploaded file to disk"""
+
+    def iter_pages(self, pdf_path: PDFSource, with_stats: bool = False, progress: Progress = None) -> Iterator[dict]:
+        """Yield pages one at a time so callers can stop early"""
+        return iter_pdf_pages(pdf_path, with_stats=with_stats, progress=progress)
+
+    def _read_prefix(self, pdf_path: PDFSource, max_chars: int, progress: Progress = None) -> str:
+        texts = []
+        collected = 0
+        pages = self.iter_pages(pdf_path, progress=progress)
+        try:
+            for page in pages:
+                if not page['text']:
+                    continue
+                texts.append(page['text'])
+                collected += len(page['text']) + 1
+                if collected >= max_chars:
+                    break
+        finally:
+            pages.close()
+
+        logger.info(f"Read {len(texts)} pages ({collected} chars) from PDF")
+        return " ".join(texts)
+
+    def save_stream(self, stream, filename, chunk_size=64 * 1024, max_bytes=None, require_pdf=False,
+                    in_memory_max=None):
+        """Copy a readable binary stream to disk in chunks, returning (path, sha256 hex digest).
+
+        With max_bytes, a stream that turns out longer is removed and
+        FileTooLargeError is raised, whatever size its source claimed. With
+        require_pdf, the first PDF_MAGIC_WINDOW bytes are checked for a pdf
+        header before the file is even created; NotAPDFError otherwise.
+        With in_memory_max, a stream of at most that many bytes is kept in
+        memory and returned as a memoryview in place of the path; only a
+        larger one is spilled to disk.
+        """
+        head = b''
+        if require_pdf:
+            head = _read_head(stream, PDF_MAGIC_WINDOW)
+            if PDF_MAGIC not in head:
+                raise NotAPDFError('Invalid file content. Only PDF files are allowed')
+        
+        def chunks():
+            if head:
+                yield head
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        
         file_path = os.path.join(self.upload_folder, filename)
-        file.save(file_path)
-        return file_path
\ No newline at end of file
+        digest = hashlib.sha256()
+        written = 0
+        buffer = bytearray() if in_memory_max is not None else None
+        out = None
+        try:
+            if buffer is None:
+                out = open(file_path, 'wb')
+            for chunk in chunks():
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    break
+                digest.update(chunk)
+                if out is None and written > in_memory_max:
+                    #past the threshold: spill what we have and stream the rest to disk
+                    out = open(file_path, 'wb')
+                    out.write(buffer)
+                    buffer = None
+                if out is None:
+                    buffer += chunk
+                else:
+                    out.write(chunk)
+        except BaseException:
+            #e.g. a request body cut short mid-file
+            if out is not None:
+                out.close()
+                self.remove_file(file_path)
+            raise
+        if out is not None:
+            out.close()
+        if max_bytes is not None and written > max_bytes:
+            if out is not None:
+                self.remove_file(file_path)
+            raise FileTooLargeError(f'File too large. Maximum size is {max_bytes} bytes')
+        if out is None:
+            return memoryview(buffer), digest.hexdigest()
+        return file_path, digest.hexdigest()
+    
+    def ingest_multipart(self, stream, boundary, name_for, field='file', max_bytes=None, chunk_size=64 * 1024,
+                         in_memory_max=None):
+        """Stream the `field` file of a multipart body to disk, checking it on the way.
+
+        name_for(filename) gives the name to store it under. The file name,
+        the pdf header (within the first KB), max_bytes and the body's
+        framing are all checked while streaming, and the content is hashed
+        as it is written. Returns (filename, path, sha256 hex digest);
+        raises an UploadRejectedError (nothing left on disk) otherwise.
+        With in_memory_max, small files come back as a memoryview instead
+        of a path (see save_stream).
+        """
+        if not boundary:
+            raise UploadRejectedError('No file part in request')
+        
+        for name, filename, reader in iter_multipart_files(stream, boundary, chunk_size=chunk_size):
+            if name != field:
+                continue
+            if not filename:
+                raise UploadRejectedError('No file selected')
+            if not filename.lower().endswith('.pdf'):
+                raise UploadRejectedError('Invalid file type. Only PDF files are allowed')
+            
+            file_path, digest = self.save_stream(
+                reader, name_for(filename), chunk_size=chunk_size, max_bytes=max_bytes, require_pdf=True,
+                in_memory_max=in_memory_max
+            )
+            return filename, file_path, digest
+        
+        raise UploadRejectedError('No file part in request')
+    
+    def remove_file(self, file_path):
+        """Delete a saved upload, ignoring files that are already gone"""
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.error(f"Error cleaning up file {file_path}: {str(e)}")
@@ -1,2 +1,2 @@
 #!/bin/bash
-exec gunicorn app:app --bind 0.0.0.0:${PORT:-5000} --workers 1 --threads 2 --timeout 120
\ No newline at end of file
+exec gunicorn app:app --bind 0.0.0.0:${PORT:-5000} --workers 1 --threads ${GUNICORN_THREADS:-8} --timeout 120
\ No newline at end of file
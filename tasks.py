@@ -1,13 +1,22 @@
 import json
 import logging
-import os
-from celery import Celery
-from celery.result import AsyncResult
+import random
+import time
+from typing import Optional
+from celery import Celery, chain
+from celery.exceptions import Retry
 from config import Config
-from models import get_session, Job
+from sqlalchemy.exc import OperationalError
+import requests
+from models import session_scope, Job
 from pdf_processor import PDFProcessor
-from llm_service import LLMService
-from github_service import GitHubService
+from llm_service import LLMService, PROVIDERS
+from llm_batcher import ExtractionBatcher
+from github_service import GitHubService, GitHubUnavailableError
+from cache import tiered_cache, Counters, SQLiteCache, LatencyHistogram
+from http_client import pooled_session_from_config
+from circuit_breaker import breakers_from_config, CircuitOpenError
+from job_events import pubsub_from_config, job_channel
 
 logger = logging.getLogger(__name__)
 
@@ -19,115 +28,392 @@ celery_app.config_from_object({
     'task_serializer': 'json',
     'accept_content': ['json'],
     'result_serializer': 'json',
+    #job status lives in the jobs table; task results are never read, so
+    #none are stored, and any that are (ignore_result=False) expire
+    'task_ignore_result': True,
+    'result_expires': Config.CELERY_RESULT_EXPIRES,
     'timezone': 'UTC',
     'enable_utc': True,
+    #one queue per stage so cpu-bound extraction and i/o-bound llm / github
+    #calls can be served by differently sized worker pools
+    'task_routes': {
+        'pipeline.extract': {'queue': Config.CELERY_QUEUE_EXTRACT},
+        'pipeline.classify': {'queue': Config.CELERY_QUEUE_CLASSIFY},
+        'pipeline.enrich': {'queue': Config.CELERY_QUEUE_ENRICH},
+    },
 })
 
 #initialize services
-pdf_processor = PDFProcessor(Config.UPLOAD_FOLDER)
+pdf_processor = PDFProcessor(
+    Config.UPLOAD_FOLDER,
+    workers=Config.PDF_EXTRACT_WORKERS,
+    chunk_size=Config.PDF_EXTRACT_CHUNK_SIZE,
+    parallel_min_pages=Config.PDF_PARALLEL_MIN_PAGES
+)
 llm_service = LLMService(
-    api_key=Config.GEMINI_API_KEY or Config.HUGGINGFACE_API_KEY
+    api_key=Config.GEMINI_API_KEY or Config.HUGGINGFACE_API_KEY,
+    cache=tiered_cache(
+        Config.CACHE_DB_PATH, 'llm',
+        memory_size=Config.LLM_CACHE_MEMORY_SIZE,
+        max_entries=Config.LLM_CACHE_MAX_ENTRIES,
+        ttl=Config.LLM_CACHE_TTL
+    ),
+    http=pooled_session_from_config(Config),
+    local_confidence_threshold=Config.LLM_LOCAL_CONFIDENCE_THRESHOLD,
+    tier_stats=Counters(SQLiteCache(Config.CACHE_DB_PATH, namespace='llm_tiers') if Config.CACHE_DB_PATH else None),
+    hedge_delay=Config.LLM_HEDGE_DELAY,
+    latency=LatencyHistogram(Counters(SQLiteCache(Config.CACHE_DB_PATH, namespace='llm_latency') if Config.CACHE_DB_PATH else None)),
+    breakers=breakers_from_config(Config, PROVIDERS, Config.CACHE_DB_PATH)
+)
+github_service = GitHubService(
+    token=Config.GITHUB_TOKEN,
+    http_cache=tiered_cache(
+        Config.CACHE_DB_PATH, 'github_http',
+        memory_size=Config.GITHUB_CACHE_MEMORY_SIZE,
+        max_entries=Config.GITHUB_CACHE_MAX_ENTRIES,
+        ttl=Config.GITHUB_CACHE_TTL
+    ),
+    cache_fresh_seconds=Config.GITHUB_CACHE_FRESH_SECONDS,
+    org_cache=tiered_cache(Config.CACHE_DB_PATH, 'github_orgs', ttl=Config.GITHUB_ORG_CACHE_TTL),
+    org_ttl=Config.GITHUB_ORG_CACHE_TTL,
+    org_negative_ttl=Config.GITHUB_ORG_NEGATIVE_TTL,
+    http=pooled_session_from_config(Config),
+    member_concurrency=Config.GITHUB_MEMBERS_CONCURRENCY,
+    breaker=breakers_from_config(Config, ['github'], Config.CACHE_DB_PATH)['github']
+)
+llm_batcher = ExtractionBatcher(llm_service, window=Config.LLM_BATCH_WINDOW, max_items=Config.LLM_BATCH_SIZE)
+#status transitions are published here for the api's status streams
+job_events = pubsub_from_config(Config)
+
+#pipeline stages; each persists its output on the job (a checkpoint) and
+#hands the next stage nothing but the job id, so stages can run on
+#different workers and a retried job resumes after its last checkpoint
+RETRYABLE_ERRORS = (
+    GitHubUnavailableError,
+    CircuitOpenError,
+    requests.exceptions.RequestException,
+    OperationalError,
 )
-github_service = GitHubService(token=Config.GITHUB_TOKEN)
 
-@celery_app.task(name='process_pdf')
-def process_pdf_async(job_id: str, file_path: str):
-    """async task to process pdf and extract company information"""
-    import random
-    import time as time_module
+class ProgressReporter:
+    """structured progress of the running stage, stored on the job row.
+
+    The job table is the only place status is read from, so progress is
+    written there too (and announced to status streams). A stage change
+    is written straight away; page and call counts at most once per
+    min_interval seconds, so a 1,000-page document costs a handful of
+    writes, not one per page.
+    """
     
-    session = get_session()
-    job = session.query(Job).filter_by(job_id=job_id).first()
+    def __init__(self, job_id: Optional[str] = None, min_interval: Optional[float] = None):
+        self.job_id = job_id
+        self.min_interval = Config.TASK_PROGRESS_INTERVAL if min_interval is None else min_interval
+        self.meta = {}
+        self.writes = 0
+        self._written_at = None
+        self._dirty = False
+    
+    def start(self, stage: str, current: int = 0, total: int = 1, **fields):
+        """enter a stage; always written"""
+        self.meta = {**self.meta, 'stage': stage, 'current': current, 'total': total, **fields}
+        self._write()
+    
+    def update(self, **fields):
+        """merge fields; written only if min_interval has passed since the last write"""
+        self.meta.update(fields)
+        self._dirty = True
+        if self._written_at is None or time.monotonic() - self._written_at >= self.min_interval:
+            self._write()
     
+    def pages(self, done: int, total: int):
+        self.update(current=done, total=total)
+    
+    def flush(self):
+        if self._dirty:
+            self._write()
+    
+    def _write(self):
+        self._dirty = False
+        self._written_at = time.monotonic()
+        if self.job_id is None:
+            return
+        try:
+            with session_scope() as session:
+                session.query(Job).filter_by(job_id=self.job_id).update({'progress': json.dumps(self.meta)})
+            self.writes += 1
+        except Exception as e:
+            #progress is advisory; never fail a job over it
+            logger.warning(f"Could not report progress for job {self.job_id}: {str(e)}")
+            return
+        _publish(self.job_id, 'processing', self.meta.get('stage'))
+
+def retry_countdown(retries: int) -> int:
+    """exponential backoff before automatic retry number retries + 1"""
+    return min(Config.TASK_RETRY_BACKOFF * 2 ** retries, Config.TASK_RETRY_BACKOFF_MAX)
+
+def _load_job(session, job_id: str) -> Optional[Job]:
+    job = session.query(Job).filter_by(job_id=job_id).first()
     if not job:
         logger.error(f"Job {job_id} not found")
-        return {'status': 'failed', 'error': 'Job not found'}
+    return job
+
+def _publish(job_id: str, status: str, stage: Optional[str] = None):
+    """announce a committed transition; listeners re-read the job themselves"""
+    job_events.publish(job_channel(job_id), {'job_id': job_id, 'status': status, 'stage': stage})
+
+def _mark_processing(job_id: str):
+    """flag the job as running at the start of every stage (a resumed job may
+    start at any of them); the transition is published only when it happens"""
+    with session_scope() as session:
+        started = session.query(Job).filter(Job.job_id == job_id, Job.status != 'processing').update(
+            {'status': 'processing'}, synchronize_session=False
+        )
+    if started:
+        _publish(job_id, 'processing')
+
+def _checkpoint(job_id: str, stage: str, **values):
+    """store a stage's output together with the stage marker, atomically.
+
+    retry_count and error_message belong to the stage that just finished,
+    so they are cleared; the next stage starts with a clean slate.
+    """
+    with session_scope() as session:
+        session.query(Job).filter_by(job_id=job_id).update(
+            {**values, 'completed_stage': stage, 'retry_count': 0, 'error_message': None}
+        )
+    _publish(job_id, 'processing', stage)
+
+def _fail_job(job_id: str, error: Exception):
+    with session_scope() as session:
+        job = session.query(Job).filter_by(job_id=job_id).first()
+        if job is not None:
+            job.status = 'failed'
+            job.error_message = str(error)
+    logger.error(f"Job {job_id} failed: {str(error)}")
+    _publish(job_id, 'failed')
+
+def run_extract(job_id: str, file_path: str, progress: Optional[ProgressReporter] = None) -> Optional[str]:
+    """stage 1 (cpu): pdf text -> job.extracted_text; the upload is removed once stored"""
+    progress = progress or ProgressReporter(job_id)
+    with session_scope() as session:
+        job = _load_job(session, job_id)
+        if not job:
+            return None
+        extracted = job.stage_done('extract')
+    _mark_processing(job_id)
+    if extracted:
+        logger.info(f"Job {job_id}: extracted text already checkpointed")
+        return job_id
     
-    try:
-        # update status to processing
-        setattr(job, 'status', 'processing')
-        session.commit()
-        
-        # simulate long processing time (30-300 seconds)
-        delay = random.randint(30, 300)
-        logger.info(f"Simulating processing delay of {delay} seconds for job {job_id}")
-        time_module.sleep(delay)
-        
-        #extract text from pdf
-        logger.info(f"Processing PDF for job {job_id}")
-        pdf_text = pdf_processor.process_pdf(file_path)
-        
-        #extract company name using llm
-        logger.info(f"Extracting company name for job {job_id}")
-        company_name = llm_service.extract_company_name(pdf_text)
+    logger.info(f"Processing PDF for job {job_id}")
+    progress.start('extract', current=0, total=0)
+    pdf_text = pdf_processor.process_pdf(file_path, max_chars=Config.PDF_TEXT_MAX_CHARS, progress=progress.pages)
+    progress.flush()
+    _checkpoint(job_id, 'extract', extracted_text=pdf_text)
+    
+    #clean up uploaded file
+    pdf_processor.remove_file(file_path)
+    return job_id
+
+def run_classify(job_id: Optional[str], progress: Optional[ProgressReporter] = None) -> Optional[str]:
+    """stage 2 (llm i/o): job.extracted_text -> job.company_name"""
+    if job_id is None:
+        return None
+    progress = progress or ProgressReporter(job_id)
+    with session_scope() as session:
+        job = _load_job(session, job_id)
+        if not job:
+            return None
+        if job.stage_done('classify'):
+            logger.info(f"Job {job_id}: company name already checkpointed")
+            return job_id
+        extracted_text = job.extracted_text or ''
+    _mark_processing(job_id)
+    
+    #no session is held open while waiting on the llm providers
+    logger.info(f"Extracting company name for job {job_id}")
+    progress.start('classify')
+    company_name = llm_batcher.extract_company_name(extracted_text)
+    
+    if company_name:
+        logger.info(f"Found company: {company_name}")
+    else:
+        logger.warning(f"No company name extracted for job {job_id}")
+    #an answer given while a provider was skipped may be a weaker tier's guess
+    degraded = {'degraded': 1} if llm_service.degraded() else {}
+    _checkpoint(job_id, 'classify', company_name=company_name, **degraded)
+    return job_id
+
+#github lookups made by the enrich stage, in reporting order
+ENRICH_CALLS = ('organization', 'org_info', 'members')
+
+def run_enrich(job_id: Optional[str], progress: Optional[ProgressReporter] = None) -> Optional[dict]:
+    """stage 3 (github i/o): job.company_name -> org login, org data and members; completes the job.
+
+    Raises GitHubUnavailableError when github could not answer, so the
+    stage is retried instead of completing without data.
+    """
+    if job_id is None:
+        return None
+    progress = progress or ProgressReporter(job_id)
+    with session_scope() as session:
+        job = _load_job(session, job_id)
+        if not job:
+            return None
+        company_name = job.company_name
+        org_login = job.org_login
+    _mark_processing(job_id)
+    
+    calls = {name: 'done' if name == 'organization' and org_login else 'pending' for name in ENRICH_CALLS}
+    def call_done(name):
+        calls[name] = 'done'
+        progress.update(current=list(calls.values()).count('done'), calls=dict(calls))
+    progress.start('enrich', current=list(calls.values()).count('done'),
+                   total=len(ENRICH_CALLS), calls=dict(calls))
+    
+    enrichment = None
+    if company_name:
+        if not org_login:
+            org_login = github_service.resolve_organization(company_name, raise_errors=True)
+            call_done('organization')
+            if org_login:
+                #checkpoint the login so a retry skips the search
+                with session_scope() as session:
+                    session.query(Job).filter_by(job_id=job_id).update({'org_login': org_login})
         
-        if company_name:
-            setattr(job, 'company_name', company_name)
-            logger.info(f"Found company: {company_name}")
-            
-            #get github organization info
+        if org_login:
             logger.info(f"Fetching GitHub info for {company_name}")
-            org_info = github_service.get_organization_info(company_name)
-            
-            if org_info:
-                setattr(job, 'github_org_data', json.dumps(org_info))
-                
-                #get organization members
-                members = github_service.get_organization_members(company_name)
-                setattr(job, 'github_members', json.dumps(members))
-                logger.info(f"Found {len(members)} members for {company_name}")
-            else:
-                logger.warning(f"No GitHub info found for {company_name}")
+            enrichment = github_service.enrich(
+                company_name,
+                info_timeout=Config.GITHUB_INFO_TIMEOUT,
+                members_timeout=Config.GITHUB_MEMBERS_TIMEOUT,
+                org_login=org_login,
+                on_step=call_done
+            )
+            progress.flush()
+            if not enrichment['org_info'] and ('org_info' in enrichment['timed_out'] or github_service.breaker.is_open()):
+                raise GitHubUnavailableError(f"organization info for {org_login} unavailable")
         else:
-            logger.warning(f"No company name extracted for job {job_id}")
-        
-        setattr(job, 'status', 'completed')
-        session.commit()
-        
-        return {
-            'status': 'completed',
-            'job_id': job_id,
-            'company_name': company_name,
-            'members_count': len(json.loads(getattr(job, 'github_members'))) if getattr(job, 'github_members', None) else 0
-            }
+            logger.warning(f"No GitHub organization found for company: {company_name}")
+    
+    with session_scope() as session:
+        job = _load_job(session, job_id)
+        if enrichment and enrichment['org_info']:
+            job.github_org_data = json.dumps(enrichment['org_info'])
+            #organization members were fetched alongside the info
+            job.set_members(enrichment['members'])
+            logger.info(f"Found {len(enrichment['members'])} members for {company_name}")
+        elif company_name:
+            logger.warning(f"No GitHub info found for {company_name}")
+        if company_name and github_service.degraded(enrichment):
+            job.degraded = 1
+        job.completed_stage = 'enrich'
+        job.status = 'completed'
+        job.error_message = None
+        job.retry_count = 0
+        job.progress = None
+        members_count = job.members_count or 0
+    _publish(job_id, 'completed', 'enrich')
+    
+    return {
+        'status': 'completed',
+        'job_id': job_id,
+        'company_name': company_name,
+        'members_count': members_count
+    }
+
+def _run_stage(task, stage, job_id, *args, file_path=None):
+    """run a stage, retrying transient errors with backoff and failing the job otherwise.
+
+    A retry re-runs the same stage; earlier stages are never repeated
+    because their outputs are checkpointed on the job.
+    """
+    progress = ProgressReporter(job_id)
+    try:
+        return stage(job_id, *args, progress=progress)
+    except RETRYABLE_ERRORS as e:
+        retries = task.request.retries
+        if retries < Config.TASK_MAX_RETRIES:
+            countdown = retry_countdown(retries)
+            logger.warning(f"Job {job_id}: {stage.__name__} failed ({str(e)}), retrying in {countdown}s")
+            with session_scope() as session:
+                session.query(Job).filter_by(job_id=job_id).update({'retry_count': retries + 1, 'error_message': str(e)})
+            _publish(job_id, 'processing')
+            try:
+                raise task.retry(exc=e, countdown=countdown, max_retries=Config.TASK_MAX_RETRIES)
+            except Retry:
+                raise
+            except Exception:
+                #celery refused the retry (its own limit): fail the job rather than leave it processing
+                pass
+        _fail_job(job_id, e)
     except Exception as e:
-        setattr(job, 'status', 'failed')
-        setattr(job, 'error_message', str(e))
-        session.commit()
-        return {
-            'status': 'failed',
-            'job_id': job_id,
-            'error': str(e)
-        }
-        
-    finally:
-        session.close()
-        
-        #clean up uploaded file
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            logger.error(f"Error cleaning up file {file_path}: {str(e)}")
-
-def get_task_status(task_id: str):
-    """get the status of a celery task"""
-    result = AsyncResult(task_id, app=celery_app)
-    
-    if result.ready():
-        if result.successful():
-            return {
-                'status': 'completed',
-                'result': result.result
-            }
-        else:
-            return {
-                'status': 'failed',
-                'error': str(result.info)
-            }
-    else:
-        return {
-            'status': 'processing',
-            'current': result.info.get('current', 0) if result.info else 0,
-            'total': result.info.get('total', 1) if result.info else 1
-        }
\ No newline at end of file
+        _fail_job(job_id, e)
+    
+    if file_path:
+        pdf_processor.remove_file(file_path)
+    return None
+
+@celery_app.task(name='pipeline.extract', bind=True, max_retries=Config.TASK_MAX_RETRIES)
+def extract_pdf_task(self, job_id: str, file_path: str):
+    return _run_stage(self, run_extract, job_id, file_path, file_path=file_path)
+
+@celery_app.task(name='pipeline.classify', bind=True, max_retries=Config.TASK_MAX_RETRIES)
+def classify_company_task(self, job_id: Optional[str]):
+    return _run_stage(self, run_classify, job_id)
+
+@celery_app.task(name='pipeline.enrich', bind=True, max_retries=Config.TASK_MAX_RETRIES)
+def enrich_company_task(self, job_id: Optional[str]):
+    return _run_stage(self, run_enrich, job_id)
+
+@celery_app.task(name='process_pdf', bind=True, max_retries=Config.TASK_MAX_RETRIES)
+def process_pdf_async(self, job_id: str, file_path: str):
+    """all three stages in one task, for messages queued before the pipeline split.
+
+    On retry the completed stages are skipped via their checkpoints.
+    """
+    def all_stages(job_id, file_path, progress=None):
+        job_id = run_extract(job_id, file_path, progress=progress)
+        return run_enrich(run_classify(job_id, progress=progress), progress=progress)
+    
+    result = _run_stage(self, all_stages, job_id, file_path, file_path=file_path)
+    return result or {'status': 'failed', 'job_id': job_id, 'error': 'Processing failed'}
+
+def processing_delay() -> int:
+    """simulated processing delay in seconds, drawn from the configured range"""
+    if Config.PROCESSING_DELAY_MAX <= 0:
+        return 0
+    #a minimum above the maximum (e.g. only PROCESSING_DELAY_MAX lowered) collapses to the maximum
+    return random.randint(min(Config.PROCESSING_DELAY_MIN, Config.PROCESSING_DELAY_MAX), Config.PROCESSING_DELAY_MAX)
+
+def processing_signature(job_id: str, file_path: str, task_id: str = None):
+    """extract -> classify -> enrich chain that becomes runnable only after the delay.
+
+    The countdown sits on the first stage and turns into an ETA: the worker
+    holds the message without running it, so the wait costs no pool slot.
+    task_id names the final stage, whose result is the job summary.
+    """
+    enrich = enrich_company_task.s()
+    if task_id:
+        enrich = enrich.set(task_id=task_id)
+    return chain(
+        extract_pdf_task.s(job_id, file_path).set(countdown=processing_delay()),
+        classify_company_task.s(),
+        enrich
+    )
+
+def resume_signature(job: Job, file_path: str):
+    """chain of the stages job has not finished yet, starting immediately"""
+    stages = []
+    if not job.stage_done('extract'):
+        stages.append(extract_pdf_task.s(job.job_id, file_path))
+    if not job.stage_done('classify'):
+        stages.append(classify_company_task.s() if stages else classify_company_task.s(job.job_id))
+    stages.append(enrich_company_task.s() if stages else enrich_company_task.s(job.job_id))
+    return chain(*stages)
+
+def schedule_processing(job_id: str, file_path: str, task_id: str = None):
+    """queue one job with the simulated delay; returns the AsyncResult (its id only; results are not stored)"""
+    signature = processing_signature(job_id, file_path, task_id)
+    logger.info(f"Scheduling job {job_id} to start in {signature.tasks[0].options['countdown']} seconds")
+    return signature.apply_async()
@@ -3,7 +3,7 @@ import json
 import tempfile
 import os
 from api import create_app
-from models import init_db, Job
+from models import Job
 from io import BytesIO
 
 
@@ -17,35 +17,39 @@ class TestAPI:
         
         db_url = f'sqlite:///{db_path}'
         
-        # Monkey patch the get_session function to use test database
-        from models import init_db
+        # Point the shared engine registry at the test database
+        import models
         from sqlalchemy.orm import close_all_sessions
         
-        test_session_factory = init_db(db_url)
+        monkeypatch.setattr(models, '_default_url', db_url)
+        models.init_db(db_url)
         
-        def mock_get_session():
-            return test_session_factory()
-        
-        monkeypatch.setattr('models.get_session', mock_get_session)
-        monkeypatch.setattr('api.get_session', mock_get_session)
+        # Keep the shared cache database out of the working tree
+        from config import Config
+        cache_path = f'{db_path}.cache'
+        monkeypatch.setattr(Config, 'CACHE_DB_PATH', cache_path)
         
         app = create_app()
         app.config['TESTING'] = True
         
         yield app
         
-        # Close all sessions before cleanup
+        # Close all sessions and pooled connections before cleanup
         close_all_sessions()
+        models.dispose_engines()
         
         # Force garbage collection to release file handles
         import gc
         gc.collect()
         
         # Try to remove the file, ignore errors on Windows
-        try:
-            os.unlink(db_path)
-        except PermissionError:
-            pass  # Windows sometimes holds the file open
+        for path in (db_path, cache_path, f'{cache_path}-wal', f'{cache_path}-shm'):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                pass  # Windows sometimes holds the file open
     
     @pytest.fixture
     def client(self, app):
@@ -94,7 +98,7 @@ class TestAPI:
         with tempfile.TemporaryDirectory() as tmpdir:
             # Mock the PDFProcessor class before the app creates it
             mock_pdf_processor = mocker.Mock()
-            mock_pdf_processor.save_uploaded_file.return_value = os.path.join(tmpdir, 'test.pdf')
+            mock_pdf_processor.ingest_multipart.return_value = ('test.pdf', os.path.join(tmpdir, 'test.pdf'), 'a' * 64)
             mock_pdf_processor.process_pdf.return_value = 'Sample PDF text content'
             
             # Mock the LLMService class  
@@ -105,6 +109,12 @@ class TestAPI:
             mock_github_service = mocker.Mock()
             mock_github_service.get_organization_info.return_value = {'name': 'test-org'}
             mock_github_service.get_organization_members.return_value = ['user1', 'user2']
+            mock_github_service.enrich.return_value = {
+                'org_login': 'test-org',
+                'org_info': {'name': 'test-org'},
+                'members': ['user1', 'user2'],
+                'timed_out': []
+            }
             
             # Patch the classes at import time
             monkeypatch.setattr('api.PDFProcessor', lambda *args, **kwargs: mock_pdf_processor)
@@ -118,7 +128,7 @@ class TestAPI:
             
             response = test_client.post(
                 '/api/documents/upload',
-                data={'file': (BytesIO(b'PDF content'), 'test.pdf')},
+                data={'file': (BytesIO(b'%PDF-1.4 content'), 'test.pdf')},
                 content_type='multipart/form-data'
             )
             
@@ -127,6 +137,28 @@ class TestAPI:
             assert 'job_id' in data
             assert data['status'] in ['pending', 'processing', 'completed']
     
+    def test_upload_rejects_non_pdf_content(self, client):
+        """Test a file named .pdf without a pdf header is rejected before a job exists"""
+        response = client.post(
+            '/api/documents/upload',
+            data={'file': (BytesIO(b'MZ\x90\x00 not a pdf' * 1000), 'invoice.pdf')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 400
+        assert 'Only PDF files' in response.get_json()['error']
+        assert client.get('/api/documents').get_json()['documents'] == []
+    
+    def test_upload_enforces_max_content_length(self, app, client):
+        """Test bodies over MAX_CONTENT_LENGTH get a 413 and no job"""
+        app.config['MAX_CONTENT_LENGTH'] = 1024
+        response = client.post(
+            '/api/documents/upload',
+            data={'file': (BytesIO(b'%PDF-1.4' + b'x' * 4096), 'big.pdf')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 413
+        assert client.get('/api/documents').get_json()['documents'] == []
+    
     def test_get_job_status_invalid_id(self, client):
         """Test status check with invalid job ID"""
         response = client.get('/api/documents/status/invalid-id')
@@ -168,6 +200,24 @@ class TestAPI:
         assert data['github_members'] == ['user1', 'user2']
         assert data['members_count'] == 2
     
+    def test_stream_job_status(self, client, app):
+        """Test the status stream sends the current status and ends for a finished job"""
+        from models import get_session, Job
+        session = get_session()
+        session.add(Job(job_id='123e4567-e89b-12d3-a456-426614174000', pdf_filename='test.pdf',
+                        status='failed', error_message='broken pdf'))
+        session.commit()
+        session.close()
+        
+        response = client.get('/api/documents/status/123e4567-e89b-12d3-a456-426614174000/stream')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = [block for block in response.get_data(as_text=True).split('\n\n') if block.startswith(('data:', 'event:'))]
+        assert json.loads(events[0][len('data: '):])['error_message'] == 'broken pdf'
+        assert events[1].startswith('event: end')
+        
+        assert client.get('/api/documents/status/123e4567-e89b-12d3-a456-426614174001/stream').status_code == 404
+    
     def test_list_documents(self, client, app):
         """Test listing all documents"""
         # Create some jobs
@@ -189,4 +239,117 @@ class TestAPI:
         assert response.status_code == 200
         data = response.get_json()
         assert len(data['documents']) == 3
-        # API doesn't return 'total' field, only 'documents'
\ No newline at end of file
+        # API doesn't return 'total' field, only 'documents'
+    
+    def test_list_documents_pagination(self, client, app):
+        """Test keyset pagination walks every document exactly once"""
+        from datetime import datetime, timedelta
+        from models import get_session, Job
+        session = get_session()
+        
+        base = datetime(2024, 1, 1)
+        for i in range(5):
+            session.add(Job(
+                pdf_filename=f'test{i}.pdf',
+                status='completed',
+                timestamp=base + timedelta(minutes=i // 2)  # duplicate timestamps
+            ))
+        session.commit()
+        session.close()
+        
+        seen = []
+        cursor = None
+        while True:
+            url = '/api/documents?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            data = client.get(url).get_json()
+            assert len(data['documents']) <= 2
+            seen.extend(doc['job_id'] for doc in data['documents'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+    
+    def test_list_documents_filters(self, client, app):
+        """Test status and company filters and the stored members_count"""
+        from models import get_session, Job
+        session = get_session()
+        
+        job = Job(pdf_filename='a.pdf', status='completed', company_name='github')
+        job.set_members(['user1', 'user2'])
+        session.add(job)
+        session.add(Job(pdf_filename='b.pdf', status='failed', company_name='github'))
+        session.add(Job(pdf_filename='c.pdf', status='completed', company_name='gitlab'))
+        session.commit()
+        session.close()
+        
+        data = client.get('/api/documents?status=completed&company=github').get_json()
+        assert len(data['documents']) == 1
+        assert data['documents'][0]['pdf_filename'] == 'a.pdf'
+        assert data['documents'][0]['members_count'] == 2
+        assert data['next_cursor'] is None
+    
+    def test_list_documents_invalid_params(self, client):
+        """Test malformed cursor and limit are rejected"""
+        assert client.get('/api/documents?cursor=not-a-cursor').status_code == 400
+        assert client.get('/api/documents?limit=abc').status_code == 400
+        assert client.get('/api/documents?limit=0').status_code == 400
+    
+    def test_upload_duplicate_reuses_results(self, app, mocker, monkeypatch):
+        """Test re-uploading identical content skips processing"""
+        mock_llm_service = mocker.Mock()
+        mock_llm_service.extract_company_name.return_value = 'github'
+        mock_llm_service.degraded.return_value = False
+        mock_github_service = mocker.Mock()
+        mock_github_service.degraded.return_value = False
+        mock_github_service.get_organization_info.return_value = {'login': 'github'}
+        mock_github_service.get_organization_members.return_value = ['user1', 'user2']
+        mock_github_service.enrich.return_value = {
+            'org_login': 'github',
+            'org_info': {'login': 'github'},
+            'members': ['user1', 'user2'],
+            'timed_out': []
+        }
+        mock_process_pdf = mocker.patch('api.PDFProcessor.process_pdf', return_value='GitHub brochure')
+        
+        monkeypatch.setattr('api.LLMService', lambda *args, **kwargs: mock_llm_service)
+        monkeypatch.setattr('api.GitHubService', lambda *args, **kwargs: mock_github_service)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.setattr('api.Config.UPLOAD_FOLDER', tmpdir)
+            from api import create_app
+            test_app = create_app()
+            test_client = test_app.test_client()
+            
+            first = test_client.post(
+                '/api/documents/upload',
+                data={'file': (BytesIO(b'%PDF-1.4 same bytes'), 'a.pdf')},
+                content_type='multipart/form-data'
+            ).get_json()
+            second = test_client.post(
+                '/api/documents/upload',
+                data={'file': (BytesIO(b'%PDF-1.4 same bytes'), 'b.pdf')},
+                content_type='multipart/form-data'
+            ).get_json()
+            
+            assert first['status'] == 'completed'
+            assert second['status'] == 'completed'
+            assert second['deduplicated_from'] == first['job_id']
+            assert mock_process_pdf.call_count == 1
+            assert mock_llm_service.extract_company_name.call_count == 1
+            #small uploads are processed from memory and never written out
+            assert isinstance(mock_process_pdf.call_args[0][0], memoryview)
+            assert os.listdir(tmpdir) == []
+            
+            status = test_client.get(f"/api/documents/status/{second['job_id']}").get_json()
+            assert status['company_name'] == 'github'
+            assert status['members_count'] == 2
+    
+    def test_stats(self, client):
+        """Test cache counters are exposed"""
+        response = client.get('/api/stats')
+        assert response.status_code == 200
+        assert 'process' in response.get_json()['llm_cache']
+        assert 'process' in response.get_json()['llm_tiers']
+        assert 'process' in response.get_json()['llm_latency']
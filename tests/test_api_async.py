@@ -0,0 +1,302 @@
+import pytest
+import os
+import tempfile
+import zipfile
+from io import BytesIO
+from models import Job, session_scope
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Create the async app against a throwaway database and upload folder"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        import models
+        from config import Config
+        db_url = f"sqlite:///{os.path.join(tmpdir, 'jobs.db')}"
+        monkeypatch.setattr(models, '_default_url', db_url)
+        monkeypatch.setattr(Config, 'CACHE_DB_PATH', os.path.join(tmpdir, 'cache.db'))
+        monkeypatch.setattr(Config, 'UPLOAD_FOLDER', os.path.join(tmpdir, 'uploads'))
+        monkeypatch.setattr(Config, 'JOB_EVENTS_URL', '')
+        models.init_db(db_url)
+
+        from api_async import create_async_app
+        app = create_async_app()
+        app.config['TESTING'] = True
+        yield app
+
+        models.dispose_engines()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class TestBulkUpload:
+    @pytest.fixture
+    def dispatch(self, mocker):
+        return mocker.patch('api_async.group')
+    
+    def _zip(self, members):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        buffer.seek(0)
+        return buffer
+    
+    def test_multipart_batch(self, client, dispatch, mocker):
+        """Test several pdfs become one batch and one group dispatch"""
+        from werkzeug.formparser import FormDataParser
+        form_parser = mocker.spy(FormDataParser, 'parse')
+        response = client.post('/api/documents/bulk', data={'files': [
+            (BytesIO(b'%PDF-1.4 one'), 'one.pdf'),
+            (BytesIO(b'%PDF-1.4 two'), 'two.pdf'),
+            (BytesIO(b'notes'), 'notes.txt'),
+        ]}, content_type='multipart/form-data')
+        
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body['job_count'] == 2
+        assert body['queued'] == 2
+        assert body['rejected'] == [{'filename': 'notes.txt', 'error': 'Invalid file type. Only PDF files are allowed'}]
+        #parts are streamed from the body; werkzeug never parses and spools the whole form
+        assert form_parser.call_count == 0
+        
+        assert dispatch.call_count == 1
+        signatures = list(dispatch.call_args.args[0])
+        assert [signature.tasks[0].args[0] for signature in signatures] == [job['job_id'] for job in body['jobs']]
+        dispatch.return_value.apply_async.assert_called_once()
+        
+        with session_scope() as session:
+            jobs = session.query(Job).filter_by(batch_id=body['batch_id']).all()
+            assert len(jobs) == 2
+            assert all(job.task_id and job.content_hash for job in jobs)
+        
+        status = client.get(f"/api/documents/batches/{body['batch_id']}").get_json()
+        assert status['status'] == 'pending'
+        assert status['total'] == 2
+        assert status['counts'] == {'pending': 2}
+    
+    def test_zip_archive(self, client, dispatch):
+        """Test pdf members of a zip are extracted and queued"""
+        archive = self._zip({
+            'reports/a.pdf': b'%PDF-1.4 a',
+            'reports/b.PDF': b'%PDF-1.4 b',
+            'reports/readme.md': b'hello',
+            '__MACOSX/reports/._a.pdf': b'junk',
+        })
+        response = client.post('/api/documents/bulk', data={'files': (archive, 'reports.zip')},
+                               content_type='multipart/form-data')
+        
+        body = response.get_json()
+        assert response.status_code == 201
+        assert sorted(job['pdf_filename'] for job in body['jobs']) == ['a.pdf', 'b.PDF']
+        assert [item['filename'] for item in body['rejected']] == ['readme.md']
+    
+    def test_duplicates_are_not_queued(self, client, dispatch):
+        """Test pdfs matching a completed job reuse its results"""
+        import hashlib
+        with session_scope() as session:
+            session.add(Job(pdf_filename='old.pdf', status='completed', company_name='github',
+                            github_org_data='{"login": "github"}', content_hash=hashlib.sha256(b'%PDF-1.4 same').hexdigest()))
+        
+        response = client.post('/api/documents/bulk', data={'files': [(BytesIO(b'%PDF-1.4 same'), 'same.pdf')]},
+                               content_type='multipart/form-data')
+        
+        body = response.get_json()
+        assert body['deduplicated'] == 1
+        assert body['status'] == 'completed'
+        assert dispatch.call_count == 0
+        
+        status = client.get(f"/api/documents/batches/{body['batch_id']}").get_json()
+        assert status['status'] == 'completed'
+        assert status['documents'][0]['company_name'] == 'github'
+    
+    def test_dispatch_failure_fails_the_jobs(self, client, dispatch):
+        """Test jobs are marked failed when the broker is unreachable"""
+        dispatch.return_value.apply_async.side_effect = ConnectionError('broker down')
+        
+        response = client.post('/api/documents/bulk', data={'files': [(BytesIO(b'%PDF-1.4 x'), 'x.pdf')]},
+                               content_type='multipart/form-data')
+        
+        assert response.status_code == 503
+        status = client.get(f"/api/documents/batches/{response.get_json()['batch_id']}").get_json()
+        assert status['counts'] == {'failed': 1}
+    
+    def test_oversized_batch_reports_bulk_limit(self, client, app, dispatch):
+        """Test a batch over BULK_MAX_CONTENT_LENGTH gets a 413 naming that limit"""
+        app.config['BULK_MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
+        response = client.post('/api/documents/bulk', data={'files': [
+            (BytesIO(b'%PDF-1.4' + b'x' * 3 * 1024 * 1024), 'big.pdf')
+        ]}, content_type='multipart/form-data')
+        
+        assert response.status_code == 413
+        assert 'Maximum size is 2MB' in response.get_json()['error']
+        assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+    
+    def test_truncated_batch_leaves_nothing_behind(self, client, app, dispatch):
+        """Test a body cut off mid-batch is rejected and already saved pdfs are removed"""
+        body = (b'--XyZ\r\nContent-Disposition: form-data; name="files"; filename="a.pdf"\r\n\r\n%PDF-1.4 a\r\n'
+                b'--XyZ\r\nContent-Disposition: form-data; name="files"; filename="b.pdf"\r\n\r\n%PDF-1.4 b')
+        response = client.post('/api/documents/bulk', data=body, content_type='multipart/form-data; boundary=XyZ')
+        
+        assert response.status_code == 400
+        assert 'multipart' in response.get_json()['error']
+        assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+        assert dispatch.call_count == 0
+    
+    def test_empty_and_unknown_batches(self, client, dispatch):
+        """Test requests without pdfs and unknown batch ids"""
+        assert client.post('/api/documents/bulk', data={}, content_type='multipart/form-data').status_code == 400
+        response = client.post('/api/documents/bulk', data={'files': [(BytesIO(b'x'), 'x.txt')]},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+        
+        assert client.get('/api/documents/batches/not-a-uuid').status_code == 400
+        assert client.get('/api/documents/batches/123e4567-e89b-12d3-a456-426614174000').status_code == 404
+
+
+class TestJobStatus:
+    def _add_job(self, **values):
+        with session_scope() as session:
+            job = Job(pdf_filename='brochure.pdf', **values)
+            session.add(job)
+            session.flush()
+            return job.job_id
+    
+    def test_status_reports_stages(self, client):
+        """Test the status endpoint shows per-stage progress and retries"""
+        job_id = self._add_job(status='processing', completed_stage='classify', retry_count=1,
+                               error_message='rate limited')
+        
+        data = client.get(f'/api/documents/status/{job_id}').get_json()
+        
+        assert data['stages'] == {'extract': 'done', 'classify': 'done', 'enrich': 'retrying'}
+        assert data['completed_stage'] == 'classify'
+        assert data['retry_count'] == 1
+        assert data['error_message'] == 'rate limited'
+    
+    def test_status_reads_only_the_jobs_table(self, client, mocker):
+        """Test progress comes from the job row and repeat polls are served from memory"""
+        job_id = self._add_job(status='processing', completed_stage='extract',
+                               progress='{"stage": "classify", "current": 0, "total": 1}')
+        import api_async
+        scope = mocker.spy(api_async, 'session_scope')
+        
+        first = client.get(f'/api/documents/status/{job_id}').get_json()
+        for _ in range(5):
+            assert client.get(f'/api/documents/status/{job_id}').get_json() == first
+        
+        assert first['progress'] == {'stage': 'classify', 'current': 0, 'total': 1}
+        assert 'task_status' not in first
+        assert scope.call_count == 1
+    
+    def test_status_cache_expires(self, client, app):
+        """Test a running job's cached status is refreshed after the short ttl"""
+        app.config['STATUS_CACHE_TTL'] = 0.05
+        job_id = self._add_job(status='processing')
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'processing'
+        
+        with session_scope() as session:
+            session.query(Job).filter_by(job_id=job_id).update({'status': 'completed'})
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'processing'
+        
+        import time
+        time.sleep(0.1)
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'completed'
+    
+    def test_retry_resumes_failed_job(self, client, mocker):
+        """Test a failed job is re-queued from its last completed stage"""
+        resume = mocker.patch('api_async.resume_signature')
+        resume.return_value.apply_async.return_value.id = 'task-2'
+        job_id = self._add_job(status='failed', completed_stage='extract', error_message='boom')
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'failed'
+        
+        response = client.post(f'/api/documents/{job_id}/retry')
+        
+        assert response.status_code == 202
+        assert response.get_json()['resumed_after'] == 'extract'
+        #the cached failed status is dropped on retry
+        data = client.get(f'/api/documents/status/{job_id}').get_json()
+        assert data['status'] == 'pending'
+        assert 'error_message' not in data
+    
+    def test_retry_commits_reset_before_dispatch(self, client, mocker):
+        """Test a worker picking up the resumed chain at once sees the reset row and keeps its own status"""
+        job_id = self._add_job(status='failed', completed_stage='extract', error_message='boom', retry_count=3)
+        seen = []
+        def worker_starts(*args, **kwargs):
+            with session_scope() as session:
+                job = session.query(Job).filter_by(job_id=job_id).first()
+                seen.append((job.status, job.error_message, job.retry_count))
+                job.status = 'processing'
+            return mocker.Mock(id='task-2')
+        resume = mocker.patch('api_async.resume_signature')
+        resume.return_value.apply_async.side_effect = worker_starts
+        
+        assert client.post(f'/api/documents/{job_id}/retry').status_code == 202
+        
+        assert seen == [('pending', None, 0)]
+        with session_scope() as session:
+            job = session.query(Job).filter_by(job_id=job_id).first()
+            assert (job.status, job.task_id) == ('processing', 'task-2')
+    
+    def test_failed_status_is_not_cached(self, client):
+        """Test a retry made through any process is seen at once, as failed jobs are never cached"""
+        job_id = self._add_job(status='failed', error_message='boom')
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'failed'
+        
+        #e.g. retried by another worker process, whose cache eviction cannot reach this one
+        with session_scope() as session:
+            session.query(Job).filter_by(job_id=job_id).update({'status': 'pending', 'error_message': None})
+        
+        assert client.get(f'/api/documents/status/{job_id}').get_json()['status'] == 'pending'
+    
+    def test_retry_rejects_unrecoverable_jobs(self, client, mocker):
+        """Test only failed jobs with their input still available can be retried"""
+        mocker.patch('api_async.resume_signature')
+        running = self._add_job(status='processing')
+        no_file = self._add_job(status='failed')
+        
+        assert client.post(f'/api/documents/{running}/retry').status_code == 409
+        assert client.post(f'/api/documents/{no_file}/retry').status_code == 409
+        assert client.post('/api/documents/123e4567-e89b-12d3-a456-426614174000/retry').status_code == 404
+    
+    def test_stream_follows_published_transitions(self, client, app):
+        """Test the status stream pushes the job's status again after a worker publishes"""
+        import threading
+        from job_events import job_channel
+        job_id = self._add_job(status='processing', completed_stage='classify')
+        hub = app.extensions['job_events']
+        
+        def finish():
+            with session_scope() as session:
+                session.query(Job).filter_by(job_id=job_id).update({'status': 'completed', 'completed_stage': 'enrich'})
+            hub.publish(job_channel(job_id), {'job_id': job_id, 'status': 'completed'})
+        
+        threading.Timer(0.1, finish).start()
+        body = client.get(f'/api/documents/status/{job_id}/stream').get_data(as_text=True)
+        
+        assert '"status": "processing"' in body
+        assert '"status": "completed"' in body
+        assert 'event: end' in body
+
+
+class TestStats:
+    def test_stats_reuse_the_factory_views(self, client, mocker):
+        """Test the shared counters and breakers are opened once, not per request"""
+        sqlite_cache = mocker.patch('api_async.SQLiteCache')
+        tiered = mocker.patch('api_async.tiered_cache')
+        breakers = mocker.patch('api_async.breakers_from_config')
+        
+        for _ in range(2):
+            response = client.get('/api/stats')
+            assert response.status_code == 200
+        
+        stats = response.get_json()
+        assert set(stats) == {'llm_cache', 'github_cache', 'llm_tiers', 'llm_latency', 'breakers'}
+        assert 'shared' in stats['llm_tiers'] and 'shared' in stats['llm_latency']
+        assert stats['breakers']['github']['state'] == 'closed'
+        sqlite_cache.assert_not_called()
+        tiered.assert_not_called()
+        breakers.assert_not_called()
@@ -0,0 +1,120 @@
+import pytest
+import os
+import tempfile
+import time
+from cache import LRUCache, SQLiteCache, TieredCache, MISS, Counters, LatencyHistogram
+
+
+class TestCache:
+    @pytest.fixture
+    def cache_path(self):
+        """Path to a throwaway cache database"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield os.path.join(tmpdir, 'cache.db')
+    
+    def test_lru_evicts_least_recently_used(self):
+        """Test the in-process tier keeps at most maxsize entries"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        assert cache.get('a') == 1
+        assert cache.get('b') is MISS
+        assert cache.get('c') == 3
+    
+    def test_lru_ttl(self, mocker):
+        """Test entries expire after their ttl"""
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        
+        mocker.patch('cache.time.time', return_value=time.time() + 11)
+        assert cache.get('a') is MISS
+    
+    def test_sqlite_cache_persists_none(self, cache_path):
+        """Test cached None is distinguishable from a miss and shared across instances"""
+        SQLiteCache(cache_path, namespace='llm').set('key', None)
+        
+        other = SQLiteCache(cache_path, namespace='llm')
+        assert other.get('key') is None
+        assert other.get('missing') is MISS
+        assert SQLiteCache(cache_path, namespace='github').get('key') is MISS
+    
+    def test_sqlite_cache_eviction(self, cache_path):
+        """Test least recently used rows beyond max_entries are evicted"""
+        cache = SQLiteCache(cache_path, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        cache.evict()
+        
+        assert len(cache) == 2
+        assert cache.get('b') is MISS
+    
+    def test_tiered_cache_stats(self, cache_path):
+        """Test hits are served from memory first and counted per tier"""
+        cache = TieredCache(LRUCache(), SQLiteCache(cache_path, namespace='llm'))
+        
+        assert cache.get('key') is MISS
+        cache.set('key', 'github')
+        assert cache.get('key') == 'github'
+        
+        fresh = TieredCache(LRUCache(), SQLiteCache(cache_path, namespace='llm'))
+        assert fresh.get('key') == 'github'
+        
+        assert cache.stats()['process']['memory_hits'] == 1
+        assert fresh.stats()['process']['persistent_hits'] == 1
+        assert fresh.stats()['shared']['misses'] == 1
+    
+    def test_counters_buffer_shared_writes(self, cache_path, mocker):
+        """Test counting stays in memory until flush_every events or flush_interval seconds pass"""
+        store = SQLiteCache(cache_path, namespace='events')
+        write = mocker.spy(store, 'incr_stats')
+        counters = Counters(store, flush_every=3, flush_interval=60)
+        
+        counters.incr('hits')
+        counters.incr('hits')
+        assert write.call_count == 0
+        assert store.read_stats() == {}
+        counters.incr('misses')
+        assert write.call_count == 1
+        assert store.read_stats() == {'hits': 2, 'misses': 1}
+        
+        counters = Counters(store, flush_every=1000, flush_interval=0.05)
+        counters.incr('hits')
+        time.sleep(0.06)
+        counters.incr('hits')
+        assert store.read_stats()['hits'] == 4
+    
+    def test_memory_hits_do_not_write_the_shared_db(self, cache_path, mocker):
+        """Test in-process LRU hits never open a write on the shared database"""
+        cache = TieredCache(LRUCache(), SQLiteCache(cache_path, namespace='llm'))
+        cache.set('key', 'github')
+        write = mocker.spy(cache.persistent, 'incr_stats')
+        
+        for _ in range(50):
+            assert cache.get('key') == 'github'
+        
+        assert write.call_count == 0
+        assert cache.stats()['shared']['memory_hits'] == 50
+    
+    def test_latency_histogram(self, cache_path):
+        """Test observations land in buckets and are summarized across processes"""
+        histogram = LatencyHistogram(Counters(SQLiteCache(cache_path, namespace='latency')), buckets_ms=(100, 1000))
+        histogram.observe('gemini', 0.05)
+        histogram.observe('gemini', 0.5)
+        histogram.observe('gemini', 3.0, ok=False)
+        #one buffered event per observation, written together
+        assert histogram.counters._pending_events == 3
+        histogram.counters.flush()
+        
+        summary = LatencyHistogram(Counters(SQLiteCache(cache_path, namespace='latency')), buckets_ms=(100, 1000)).summary()
+        gemini = summary['shared']['gemini']
+        assert gemini['buckets'] == {'le_100': 1, 'le_1000': 1, 'le_inf': 1}
+        assert gemini['count'] == 3
+        assert gemini['errors'] == 1
+        assert gemini['mean_ms'] == 1183.3
+        assert gemini['p50_ms'] == 1000
+        assert gemini['p95_ms'] is None
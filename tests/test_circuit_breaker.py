@@ -0,0 +1,80 @@
+import pytest
+import os
+import tempfile
+import requests
+from cache import SQLiteCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError, is_provider_failure
+
+
+class TestCircuitBreaker:
+    @pytest.fixture
+    def store_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield os.path.join(tmpdir, 'cache.db')
+    
+    def _fail(self):
+        raise requests.exceptions.ConnectionError()
+    
+    def test_opens_after_consecutive_failures(self):
+        """Test the breaker opens at the threshold and refuses calls"""
+        breaker = CircuitBreaker('gemini', failure_threshold=2, reset_timeout=60)
+        
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                breaker.call(self._fail)
+        
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: 'never called')
+        assert breaker.status()['state'] == 'open'
+    
+    def test_success_resets_failure_count(self):
+        """Test only consecutive failures count"""
+        breaker = CircuitBreaker('gemini', failure_threshold=2)
+        breaker.record_failure()
+        breaker.call(lambda: 'ok')
+        breaker.record_failure()
+        
+        assert breaker.status() == {'state': 'closed', 'failures': 1}
+    
+    def test_half_open_allows_a_single_probe(self, mocker):
+        """Test one caller probes after the timeout; its outcome decides the state"""
+        clock = mocker.patch('circuit_breaker.time.time', return_value=1000.0)
+        breaker = CircuitBreaker('gemini', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        assert not breaker.allow()
+        
+        clock.return_value = 1031.0
+        assert breaker.allow()
+        assert not breaker.allow()  # probe in flight
+        
+        breaker.record_failure()
+        assert breaker.status()['state'] == 'open'
+        
+        clock.return_value = 1062.0
+        assert breaker.call(lambda: 'ok') == 'ok'
+        assert breaker.status()['state'] == 'closed'
+    
+    def test_state_is_shared_through_sqlite(self, store_path):
+        """Test a breaker tripped in one process is open in another"""
+        first = CircuitBreaker('github', SQLiteCache(store_path, namespace='breakers'), failure_threshold=1)
+        second = CircuitBreaker('github', SQLiteCache(store_path, namespace='breakers'), failure_threshold=1)
+        
+        first.record_failure()
+        
+        assert not second.allow()
+        assert second.status()['state'] == 'open'
+    
+    def test_provider_failures(self):
+        """Test transport errors, 5xx and 429 count against the provider"""
+        server_error = requests.exceptions.HTTPError(response=requests.Response())
+        server_error.response.status_code = 503
+        rate_limited = requests.exceptions.HTTPError(response=requests.Response())
+        rate_limited.response.status_code = 429
+        bad_request = requests.exceptions.HTTPError(response=requests.Response())
+        bad_request.response.status_code = 400
+        
+        assert is_provider_failure(requests.exceptions.Timeout())
+        assert is_provider_failure(server_error)
+        assert is_provider_failure(rate_limited)
+        assert not is_provider_failure(bad_request)
+        assert not is_provider_failure(KeyError('candidates'))
@@ -0,0 +1,252 @@
+import pytest
+import os
+import json
+import tempfile
+from cache import LRUCache, SQLiteCache, TieredCache
+from github_service import GitHubService
+from circuit_breaker import CircuitBreaker
+
+
+class TestGitHubService:
+    @pytest.fixture
+    def http_cache(self):
+        """Tiered cache backed by a throwaway database"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield TieredCache(LRUCache(), SQLiteCache(os.path.join(tmpdir, 'cache.db'), namespace='github_http'))
+    
+    def _response(self, mocker, status_code, body=None, headers=None):
+        response = mocker.Mock(status_code=status_code, headers=headers or {})
+        response.text = json.dumps(body)
+        response.json.return_value = body
+        return response
+    
+    def test_make_request_without_cache(self, mocker):
+        """Test plain requests pass through untouched"""
+        get = mocker.patch('http_client.PooledSession.get', return_value=self._response(mocker, 200, {'login': 'github'}))
+        service = GitHubService()
+        
+        response = service._make_request('https://api.github.com/orgs/github')
+        
+        assert response.json() == {'login': 'github'}
+        assert get.call_count == 1
+    
+    def test_fresh_entry_skips_request(self, mocker, http_cache):
+        """Test a response younger than cache_fresh_seconds is served locally"""
+        get = mocker.patch('http_client.PooledSession.get', return_value=self._response(
+            mocker, 200, {'login': 'github'}, {'ETag': '"abc"'}
+        ))
+        service = GitHubService(http_cache=http_cache, cache_fresh_seconds=60)
+        
+        service._make_request('https://api.github.com/orgs/github')
+        response = service._make_request('https://api.github.com/orgs/github')
+        
+        assert response.json() == {'login': 'github'}
+        assert get.call_count == 1
+    
+    def test_stale_entry_revalidates_with_etag(self, mocker, http_cache):
+        """Test stale entries send If-None-Match and reuse the body on 304"""
+        get = mocker.patch('http_client.PooledSession.get', side_effect=[
+            self._response(mocker, 200, {'login': 'github'}, {'ETag': '"abc"'}),
+            self._response(mocker, 304),
+        ])
+        service = GitHubService(http_cache=http_cache, cache_fresh_seconds=0)
+        
+        service._make_request('https://api.github.com/orgs/github')
+        response = service._make_request('https://api.github.com/orgs/github')
+        
+        assert response.status_code == 200
+        assert response.json() == {'login': 'github'}
+        assert get.call_args_list[1].kwargs['headers']['If-None-Match'] == '"abc"'
+    
+    def test_responses_without_validators_are_not_cached(self, mocker, http_cache):
+        """Test responses lacking ETag and Last-Modified are always refetched"""
+        get = mocker.patch('http_client.PooledSession.get', return_value=self._response(mocker, 200, {'login': 'github'}))
+        service = GitHubService(http_cache=http_cache)
+        
+        service._make_request('https://api.github.com/orgs/github')
+        service._make_request('https://api.github.com/orgs/github')
+        
+        assert get.call_count == 2
+    
+    def test_resolve_organization_is_memoized(self, mocker, http_cache):
+        """Test search results, including misses, are remembered across calls"""
+        get = mocker.patch('http_client.PooledSession.get', side_effect=[
+            self._response(mocker, 200, {'total_count': 1, 'items': [{'login': 'acme-inc'}]}),
+            self._response(mocker, 200, {'total_count': 0, 'items': []}),
+            self._response(mocker, 404, {'message': 'Not Found'}),
+        ])
+        service = GitHubService(org_cache=http_cache)
+        
+        assert service.resolve_organization('Acme Inc') == 'acme-inc'
+        assert service.resolve_organization('Acme Inc') == 'acme-inc'
+        assert service.resolve_organization('Nobody Corp') is None
+        assert service.resolve_organization('Nobody Corp') is None
+        
+        assert get.call_count == 3
+    
+    def test_resolve_organization_does_not_memoize_failures(self, mocker, http_cache):
+        """Test unreachable github is retried on the next job"""
+        import requests
+        mocker.patch('github_service.sleep')
+        get = mocker.patch('http_client.PooledSession.get', side_effect=requests.exceptions.ConnectionError())
+        service = GitHubService(org_cache=http_cache, breaker=CircuitBreaker('github', failure_threshold=100))
+        
+        assert service.resolve_organization('Acme Inc') is None
+        calls = get.call_count
+        assert service.resolve_organization('Acme Inc') is None
+        assert get.call_count == 2 * calls
+    
+    def test_open_breaker_skips_github(self, mocker):
+        """Test repeated connection errors trip the breaker and later calls return at once"""
+        import requests
+        sleep = mocker.patch('github_service.sleep')
+        get = mocker.patch('http_client.PooledSession.get', side_effect=requests.exceptions.ConnectionError())
+        service = GitHubService(breaker=CircuitBreaker('github', failure_threshold=2))
+        
+        assert service._make_request('https://api.github.com/orgs/github') is None
+        assert get.call_count == 2
+        assert sleep.call_count == 1  # no backoff once the breaker opened
+        
+        assert service._make_request('https://api.github.com/orgs/github') is None
+        assert get.call_count == 2
+        assert service.breaker_status()['github']['state'] == 'open'
+    
+    def test_open_breaker_serves_stale_cache(self, mocker, http_cache):
+        """Test a stale cached body is returned rather than nothing while github is down"""
+        mocker.patch('http_client.PooledSession.get', return_value=self._response(mocker, 200, {'login': 'github'}, {'ETag': '"v1"'}))
+        breaker = CircuitBreaker('github', failure_threshold=1)
+        service = GitHubService(http_cache=http_cache, cache_fresh_seconds=0, breaker=breaker)
+        service._make_request('https://api.github.com/orgs/github')
+        
+        breaker.record_failure()
+        get = mocker.patch('http_client.PooledSession.get')
+        response = service._make_request('https://api.github.com/orgs/github')
+        
+        assert response.json() == {'login': 'github'}
+        assert get.call_count == 0
+    
+    def test_resolved_login_is_reused(self, mocker):
+        """Test passing org_login skips the search entirely"""
+        get = mocker.patch('http_client.PooledSession.get', return_value=self._response(mocker, 200, []))
+        service = GitHubService()
+        
+        service.get_organization_members('Acme Inc', org_login='acme-inc')
+        
+        assert get.call_count == 1
+        assert get.call_args.args[0].endswith('/orgs/acme-inc/members')
+    
+    def _members_side_effect(self, mocker, total, remaining='5000'):
+        """fake /orgs/x/members serving `total` members with Link headers"""
+        def get(url, params=None, **kwargs):
+            page, per_page = params['page'], params['per_page']
+            last = -(-total // per_page)
+            body = [{'login': f'user{i}'} for i in range((page - 1) * per_page, min(page * per_page, total))]
+            response = self._response(mocker, 200, body, {'X-RateLimit-Remaining': remaining})
+            response.links = {'last': {'url': f'{url}?page={last}&per_page={per_page}'}} if last > 1 else {}
+            return response
+        return get
+    
+    def test_members_use_max_page_size(self, mocker):
+        """Test 100 members are fetched in a single request"""
+        get = mocker.patch('http_client.PooledSession.get', side_effect=self._members_side_effect(mocker, 250))
+        service = GitHubService()
+        
+        members = service.get_organization_members('Acme', org_login='acme')
+        
+        assert len(members) == 100
+        assert get.call_count == 1
+        assert get.call_args.kwargs['params']['per_page'] == 100
+    
+    def test_members_pages_fetched_concurrently_in_order(self, mocker):
+        """Test remaining pages come from the Link header and keep github's order"""
+        get = mocker.patch('http_client.PooledSession.get', side_effect=self._members_side_effect(mocker, 250))
+        service = GitHubService(member_concurrency=3)
+        
+        members = service.get_organization_members('Acme', org_login='acme', limit=1000)
+        
+        assert [member['login'] for member in members] == [f'user{i}' for i in range(250)]
+        assert get.call_count == 3
+    
+    def test_members_respect_limit(self, mocker):
+        """Test pages beyond what limit needs are never requested"""
+        get = mocker.patch('http_client.PooledSession.get', side_effect=self._members_side_effect(mocker, 1000))
+        service = GitHubService()
+        
+        members = service.get_organization_members('Acme', org_login='acme', limit=150)
+        
+        assert len(members) == 150
+        assert get.call_count == 2
+    
+    def test_members_serial_when_rate_limit_is_low(self, mocker):
+        """Test a nearly exhausted budget falls back to page-by-page fetching"""
+        mocker.patch('http_client.PooledSession.get', side_effect=self._members_side_effect(mocker, 350, remaining='1'))
+        executor = mocker.patch('github_service.ThreadPoolExecutor')
+        service = GitHubService()
+        
+        members = service.get_organization_members('Acme', org_login='acme', limit=1000)
+        
+        assert len(members) == 350
+        executor.assert_not_called()
+    
+    def test_enrich_runs_lookups_concurrently(self, mocker):
+        """Test info and members overlap instead of running back to back"""
+        import threading
+        both_started = threading.Barrier(2, timeout=2)
+        
+        def info(company_name, org_login=None):
+            both_started.wait()
+            return {'login': org_login}
+        
+        def members(company_name, limit=100, org_login=None):
+            both_started.wait()
+            return [{'login': 'user1'}]
+        
+        service = GitHubService()
+        mocker.patch.object(service, 'resolve_organization', return_value='acme')
+        mocker.patch.object(service, 'get_organization_info', side_effect=info)
+        mocker.patch.object(service, 'get_organization_members', side_effect=members)
+        
+        result = service.enrich('Acme')
+        
+        assert result['org_info'] == {'login': 'acme'}
+        assert result['members'] == [{'login': 'user1'}]
+        assert result['timed_out'] == []
+    
+    def test_enrich_members_timeout(self, mocker):
+        """Test a slow members lookup is abandoned at its deadline"""
+        import threading
+        release = threading.Event()
+        
+        service = GitHubService()
+        mocker.patch.object(service, 'resolve_organization', return_value='acme')
+        mocker.patch.object(service, 'get_organization_info', return_value={'login': 'acme'})
+        mocker.patch.object(service, 'get_organization_members', side_effect=lambda *a, **k: release.wait(5) and [])
+        
+        result = service.enrich('Acme', members_timeout=0.1)
+        release.set()
+        
+        assert result['org_info'] == {'login': 'acme'}
+        assert result['members'] == []
+        assert result['timed_out'] == ['members']
+    
+    def test_enrich_reports_each_step(self, mocker):
+        """Test on_step is told as the info and members lookups settle"""
+        service = GitHubService()
+        mocker.patch.object(service, 'get_organization_info', return_value={'login': 'acme'})
+        mocker.patch.object(service, 'get_organization_members', return_value=[])
+        steps = []
+        
+        service.enrich('Acme', org_login='acme', on_step=steps.append)
+        
+        assert steps == ['org_info', 'members']
+    
+    def test_enrich_unknown_company(self, mocker):
+        """Test nothing is fetched when the login cannot be resolved"""
+        service = GitHubService()
+        mocker.patch.object(service, 'resolve_organization', return_value=None)
+        info = mocker.patch.object(service, 'get_organization_info')
+        
+        result = service.enrich('Nobody')
+        
+        assert result['org_login'] is None
+        info.assert_not_called()
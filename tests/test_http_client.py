@@ -0,0 +1,37 @@
+from http_client import PooledSession, pooled_session_from_config
+
+
+class TestPooledSession:
+    def test_session_is_reused(self):
+        """Test one session (and connection pool) serves every call in a process"""
+        http = PooledSession()
+        assert http.session is http.session
+    
+    def test_session_rebuilt_after_fork(self, monkeypatch):
+        """Test a forked child builds its own session"""
+        http = PooledSession()
+        parent_session = http.session
+        
+        monkeypatch.setattr('http_client.os.getpid', lambda: -1)
+        assert http.session is not parent_session
+    
+    def test_adapter_configuration(self):
+        """Test pool size and retry policy reach the mounted adapter"""
+        http = PooledSession(pool_maxsize=7, max_retries=3, backoff_factor=0.5)
+        adapter = http.session.get_adapter('https://api.github.com')
+        
+        assert adapter._pool_maxsize == 7
+        assert adapter.max_retries.total == 3
+        assert adapter.max_retries.backoff_factor == 0.5
+        assert 'POST' not in adapter.max_retries.allowed_methods
+    
+    def test_from_config(self):
+        """Test settings are read from a Flask config mapping"""
+        http = pooled_session_from_config({
+            'HTTP_POOL_MAXSIZE': 3,
+            'HTTP_POOL_BLOCK': True,
+            'HTTP_MAX_RETRIES': 1,
+            'HTTP_RETRY_BACKOFF': 0.1
+        })
+        assert http.pool_maxsize == 3
+        assert http.pool_block is True
@@ -0,0 +1,111 @@
+import json
+import threading
+import fakeredis
+from job_events import LocalPubSub, RedisPubSub, StreamSlots, status_stream, sse_event
+
+
+def parse(events):
+    """data payloads and event names of the non-comment sse blocks"""
+    parsed = []
+    for block in events:
+        if block.startswith('event: '):
+            name, data = block.strip().split('\n')
+            parsed.append((name[len('event: '):], json.loads(data[len('data: '):])))
+        elif block.startswith('data: '):
+            parsed.append(('message', json.loads(block.strip()[len('data: '):])))
+    return parsed
+
+
+class TestPubSub:
+    def test_local_fan_out_and_unsubscribe(self):
+        """Test every subscriber of a channel gets each message until it closes"""
+        hub = LocalPubSub()
+        first = hub.subscribe('job:1')
+        second = hub.subscribe('job:1')
+        other = hub.subscribe('job:2')
+        
+        hub.publish('job:1', {'status': 'processing'})
+        assert first.get(timeout=0) == {'status': 'processing'}
+        assert second.get(timeout=0) == {'status': 'processing'}
+        assert other.get(timeout=0) is None
+        
+        first.close()
+        hub.publish('job:1', {'status': 'completed'})
+        assert first.get(timeout=0) is None
+        assert second.get(timeout=0) == {'status': 'completed'}
+    
+    def test_redis_delivers_across_processes(self):
+        """Test a message published by one client reaches another client's subscribers"""
+        server = fakeredis.FakeServer()
+        web = RedisPubSub('', client=fakeredis.FakeRedis(server=server))
+        worker = RedisPubSub('', client=fakeredis.FakeRedis(server=server))
+        subscription = web.subscribe('job:1')
+        
+        #the listener subscribes in the background; publish until it is up
+        message = None
+        for _ in range(50):
+            worker.publish('job:1', {'status': 'completed'})
+            message = subscription.get(timeout=0.1)
+            if message:
+                break
+        assert message == {'status': 'completed'}
+
+
+class TestStatusStream:
+    def test_finished_job_ends_immediately(self):
+        """Test a finished job gets its status and an end event, then the stream closes"""
+        hub = LocalPubSub()
+        subscription = hub.subscribe('job:1')
+        
+        events = list(status_stream(lambda: {'status': 'completed'}, subscription, timeout=5, keepalive=1))
+        
+        assert parse(events) == [('message', {'status': 'completed'}), ('end', {'status': 'completed'})]
+        assert hub._subscribers == {}
+    
+    def test_pushes_each_change(self):
+        """Test the job is re-read and re-sent only when a transition is published"""
+        hub = LocalPubSub()
+        statuses = iter([{'status': 'pending'}, {'status': 'processing'}, {'status': 'completed'}])
+        loads = []
+        def load_status():
+            loads.append(1)
+            return next(statuses)
+        
+        stream = status_stream(load_status, hub.subscribe('job:1'), timeout=5, keepalive=5)
+        assert next(stream).startswith('retry:')
+        assert parse([next(stream)]) == [('message', {'status': 'pending'})]
+        
+        for status in ('processing', 'completed'):
+            threading.Timer(0.05, hub.publish, ('job:1', {'status': status})).start()
+        events = list(stream)
+        
+        assert [name for name, _ in parse(events)] == ['message', 'message', 'end']
+        assert len(loads) == 3
+    
+    def test_idle_stream_sends_keepalives_and_times_out(self):
+        """Test an idle stream keeps the connection alive and ends at its timeout"""
+        hub = LocalPubSub()
+        
+        events = list(status_stream(lambda: {'status': 'pending'}, hub.subscribe('job:1'), timeout=0.3, keepalive=0.1))
+        
+        assert ': keepalive\n\n' in events
+        assert parse(events) == [('message', {'status': 'pending'})]
+    
+    def test_streams_past_the_cap_close_at_once(self):
+        """Test only `limit` streams wait for changes; the rest send one status and close"""
+        hub = LocalPubSub()
+        slots = StreamSlots(1)
+        
+        held = status_stream(lambda: {'status': 'pending'}, hub.subscribe('job:1'), timeout=5, keepalive=5, slots=slots)
+        next(held)
+        events = list(status_stream(lambda: {'status': 'pending'}, hub.subscribe('job:2'), timeout=5, keepalive=5, slots=slots))
+        assert parse(events) == [('message', {'status': 'pending'})]
+        
+        #closing the open stream frees its slot
+        held.close()
+        assert slots.acquire()
+        assert hub._subscribers == {}
+    
+    def test_sse_event_format(self):
+        assert sse_event({'a': 1}) == 'data: {"a": 1}\n\n'
+        assert sse_event({'a': 1}, event='end') == 'event: end\ndata: {"a": 1}\n\n'
@@ -0,0 +1,78 @@
+import threading
+from llm_batcher import ExtractionBatcher
+
+
+class FakeLLMService:
+    """records how documents reach the service"""
+    
+    def __init__(self, fail=False):
+        self.batches = []
+        self.singles = []
+        self.fail = fail
+    
+    def confident_local_match(self, text):
+        return 'docker' if text.startswith('Docker') else None
+    
+    def extract_company_name(self, text):
+        self.singles.append(text)
+        return text.upper()
+    
+    def extract_company_names(self, texts):
+        if self.fail:
+            raise RuntimeError('provider down')
+        self.batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+class TestExtractionBatcher:
+    def _run_concurrently(self, batcher, texts):
+        results = {}
+        errors = {}
+        def worker(text):
+            try:
+                results[text] = batcher.extract_company_name(text)
+            except Exception as e:
+                errors[text] = e
+        threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        return results, errors
+    
+    def test_full_batch_is_sent_at_once(self):
+        """Test max_items waiting requests become one call and each gets its answer"""
+        service = FakeLLMService()
+        batcher = ExtractionBatcher(service, window=10, max_items=3)
+        
+        results, _ = self._run_concurrently(batcher, ['acme', 'globex', 'initech'])
+        
+        assert results == {'acme': 'ACME', 'globex': 'GLOBEX', 'initech': 'INITECH'}
+        assert len(service.batches) == 1
+        assert sorted(service.batches[0]) == ['acme', 'globex', 'initech']
+    
+    def test_window_flushes_partial_batch(self):
+        """Test a lone request is sent on its own once the window passes"""
+        service = FakeLLMService()
+        batcher = ExtractionBatcher(service, window=0.01, max_items=8)
+        
+        assert batcher.extract_company_name('acme') == 'ACME'
+        assert service.singles == ['acme']
+        assert service.batches == []
+    
+    def test_confident_local_match_skips_the_queue(self):
+        """Test documents resolved locally never wait for a batch"""
+        service = FakeLLMService()
+        batcher = ExtractionBatcher(service, window=10, max_items=8)
+        
+        assert batcher.extract_company_name('Docker brochure') == 'DOCKER BROCHURE'
+        assert service.singles == ['Docker brochure']
+    
+    def test_batch_errors_reach_every_caller(self):
+        """Test a failed batch raises in each waiting thread"""
+        batcher = ExtractionBatcher(FakeLLMService(fail=True), window=10, max_items=2)
+        
+        results, errors = self._run_concurrently(batcher, ['acme', 'globex'])
+        
+        assert results == {}
+        assert sorted(errors) == ['acme', 'globex']
@@ -0,0 +1,207 @@
+import pytest
+import os
+import tempfile
+import time
+import requests
+from cache import LRUCache, SQLiteCache, TieredCache, Counters
+from llm_service import LLMService, parse_batch_answers
+from cache import MISS
+from circuit_breaker import CircuitBreaker
+
+
+class TestLLMService:
+    @pytest.fixture
+    def cache(self):
+        """Tiered cache backed by a throwaway database"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield TieredCache(LRUCache(), SQLiteCache(os.path.join(tmpdir, 'cache.db'), namespace='llm'))
+    
+    def _gemini_response(self, mocker, text):
+        response = mocker.Mock(status_code=200)
+        response.json.return_value = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+        return response
+    
+    def test_gemini_answer_is_cached(self, mocker, cache):
+        """Test the same prompt only reaches the provider once"""
+        post = mocker.patch('http_client.PooledSession.post', return_value=self._gemini_response(mocker, 'GitHub'))
+        service = LLMService(api_key='key', cache=cache)
+        
+        assert service.extract_company_name('We love GitHub') == 'GitHub'
+        assert service.extract_company_name('We love GitHub') == 'GitHub'
+        
+        assert post.call_count == 1
+        assert service.cache_stats()['process']['memory_hits'] == 1
+    
+    def test_provider_errors_are_not_cached(self, mocker, cache):
+        """Test failed calls fall through and are retried next time"""
+        post = mocker.patch('http_client.PooledSession.post', side_effect=requests.exceptions.Timeout())
+        service = LLMService(api_key='key', cache=cache)
+        
+        assert service.extract_company_name('Built with docker') == 'docker'
+        assert service.extract_company_name('Built with docker') == 'docker'
+        
+        assert post.call_count == 4  # gemini + hugging face, twice
+    
+    def test_confident_local_match_skips_providers(self, mocker):
+        """Test a dominant, repeated gazetteer hit never reaches the network"""
+        post = mocker.patch('http_client.PooledSession.post')
+        service = LLMService(api_key='key')
+        
+        text = 'Docker Inc. annual report. Docker ships Docker Desktop, see github.com/docker'
+        assert service.extract_company_name(text) == 'docker'
+        
+        assert post.call_count == 0
+        assert service.tier_breakdown()['process'] == {'local': {'count': 1, 'fraction': 1.0}}
+    
+    def test_ambiguous_local_match_asks_providers(self, mocker):
+        """Test competing companies fall through to the llm tiers"""
+        post = mocker.patch('http_client.PooledSession.post', return_value=self._gemini_response(mocker, 'Docker'))
+        service = LLMService(api_key='key')
+        
+        assert service.extract_company_name('Docker on AWS with Azure backups') == 'Docker'
+        
+        assert post.call_count == 1
+        assert service.tier_breakdown()['process'] == {'gemini': {'count': 1, 'fraction': 1.0}}
+    
+    def test_tier_counters_are_shared(self, mocker):
+        """Test tier counts accumulate in the shared store"""
+        mocker.patch('http_client.PooledSession.post', side_effect=requests.exceptions.Timeout())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'cache.db')
+            service = LLMService(api_key='key', tier_stats=Counters(SQLiteCache(path, namespace='llm_tiers')))
+            
+            service.extract_company_name('Built with docker')
+            service.extract_company_name('nothing here')
+            service.tier_stats.flush()
+            
+            shared = LLMService(tier_stats=Counters(SQLiteCache(path, namespace='llm_tiers'))).tier_breakdown()['shared']
+            assert shared == {'fallback': {'count': 1, 'fraction': 0.5}, 'none': {'count': 1, 'fraction': 0.5}}
+    
+    def _providers(self, mocker, gemini_delay, hf_delay, gemini='Docker', hf='Docker Inc'):
+        """patch post so each provider answers after its own delay"""
+        def post(url, **kwargs):
+            if 'generativelanguage' in url:
+                time.sleep(gemini_delay)
+                return self._gemini_response(mocker, gemini)
+            time.sleep(hf_delay)
+            response = mocker.Mock(status_code=200)
+            response.json.return_value = [{'generated_text': hf}]
+            return response
+        return mocker.patch('http_client.PooledSession.post', side_effect=post)
+    
+    def test_hedged_call_takes_first_answer(self, mocker):
+        """Test a slow gemini loses to hugging face once the hedge delay passes"""
+        post = self._providers(mocker, gemini_delay=0.5, hf_delay=0)
+        service = LLMService(api_key='key', hedge_delay=0.05)
+        
+        started = time.monotonic()
+        assert service.extract_company_name('Docker on AWS with Azure backups') == 'Docker Inc'
+        assert time.monotonic() - started < 0.4
+        assert post.call_count == 2
+        assert service.tier_breakdown()['process'] == {'huggingface': {'count': 1, 'fraction': 1.0}}
+        
+        time.sleep(0.6)  # the losing call finishes in the background
+        latency = service.latency_stats()['process']
+        assert latency['gemini']['count'] == 1
+        assert latency['huggingface']['count'] == 1
+    
+    def test_hedge_not_started_when_primary_is_fast(self, mocker):
+        """Test hugging face is never called when gemini answers within the delay"""
+        post = self._providers(mocker, gemini_delay=0, hf_delay=0)
+        service = LLMService(api_key='key', hedge_delay=1.0)
+        
+        assert service.extract_company_name('Docker on AWS with Azure backups') == 'Docker'
+        assert post.call_count == 1
+    
+    def test_hedge_delay_zero_prefers_primary_on_tie(self, mocker):
+        """Test both providers start at once and a failed gemini falls to hugging face"""
+        post = self._providers(mocker, gemini_delay=0, hf_delay=0, gemini='none')
+        service = LLMService(api_key='key', hedge_delay=0)
+        
+        assert service.extract_company_name('Docker on AWS with Azure backups') == 'Docker Inc'
+        assert post.call_count == 2
+    
+    def test_open_breaker_skips_provider(self, mocker):
+        """Test a tripped gemini breaker goes straight to hugging face"""
+        post = self._providers(mocker, gemini_delay=0, hf_delay=0)
+        breakers = {'gemini': CircuitBreaker('gemini', failure_threshold=1), 'huggingface': CircuitBreaker('huggingface')}
+        breakers['gemini'].record_failure()
+        service = LLMService(api_key='key', breakers=breakers)
+        
+        assert service.extract_company_name('Docker on AWS with Azure backups') == 'Docker Inc'
+        assert post.call_count == 1
+        assert 'huggingface' in post.call_args.args[0]
+    
+    def test_provider_errors_trip_breaker(self, mocker):
+        """Test server errors open the breaker but client errors do not"""
+        response = mocker.Mock(status_code=503)
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+        mocker.patch('http_client.PooledSession.post', return_value=response)
+        service = LLMService(api_key='key', breakers={'gemini': CircuitBreaker('gemini', failure_threshold=2)})
+        
+        service.extract_company_name('Docker on AWS with Azure backups')
+        service.extract_company_name('Docker on AWS with Azure backups')
+        assert service.breaker_status()['gemini']['state'] == 'open'
+        
+        response.status_code = 400
+        service = LLMService(api_key='key', breakers={'gemini': CircuitBreaker('gemini', failure_threshold=2)})
+        service.extract_company_name('Docker on AWS with Azure backups')
+        service.extract_company_name('Docker on AWS with Azure backups')
+        assert service.breaker_status()['gemini']['state'] == 'closed'
+    
+    def _gemini_texts(self, mocker, *texts):
+        return mocker.patch('http_client.PooledSession.post', side_effect=[self._gemini_response(mocker, text) for text in texts])
+    
+    def test_batch_extraction_uses_one_request(self, mocker):
+        """Test several documents share a single gemini call"""
+        post = self._gemini_texts(mocker, '```json\n{"1": "Acme", "2": "Globex"}\n```')
+        service = LLMService(api_key='key')
+        
+        texts = ['Acme on AWS and Azure', 'Docker Inc. annual report. Docker ships Docker Desktop', 'Globex on AWS and Azure']
+        assert service.extract_company_names(texts) == ['Acme', 'docker', 'Globex']
+        
+        assert post.call_count == 1
+        prompt = post.call_args.kwargs['json']['contents'][0]['parts'][0]['text']
+        assert 'Document 1:\nAcme' in prompt and 'Document 2:\nGlobex' in prompt
+    
+    def test_batch_falls_back_to_single_requests(self, mocker):
+        """Test unparseable replies and missing documents are retried one by one"""
+        post = self._gemini_texts(mocker, 'Acme and Globex', 'Acme', 'Globex')
+        service = LLMService(api_key='key')
+        assert service.extract_company_names(['Acme on AWS and Azure', 'Globex on AWS and Azure']) == ['Acme', 'Globex']
+        assert post.call_count == 3
+        
+        post = self._gemini_texts(mocker, '{"1": "Acme"}', 'Globex')
+        service = LLMService(api_key='key')
+        assert service.extract_company_names(['Acme on AWS and Azure', 'Globex on AWS and Azure']) == ['Acme', 'Globex']
+        assert post.call_count == 2
+    
+    def test_batch_null_answer_is_final(self, mocker):
+        """Test a document the batch answers with null is resolved locally, not asked again"""
+        post = self._gemini_texts(mocker, '{"1": "Acme", "2": null, "3": null}')
+        service = LLMService(api_key='key')
+        
+        texts = ['Acme on AWS and Azure', 'Globex on AWS and Azure', 'A brochure about nothing in particular']
+        assert service.extract_company_names(texts) == ['Acme', 'aws', None]
+        
+        assert post.call_count == 1
+        assert {tier: counts['count'] for tier, counts in service.tier_breakdown()['process'].items()} == \
+            {'gemini': 1, 'fallback': 1, 'none': 1}
+    
+    def test_parse_batch_answers(self):
+        """Test batch replies are read leniently"""
+        assert parse_batch_answers('{"1": "Acme", "3": "none", "4": null, "5": 7}', 5) == ['Acme', MISS, None, None, MISS]
+        assert parse_batch_answers('Sure! {"1": " Acme "}', 1) == ['Acme']
+        assert parse_batch_answers('["Acme"]', 1) is None
+        assert parse_batch_answers('{"1": ', 1) is None
+        assert parse_batch_answers(None, 1) is None
+    
+    def test_fallback_extraction(self, mocker):
+        """Test the local match is the answer when no provider has one"""
+        service = LLMService(local_confidence_threshold=1.1)
+        mocker.patch.object(service, '_extract_with_gemini', return_value=None)
+        mocker.patch.object(service, '_extract_with_huggingface_free', return_value=None)
+        assert service.extract_company_name('Deployed on AWS, monitored by AWS and Docker') == 'aws'
+        assert service.extract_company_name('see github.com/pallets for code') == 'pallets'
+        assert service.extract_company_name('revenue grew') is None
+        assert service.extract_company_name('nothing here') is None
@@ -0,0 +1,76 @@
+import pytest
+import re
+from matcher import GazetteerMatcher, _trie_pattern
+
+
+class TestGazetteerMatcher:
+    @pytest.fixture
+    def matcher(self):
+        return GazetteerMatcher({
+            'meta': 'facebook',
+            'metaflow': 'netflix',
+            'vue': 'vuejs',
+            'hugging face': 'huggingface',
+            'github': 'github',
+        })
+    
+    def test_word_boundaries(self, matcher):
+        """Test terms never match inside other words"""
+        result = matcher.scan('Revenue from metadata grew')
+        assert result['terms'] == []
+    
+    def test_longest_term_wins(self, matcher):
+        """Test overlapping terms prefer the longest match at a position"""
+        result = matcher.scan('We run Metaflow on Meta hardware')
+        assert [hit['value'] for hit in result['terms']] == ['netflix', 'facebook']
+        assert result['terms'][0]['start'] == 7
+    
+    def test_counts_positions_and_urls(self, matcher):
+        """Test hits, counts and github urls come from the same pass"""
+        text = 'Vue and vue, Hugging Face, see github.com/vuejs'
+        result = matcher.scan(text)
+        
+        assert result['counts'] == {'vuejs': 2, 'huggingface': 1}
+        assert result['urls'] == [{'login': 'vuejs', 'start': 31, 'end': 47}]
+        assert text[result['terms'][2]['start']:result['terms'][2]['end']] == 'Hugging Face'
+    
+    def test_best_match(self, matcher):
+        """Test the most frequent value wins, then the first github url"""
+        assert matcher.best_match('meta vue vue') == 'vuejs'
+        assert matcher.best_match('code at github.com/pallets') == 'pallets'
+        assert matcher.best_match('nothing to see') is None
+    
+    def test_confidence(self, matcher):
+        """Test repetition, early position and a matching url raise confidence"""
+        once = matcher.best_match_with_confidence('vue')[1]
+        repeated = matcher.best_match_with_confidence('vue, vue and more vue')[1]
+        with_url = matcher.best_match_with_confidence('vue, vue and more vue at github.com/vuejs')[1]
+        late = matcher.best_match_with_confidence(' ' * 5000 + 'vue, vue and more vue')[1]
+        assert once < repeated < with_url <= 1.0
+        assert late < repeated
+    
+    def test_confidence_drops_when_ambiguous(self, matcher):
+        """Test several companies split the confidence"""
+        value, confidence = matcher.best_match_with_confidence('vue vue vue meta meta meta')
+        assert value == 'vuejs'
+        assert confidence < matcher.best_match_with_confidence('vue vue vue')[1] / 2 + 0.01
+        assert matcher.best_match_with_confidence('code at github.com/pallets') == ('pallets', 0.5)
+        assert matcher.best_match_with_confidence('nothing') == (None, 0.0)
+    
+    def test_large_gazetteer(self):
+        """Test tens of thousands of entries compile and match"""
+        gazetteer = {f'company{i}': f'org{i}' for i in range(20000)}
+        matcher = GazetteerMatcher(gazetteer)
+        
+        result = matcher.scan('partners: Company42, company19999 and company200000')
+        assert [hit['value'] for hit in result['terms']] == ['org42', 'org19999']
+    
+    def test_trie_pattern_matches_exactly_the_terms(self):
+        """Test the factored alternation accepts the terms and nothing else"""
+        terms = ['a', 'ab', 'abc', 'b.d', 'bd']
+        pattern = re.compile(f'(?:{_trie_pattern(terms)})')
+        
+        for term in terms:
+            assert pattern.fullmatch(term)
+        for other in ['ac', 'bxd', 'abcd', '']:
+            assert not pattern.fullmatch(other)
@@ -2,7 +2,8 @@ import pytest
 import tempfile
 import os
 from datetime import datetime
-from models import Job, init_db, get_session
+from models import Job, init_db, get_session, session_scope, get_engine, dispose_engines, find_completed_duplicate, find_completed_duplicates, batch_summary
+import models
 import json
 
 
@@ -20,6 +21,7 @@ class TestModels:
         # Close all sessions before cleanup
         from sqlalchemy.orm import close_all_sessions
         close_all_sessions()
+        dispose_engines()
         
         # Force garbage collection
         import gc
@@ -125,4 +127,141 @@ class TestModels:
         assert job.status == 'failed'
         assert job.error_message == 'Failed to process PDF'
         
-        session.close()
\ No newline at end of file
+        session.close()
+    
+    def test_init_db_reuses_engine(self, temp_db):
+        """Test the engine and sessionmaker are built once per database url"""
+        assert init_db(temp_db) is init_db(temp_db)
+        assert get_engine(temp_db) is get_engine(temp_db)
+    
+    def test_engine_rebuilt_after_fork(self, temp_db, monkeypatch):
+        """Test a forked child does not reuse the parent's engine"""
+        engine = get_engine(temp_db)
+        monkeypatch.setattr(models, '_registry_pid', -1)
+        
+        assert get_engine(temp_db) is not engine
+    
+    def test_session_scope_commits(self, temp_db, monkeypatch):
+        """Test session_scope commits on success"""
+        monkeypatch.setattr(models, '_default_url', temp_db)
+        
+        with session_scope() as session:
+            job = Job(pdf_filename='test.pdf', status='pending')
+            session.add(job)
+            session.flush()
+            job_id = job.job_id
+        
+        with session_scope() as session:
+            assert session.query(Job).filter_by(job_id=job_id).first() is not None
+    
+    def test_session_scope_rolls_back(self, temp_db, monkeypatch):
+        """Test session_scope rolls back when the block raises"""
+        monkeypatch.setattr(models, '_default_url', temp_db)
+        
+        with pytest.raises(ValueError):
+            with session_scope() as session:
+                session.add(Job(job_id='rollback-job', pdf_filename='test.pdf'))
+                raise ValueError('boom')
+        
+        with session_scope() as session:
+            assert session.query(Job).filter_by(job_id='rollback-job').first() is None
+    
+    def test_migrate_adds_members_count(self):
+        """Test an old jobs table gains members_count with a backfill"""
+        from sqlalchemy import create_engine, text
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_url = f"sqlite:///{os.path.join(tmpdir, 'old.db')}"
+            engine = create_engine(db_url)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    'CREATE TABLE jobs (job_id VARCHAR(36) PRIMARY KEY, pdf_filename VARCHAR(255) NOT NULL, '
+                    'company_name VARCHAR(255), github_org_data TEXT, github_members TEXT, timestamp DATETIME, '
+                    'status VARCHAR(50), error_message TEXT, task_id VARCHAR(255))'
+                ))
+                conn.execute(text(
+                    "INSERT INTO jobs (job_id, pdf_filename, github_members) VALUES ('old-job', 'old.pdf', '[1, 2, 3]')"
+                ))
+            engine.dispose()
+            
+            session = init_db(db_url)()
+            assert session.query(Job).filter_by(job_id='old-job').first().members_count == 3
+            session.close()
+            dispose_engines()
+    
+    def test_find_completed_duplicate(self, temp_db):
+        """Test duplicate lookup honours status, enrichment and the freshness window"""
+        from datetime import timedelta
+        Session = init_db(temp_db)
+        session = Session()
+        
+        session.add(Job(pdf_filename='old.pdf', status='completed', content_hash='abc', github_org_data='{}',
+                        timestamp=datetime.now() - timedelta(days=30)))
+        session.add(Job(pdf_filename='failed.pdf', status='failed', content_hash='abc'))
+        #results of runs that found no org or fell back are never reused
+        session.add(Job(pdf_filename='no-org.pdf', status='completed', content_hash='abc'))
+        session.add(Job(pdf_filename='degraded.pdf', status='completed', content_hash='abc',
+                        github_org_data='{}', degraded=1))
+        session.commit()
+        
+        assert find_completed_duplicate(session, 'abc', max_age_seconds=3600) is None
+        assert find_completed_duplicate(session, 'abc').pdf_filename == 'old.pdf'
+        assert find_completed_duplicate(session, 'abc', max_age_seconds=0) is None
+        assert find_completed_duplicate(session, 'other') is None
+        
+        session.close()
+    
+    def test_find_completed_duplicates(self, temp_db):
+        """Test the bulk lookup returns the newest completed job per hash"""
+        from datetime import timedelta
+        session = init_db(temp_db)()
+        
+        session.add(Job(pdf_filename='older.pdf', status='completed', content_hash='abc', github_org_data='{}',
+                        timestamp=datetime.now() - timedelta(days=1)))
+        session.add(Job(pdf_filename='newer.pdf', status='completed', content_hash='abc', github_org_data='{}'))
+        session.add(Job(pdf_filename='degraded.pdf', status='completed', content_hash='def',
+                        github_org_data='{}', degraded=1))
+        session.add(Job(pdf_filename='failed.pdf', status='failed', content_hash='def'))
+        session.commit()
+        
+        duplicates = find_completed_duplicates(session, ['abc', 'def', None])
+        assert {content_hash: job.pdf_filename for content_hash, job in duplicates.items()} == {'abc': 'newer.pdf'}
+        assert find_completed_duplicates(session, ['abc'], max_age_seconds=0) == {}
+        
+        session.close()
+    
+    def test_batch_summary(self, temp_db):
+        """Test batch counts group by status"""
+        session = init_db(temp_db)()
+        session.add_all([
+            Job(pdf_filename='a.pdf', status='completed', batch_id='batch-1'),
+            Job(pdf_filename='b.pdf', status='pending', batch_id='batch-1'),
+            Job(pdf_filename='c.pdf', status='pending', batch_id='batch-1'),
+            Job(pdf_filename='d.pdf', status='pending', batch_id='batch-2'),
+        ])
+        session.commit()
+        
+        summary = batch_summary(session, 'batch-1')
+        assert summary['counts'] == {'completed': 1, 'pending': 2}
+        assert summary['total'] == 3
+        assert [row.pdf_filename for row in summary['rows']] == ['a.pdf', 'b.pdf', 'c.pdf']
+        assert batch_summary(session, 'missing') is None
+        
+        session.close()
+    
+    def test_stage_status(self):
+        """Test per-stage status derived from the checkpoint and job status"""
+        job = Job(pdf_filename='test.pdf', status='pending')
+        assert job.stage_status() == {'extract': 'pending', 'classify': 'pending', 'enrich': 'pending'}
+        
+        job.status, job.completed_stage = 'processing', 'extract'
+        assert job.stage_status() == {'extract': 'done', 'classify': 'running', 'enrich': 'pending'}
+        assert job.stage_done('extract') and not job.stage_done('classify')
+        
+        job.retry_count = 2
+        assert job.stage_status()['classify'] == 'retrying'
+        
+        job.status = 'failed'
+        assert job.stage_status() == {'extract': 'done', 'classify': 'failed', 'enrich': 'pending'}
+        
+        job.status = 'completed'
+        assert set(job.stage_status().values()) == {'done'}
@@ -1,8 +1,10 @@
 import pytest
 import os
 import tempfile
-from pdf_processor import PDFProcessor, text_formatter, open_and_read_pdf
-from werkzeug.datastructures import FileStorage
+from pdf_processor import (
+    PDFProcessor, text_formatter, open_and_read_pdf, iter_pdf_pages, parallel_read_pdf, iter_pdf_uploads,
+    iter_multipart_files, UploadRejectedError, FileTooLargeError, NotAPDFError
+)
 from io import BytesIO
 
 
@@ -30,24 +32,136 @@ class TestPDFProcessor:
         assert text_formatter("") == ""
         assert text_formatter("\n\n") == ""
     
-    def test_save_uploaded_file(self, pdf_processor):
-        """Test saving uploaded file"""
-        # Create mock file
+    def test_save_stream(self, pdf_processor):
+        """Test saving an uploaded stream"""
+        import hashlib
         file_content = b'Mock PDF content'
-        file = FileStorage(
-            stream=BytesIO(file_content),
-            filename='test.pdf',
-            content_type='application/pdf'
-        )
         
         # Save file
-        saved_path = pdf_processor.save_uploaded_file(file, 'test_save.pdf')
+        saved_path, digest = pdf_processor.save_stream(BytesIO(file_content), 'test_save.pdf', chunk_size=4)
         
         # Verify file exists and content matches
+        assert digest == hashlib.sha256(file_content).hexdigest()
         assert os.path.exists(saved_path)
         with open(saved_path, 'rb') as f:
             assert f.read() == file_content
     
+    def test_save_stream_enforces_max_bytes(self, pdf_processor):
+        """Test oversized streams are rejected and not left on disk"""
+        path, digest = pdf_processor.save_stream(BytesIO(b'12345'), 'ok.pdf', chunk_size=2, max_bytes=5)
+        assert os.path.getsize(path) == 5
+        
+        with pytest.raises(ValueError):
+            pdf_processor.save_stream(BytesIO(b'123456'), 'big.pdf', chunk_size=2, max_bytes=5)
+        assert not os.path.exists(os.path.join(pdf_processor.upload_folder, 'big.pdf'))
+    
+    def test_save_stream_keeps_small_files_in_memory(self, pdf_processor):
+        """Test streams up to in_memory_max never touch disk and larger ones spill whole"""
+        import hashlib
+        source, digest = pdf_processor.save_stream(BytesIO(b'%PDF-small'), 'small.pdf', chunk_size=4, in_memory_max=10)
+        
+        assert isinstance(source, memoryview)
+        assert bytes(source) == b'%PDF-small'
+        assert digest == hashlib.sha256(b'%PDF-small').hexdigest()
+        assert os.listdir(pdf_processor.upload_folder) == []
+        
+        path, _ = pdf_processor.save_stream(BytesIO(b'%PDF-bigger'), 'big.pdf', chunk_size=4, in_memory_max=10)
+        with open(path, 'rb') as f:
+            assert f.read() == b'%PDF-bigger'
+        
+        with pytest.raises(FileTooLargeError):
+            pdf_processor.save_stream(BytesIO(b'%PDF-toolarge'), 'huge.pdf', chunk_size=4, max_bytes=12, in_memory_max=20)
+        assert os.listdir(pdf_processor.upload_folder) == ['big.pdf']
+    
+    def _multipart(self, parts, boundary='XyZ'):
+        body = b''
+        for name, filename, data in parts:
+            disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else '')
+            body += f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + data + b'\r\n'
+        return body + f'--{boundary}--\r\n'.encode()
+    
+    def test_save_stream_checks_pdf_header_first(self, pdf_processor):
+        """Test non-pdf content is rejected after the first KB, before a file is created"""
+        stream = BytesIO(b'GIF89a' + b'x' * 10 ** 6)
+        
+        with pytest.raises(NotAPDFError):
+            pdf_processor.save_stream(stream, 'fake.pdf', require_pdf=True)
+        
+        assert stream.tell() <= 1024
+        assert os.listdir(pdf_processor.upload_folder) == []
+    
+    def test_iter_multipart_files_streams_parts(self):
+        """Test file parts are read incrementally and plain fields are skipped"""
+        body = BytesIO(self._multipart([('note', None, b'hello'), ('file', 'a.pdf', b'%PDF-1.4 ' + b'y' * 5000)]))
+        
+        parts = iter_multipart_files(body, 'XyZ', chunk_size=512)
+        name, filename, reader = next(parts)
+        first = reader.read(100)
+        
+        assert (name, filename) == ('file', 'a.pdf')
+        assert first.startswith(b'%PDF-1.4')
+        #only a few chunks of the body have been pulled so far
+        assert body.tell() <= 2048
+        assert len(first + reader.read()) == 9 + 5000
+        assert list(parts) == []
+    
+    def test_ingest_multipart(self, pdf_processor):
+        """Test the upload is stored under the given name with its sha256"""
+        import hashlib
+        content = b'%PDF-1.4 ' + b'z' * 3000
+        body = BytesIO(self._multipart([('file', 'report.pdf', content)]))
+        
+        filename, path, digest = pdf_processor.ingest_multipart(body, 'XyZ', lambda name: f'job_{name}', chunk_size=256)
+        
+        assert filename == 'report.pdf'
+        assert os.path.basename(path) == 'job_report.pdf'
+        assert digest == hashlib.sha256(content).hexdigest()
+        with open(path, 'rb') as f:
+            assert f.read() == content
+    
+    def test_ingest_multipart_rejections(self, pdf_processor):
+        """Test each check fails with its own error and leaves nothing on disk"""
+        def ingest(parts, **kwargs):
+            body = BytesIO(self._multipart(parts))
+            return pdf_processor.ingest_multipart(body, 'XyZ', lambda name: name, **kwargs)
+        
+        with pytest.raises(UploadRejectedError, match='No file part'):
+            ingest([('other', 'a.pdf', b'%PDF-')])
+        with pytest.raises(UploadRejectedError, match='No file selected'):
+            ingest([('file', '', b'%PDF-')])
+        with pytest.raises(UploadRejectedError, match='Invalid file type'):
+            ingest([('file', 'a.txt', b'%PDF-')])
+        with pytest.raises(NotAPDFError):
+            ingest([('file', 'a.pdf', b'hello')])
+        with pytest.raises(FileTooLargeError) as error:
+            ingest([('file', 'a.pdf', b'%PDF-' + b'x' * 100)], max_bytes=50)
+        assert error.value.status_code == 413
+        with pytest.raises(UploadRejectedError, match='Incomplete'):
+            truncated = self._multipart([('file', 'a.pdf', b'%PDF-' + b'x' * 100)])[:-40]
+            pdf_processor.ingest_multipart(BytesIO(truncated), 'XyZ', lambda name: name)
+        
+        assert os.listdir(pdf_processor.upload_folder) == []
+    
+    def test_iter_pdf_uploads_expands_zip(self):
+        """Test zip members are yielded one by one and non-pdfs flagged"""
+        import zipfile
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('docs/a.pdf', b'%PDF a')
+            archive.writestr('docs/', b'')
+            archive.writestr('docs/b.txt', b'text')
+        buffer.seek(0)
+        
+        files = [('docs.zip', buffer), ('c.pdf', BytesIO(b'%PDF c')), ('bad.zip', BytesIO(b'junk'))]
+        results = [(name, stream.read() if stream else None, error) for name, stream, error in iter_pdf_uploads(files)]
+        
+        assert results == [
+            ('a.pdf', b'%PDF a', None),
+            ('b.txt', None, 'Invalid file type. Only PDF files are allowed'),
+            ('c.pdf', b'%PDF c', None),
+            ('bad.zip', None, 'Invalid ZIP archive'),
+        ]
+    
     def test_process_pdf_mock(self, pdf_processor, mocker):
         """Test PDF processing with mocked fitz"""
         # Mock the open_and_read_pdf function
@@ -97,6 +211,12 @@ class TestPDFProcessor:
         assert len(result) == 1
         assert result[0]['page_number'] == 0
         assert result[0]['text'] == "Test content with newlines"
+        assert 'page_word_count' not in result[0]
+        mock_page.get_text.assert_called_once_with("text", sort=False)
+        mock_doc.close.assert_called_once()
+
+        #stats are still available on request
+        result = open_and_read_pdf('test.pdf', with_stats=True)
         assert result[0]['page_word_count'] == 4
     
     def test_process_pdf_error_handling(self, pdf_processor, mocker):
@@ -108,4 +228,132 @@ class TestPDFProcessor:
         with pytest.raises(Exception) as exc_info:
             pdf_processor.process_pdf('bad.pdf')
         
-        assert "PDF read error" in str(exc_info.value)
\ No newline at end of file
+        assert "PDF read error" in str(exc_info.value)
+    
+    def test_iter_pdf_pages_is_lazy(self, mocker):
+        """Test pages are only loaded as the generator is consumed"""
+        mock_page = mocker.Mock()
+        mock_page.get_text.return_value = "Some page text"
+        
+        mock_doc = mocker.Mock()
+        mock_doc.page_count = 500
+        mock_doc.load_page.return_value = mock_page
+        
+        mock_fitz = mocker.patch('pdf_processor.fitz')
+        mock_fitz.open.return_value = mock_doc
+        
+        pages = iter_pdf_pages('test.pdf')
+        first = next(pages)
+        pages.close()
+        
+        assert first == {"page_number": 0, "text": "Some page text"}
+        assert mock_doc.load_page.call_count == 1
+        mock_doc.close.assert_called_once()
+    
+    def test_process_pdf_max_chars_stops_early(self, pdf_processor, mocker):
+        """Test process_pdf stops reading once max_chars is reached"""
+        mock_page = mocker.Mock()
+        mock_page.get_text.return_value = "x" * 100
+        
+        mock_doc = mocker.Mock()
+        mock_doc.page_count = 500
+        mock_doc.load_page.return_value = mock_page
+        
+        mock_fitz = mocker.patch('pdf_processor.fitz')
+        mock_fitz.open.return_value = mock_doc
+        
+        result = pdf_processor.process_pdf('test.pdf', max_chars=250)
+        
+        assert mock_doc.load_page.call_count == 3
+        assert len(result) >= 250
+        mock_doc.close.assert_called_once()
+    
+    def test_iter_pdf_pages_stats_on_request(self, mocker):
+        """Test per-page statistics are only computed when asked for"""
+        mock_page = mocker.Mock()
+        mock_page.get_text.return_value = "One two. Three"
+        
+        mock_doc = mocker.Mock()
+        mock_doc.page_count = 1
+        mock_doc.load_page.return_value = mock_page
+        
+        mock_fitz = mocker.patch('pdf_processor.fitz')
+        mock_fitz.open.return_value = mock_doc
+        
+        page = next(iter_pdf_pages('test.pdf', with_stats=True))
+        assert page['page_word_count'] == 3
+        assert page['page_sentence_count_raw'] == 2
+    
+    def _write_pdf(self, path, pages):
+        import fitz
+        doc = fitz.open()
+        for page_number in range(pages):
+            doc.new_page().insert_text((72, 72), f"Page {page_number} text")
+        doc.save(path)
+        doc.close()
+    
+    def test_parallel_read_pdf_keeps_page_order(self):
+        """Test chunks extracted in worker processes are merged in page order"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'many.pdf')
+            self._write_pdf(pdf_path, 10)
+            
+            pages = parallel_read_pdf(pdf_path, workers=2, chunk_size=3, min_pages=1)
+            
+            assert [page['page_number'] for page in pages] == list(range(10))
+            assert pages[7]['text'] == "Page 7 text"
+    
+    def test_parallel_read_pdf_small_document_is_serial(self, mocker):
+        """Test documents below min_pages never start a process pool"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'small.pdf')
+            self._write_pdf(pdf_path, 3)
+            pool = mocker.patch('pdf_processor.ProcessPoolExecutor')
+            
+            pages = parallel_read_pdf(pdf_path, workers=4, min_pages=64)
+            
+            assert len(pages) == 3
+            pool.assert_not_called()
+    
+    def test_process_pdf_from_memory(self, pdf_processor):
+        """Test bytes and memoryviews are read the same as the file they came from"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'doc.pdf')
+            self._write_pdf(pdf_path, 3)
+            with open(pdf_path, 'rb') as f:
+                data = f.read()
+            
+            expected = pdf_processor.process_pdf(pdf_path)
+            assert pdf_processor.process_pdf(data) == expected
+            assert pdf_processor.process_pdf(memoryview(bytearray(data))) == expected
+            assert pdf_processor.process_pdf(data, max_chars=5) == pdf_processor.process_pdf(pdf_path, max_chars=5)
+    
+    def test_parallel_read_pdf_spools_memory_for_the_pool(self, mocker):
+        """Test in-memory pdfs are written to a temp file for worker processes and removed after"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'many.pdf')
+            self._write_pdf(pdf_path, 6)
+            with open(pdf_path, 'rb') as f:
+                data = f.read()
+            remove = mocker.spy(os, 'remove')
+            
+            pages = parallel_read_pdf(memoryview(data), workers=2, chunk_size=2, min_pages=1)
+            
+            assert [page['text'] for page in pages] == [f"Page {n} text" for n in range(6)]
+            spooled = remove.call_args[0][0]
+            assert spooled.endswith('.pdf') and not os.path.exists(spooled)
+    
+    def test_process_pdf_reports_page_progress(self, pdf_processor):
+        """Test the progress callback sees every page, in every read mode"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'doc.pdf')
+            self._write_pdf(pdf_path, 4)
+            
+            for max_chars in (None, 10 ** 6):
+                seen = []
+                pdf_processor.process_pdf(pdf_path, max_chars=max_chars, progress=lambda done, total: seen.append((done, total)))
+                assert seen == [(1, 4), (2, 4), (3, 4), (4, 4)]
+            
+            seen = []
+            parallel_read_pdf(pdf_path, workers=2, chunk_size=2, min_pages=1, progress=lambda done, total: seen.append((done, total)))
+            assert seen == [(2, 4), (4, 4)]
@@ -0,0 +1,337 @@
+import pytest
+import json
+import os
+import tempfile
+from config import Config
+from celery.exceptions import Retry
+from models import Job, session_scope
+from github_service import GitHubUnavailableError
+from job_events import LocalPubSub, job_channel
+
+
+class TestScheduling:
+    @pytest.fixture(autouse=True)
+    def tasks(self, monkeypatch):
+        """Import tasks with the shared cache database kept out of the working tree"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.setattr(Config, 'CACHE_DB_PATH', os.path.join(tmpdir, 'cache.db'))
+            import tasks
+            yield tasks
+    
+    def test_processing_signature_uses_countdown(self, tasks, monkeypatch):
+        """Test the delay is a broker countdown on the first stage"""
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MIN', 5)
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MAX', 7)
+        
+        signature = tasks.processing_signature('job', '/tmp/job.pdf', task_id='task')
+        extract, classify, enrich = signature.tasks
+        
+        assert [stage.task for stage in signature.tasks] == ['pipeline.extract', 'pipeline.classify', 'pipeline.enrich']
+        assert extract.args == ('job', '/tmp/job.pdf')
+        assert 5 <= extract.options['countdown'] <= 7
+        assert 'countdown' not in classify.options
+        assert enrich.options['task_id'] == 'task'
+    
+    def test_stages_are_routed_to_their_own_queues(self, tasks):
+        """Test cpu and i/o stages land on separate queues"""
+        routes = tasks.celery_app.conf.task_routes
+        assert routes['pipeline.extract']['queue'] == Config.CELERY_QUEUE_EXTRACT
+        assert routes['pipeline.classify']['queue'] == Config.CELERY_QUEUE_CLASSIFY
+        assert routes['pipeline.enrich']['queue'] == Config.CELERY_QUEUE_ENRICH
+        assert len({route['queue'] for route in routes.values()}) == 3
+    
+    def test_task_results_are_not_stored(self, tasks):
+        """Test status comes from the jobs table, so the result backend is left empty"""
+        assert tasks.celery_app.conf.task_ignore_result is True
+        assert tasks.celery_app.conf.result_expires == Config.CELERY_RESULT_EXPIRES
+    
+    def test_delay_can_be_disabled(self, tasks, monkeypatch):
+        """Test a zero range schedules immediately"""
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MIN', 0)
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MAX', 0)
+        assert tasks.processing_delay() == 0
+    
+    def test_delay_minimum_above_maximum_is_clamped(self, tasks, monkeypatch):
+        """Test lowering only the maximum below the default minimum does not raise"""
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MIN', 30)
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MAX', 5)
+        assert tasks.processing_delay() == 5
+    
+    def test_schedule_processing_dispatches_chain(self, tasks, mocker, monkeypatch):
+        """Test single uploads are queued as one chain with a countdown"""
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MIN', 30)
+        monkeypatch.setattr(Config, 'PROCESSING_DELAY_MAX', 30)
+        apply_async = mocker.patch('celery.canvas._chain.apply_async')
+        
+        tasks.schedule_processing('job', '/tmp/job.pdf')
+        
+        assert apply_async.call_count == 1
+
+
+class TestPipelineStages:
+    @pytest.fixture
+    def tasks(self, monkeypatch):
+        """tasks module against a throwaway jobs database"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            import models
+            db_url = f"sqlite:///{os.path.join(tmpdir, 'jobs.db')}"
+            monkeypatch.setattr(models, '_default_url', db_url)
+            monkeypatch.setattr(Config, 'CACHE_DB_PATH', os.path.join(tmpdir, 'cache.db'))
+            models.init_db(db_url)
+            import tasks
+            monkeypatch.setattr(tasks, 'job_events', LocalPubSub())
+            yield tasks
+            models.dispose_engines()
+    
+    @pytest.fixture
+    def job_id(self, tasks):
+        with session_scope() as session:
+            job = Job(pdf_filename='brochure.pdf', status='pending')
+            session.add(job)
+            session.flush()
+            return job.job_id
+    
+    def _job(self, job_id):
+        with session_scope() as session:
+            job = session.query(Job).filter_by(job_id=job_id).first()
+            session.expunge(job)
+            return job
+    
+    def test_each_stage_persists_its_output(self, tasks, job_id, mocker):
+        """Test stages pass only the job id and store their results on the job"""
+        mocker.patch.object(tasks.pdf_processor, 'process_pdf', return_value='GitHub brochure')
+        remove_file = mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        mocker.patch.object(tasks.llm_batcher, 'extract_company_name', return_value='github')
+        mocker.patch.object(tasks.github_service, 'resolve_organization', return_value='github')
+        mocker.patch.object(tasks.github_service, 'enrich', return_value={
+            'org_login': 'github', 'org_info': {'login': 'github'}, 'members': [{'login': 'octocat'}], 'timed_out': []
+        })
+        
+        assert tasks.run_extract(job_id, '/tmp/brochure.pdf') == job_id
+        assert self._job(job_id).extracted_text == 'GitHub brochure'
+        assert self._job(job_id).status == 'processing'
+        remove_file.assert_called_once_with('/tmp/brochure.pdf')
+        
+        assert tasks.run_classify(job_id) == job_id
+        assert self._job(job_id).company_name == 'github'
+        
+        result = tasks.run_enrich(job_id)
+        assert result == {'status': 'completed', 'job_id': job_id, 'company_name': 'github', 'members_count': 1}
+        assert self._job(job_id).status == 'completed'
+        assert self._job(job_id).completed_stage == 'enrich'
+        assert self._job(job_id).org_login == 'github'
+    
+    def test_partial_enrichment_marks_job_degraded(self, tasks, job_id, mocker):
+        """Test a completed job whose member lookup timed out is flagged so dedup skips it"""
+        with session_scope() as session:
+            session.query(Job).filter_by(job_id=job_id).update({'completed_stage': 'classify', 'company_name': 'github'})
+        mocker.patch.object(tasks.github_service, 'resolve_organization', return_value='github')
+        mocker.patch.object(tasks.github_service, 'enrich', return_value={
+            'org_login': 'github', 'org_info': {'login': 'github'}, 'members': [], 'timed_out': ['members']
+        })
+        
+        tasks.run_enrich(job_id)
+        
+        job = self._job(job_id)
+        assert (job.status, job.degraded) == ('completed', 1)
+    
+    def test_stages_publish_transitions(self, tasks, job_id, mocker):
+        """Test every committed transition is announced on the job's channel"""
+        mocker.patch.object(tasks.pdf_processor, 'process_pdf', return_value='GitHub brochure')
+        mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        mocker.patch.object(tasks.llm_batcher, 'extract_company_name', return_value=None)
+        subscription = tasks.job_events.subscribe(job_channel(job_id))
+        
+        tasks.run_enrich(tasks.run_classify(tasks.run_extract(job_id, '/tmp/brochure.pdf')))
+        
+        events = []
+        while (event := subscription.get(timeout=0)) is not None:
+            events.append((event['status'], event['stage']))
+        #checkpoints and stage starts (progress writes) are both announced
+        assert events == [
+            ('processing', None), ('processing', 'extract'), ('processing', 'extract'),
+            ('processing', 'classify'), ('processing', 'classify'),
+            ('processing', 'enrich'), ('completed', 'enrich')
+        ]
+    
+    def test_stages_report_progress(self, tasks, job_id, mocker):
+        """Test each stage stores its progress on the job while it runs"""
+        seen = []
+        def process_pdf(path, max_chars=None, progress=None):
+            for page in range(1, 4):
+                progress(page, 3)
+            seen.append(json.loads(self._job(job_id).progress))
+            return 'GitHub brochure'
+        mocker.patch.object(tasks.pdf_processor, 'process_pdf', side_effect=process_pdf)
+        mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        mocker.patch.object(tasks.llm_batcher, 'extract_company_name',
+                            side_effect=lambda text: seen.append(json.loads(self._job(job_id).progress)) or 'github')
+        mocker.patch.object(tasks.github_service, 'resolve_organization', return_value='github')
+        mocker.patch.object(tasks.github_service, 'enrich', side_effect=lambda *a, **k: seen.append(
+            json.loads(self._job(job_id).progress)
+        ) or {'org_login': 'github', 'org_info': {'login': 'github'}, 'members': [], 'timed_out': []})
+        
+        tasks.run_extract(job_id, '/tmp/brochure.pdf', progress=tasks.ProgressReporter(job_id, min_interval=0))
+        tasks.run_classify(job_id)
+        tasks.run_enrich(job_id, progress=tasks.ProgressReporter(job_id, min_interval=0))
+        
+        assert seen[0] == {'stage': 'extract', 'current': 3, 'total': 3}
+        assert seen[1]['stage'] == 'classify'
+        assert seen[2]['stage'] == 'enrich'
+        assert seen[2]['calls'] == {'organization': 'done', 'org_info': 'pending', 'members': 'pending'}
+        assert (seen[2]['current'], seen[2]['total']) == (1, 3)
+        #finished jobs carry no progress
+        assert self._job(job_id).progress is None
+    
+    def test_page_updates_are_throttled(self, tasks, job_id):
+        """Test a long document costs a few writes, with the final count kept"""
+        reporter = tasks.ProgressReporter(job_id, min_interval=60)
+        
+        reporter.start('extract', total=0)
+        for page in range(1, 1001):
+            reporter.pages(page, 1000)
+        reporter.flush()
+        
+        assert reporter.writes == 2
+        assert json.loads(self._job(job_id).progress) == {'stage': 'extract', 'current': 1000, 'total': 1000}
+    
+    def test_progress_errors_are_ignored(self, tasks, job_id, mocker):
+        """Test a failed progress write never fails the stage"""
+        mocker.patch('tasks.session_scope', side_effect=RuntimeError('database locked'))
+        
+        reporter = tasks.ProgressReporter(job_id)
+        reporter.start('extract')
+        
+        assert reporter.writes == 0
+
+    def test_failed_stage_stops_the_chain(self, tasks, job_id, mocker):
+        """Test a failing stage marks the job failed and later stages do nothing"""
+        mocker.patch.object(tasks.pdf_processor, 'process_pdf', side_effect=RuntimeError('broken pdf'))
+        remove_file = mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        extract_company_name = mocker.patch.object(tasks.llm_batcher, 'extract_company_name')
+        
+        assert tasks.extract_pdf_task.apply(args=(job_id, '/tmp/brochure.pdf')).get() is None
+        assert tasks.classify_company_task.apply(args=(None,)).get() is None
+        assert tasks.enrich_company_task.apply(args=(None,)).get() is None
+        
+        assert extract_company_name.call_count == 0
+        #a permanent failure still cleans up the upload
+        remove_file.assert_called_once_with('/tmp/brochure.pdf')
+        job = self._job(job_id)
+        assert job.status == 'failed'
+        assert job.error_message == 'broken pdf'
+    
+    def test_retry_resumes_after_last_checkpoint(self, tasks, job_id, mocker):
+        """Test a retried job skips stages whose output is already stored"""
+        process_pdf = mocker.patch.object(tasks.pdf_processor, 'process_pdf', return_value='GitHub brochure')
+        mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        extract_company_name = mocker.patch.object(tasks.llm_batcher, 'extract_company_name', return_value='github')
+        mocker.patch.object(tasks.github_service, 'resolve_organization', return_value='github')
+        mocker.patch.object(tasks.github_service, 'enrich', side_effect=[
+            GitHubUnavailableError('rate limited'),
+            {'org_login': 'github', 'org_info': {'login': 'github'}, 'members': [], 'timed_out': []}
+        ])
+        
+        tasks.run_extract(job_id, '/tmp/brochure.pdf')
+        tasks.run_classify(job_id)
+        with pytest.raises(GitHubUnavailableError):
+            tasks.run_enrich(job_id)
+        assert self._job(job_id).completed_stage == 'classify'
+        
+        #a full re-run only repeats the enrich stage
+        tasks.run_enrich(tasks.run_classify(tasks.run_extract(job_id, '/tmp/brochure.pdf')))
+        assert process_pdf.call_count == 1
+        assert extract_company_name.call_count == 1
+        assert self._job(job_id).status == 'completed'
+    
+    def test_resumed_stage_marks_job_processing(self, tasks, job_id, mocker):
+        """Test a job resumed after extract shows as running while its later stages work"""
+        with session_scope() as session:
+            session.query(Job).filter_by(job_id=job_id).update({'completed_stage': 'extract', 'extracted_text': 'x'})
+        seen = []
+        def classify(text):
+            seen.append(self._job(job_id).stage_status())
+            return None
+        mocker.patch.object(tasks.llm_batcher, 'extract_company_name', side_effect=classify)
+        subscription = tasks.job_events.subscribe(job_channel(job_id))
+        
+        tasks.run_classify(job_id)
+        
+        assert seen == [{'extract': 'done', 'classify': 'running', 'enrich': 'pending'}]
+        assert subscription.get(timeout=0)['status'] == 'processing'
+    
+    def test_transient_error_schedules_retry_with_backoff(self, tasks, job_id, mocker):
+        """Test a retryable error reschedules the stage and keeps the job processing"""
+        task = mocker.Mock()
+        task.request.retries = 1
+        task.retry.return_value = Retry()
+        stage = mocker.Mock(side_effect=GitHubUnavailableError('rate limited'), __name__='run_enrich')
+        
+        with pytest.raises(Retry):
+            tasks._run_stage(task, stage, job_id)
+        
+        task.retry.assert_called_once()
+        assert task.retry.call_args.kwargs['countdown'] == Config.TASK_RETRY_BACKOFF * 2
+        job = self._job(job_id)
+        assert job.status == 'pending'
+        assert job.retry_count == 2
+        assert job.error_message == 'rate limited'
+    
+    def test_exhausted_retries_fail_the_job(self, tasks, job_id, mocker):
+        """Test a retryable error fails the job once retries are used up"""
+        task = mocker.Mock()
+        task.request.retries = Config.TASK_MAX_RETRIES
+        stage = mocker.Mock(side_effect=GitHubUnavailableError('rate limited'), __name__='run_enrich')
+        
+        assert tasks._run_stage(task, stage, job_id) is None
+        assert task.retry.call_count == 0
+        assert self._job(job_id).status == 'failed'
+    
+    def test_retry_limit_above_celery_default(self, tasks, job_id, mocker, monkeypatch):
+        """Test TASK_MAX_RETRIES above celery's default of 3 is honoured and still ends in failed"""
+        monkeypatch.setattr(Config, 'TASK_MAX_RETRIES', 5)
+        run_enrich = mocker.patch('tasks.run_enrich', side_effect=GitHubUnavailableError('rate limited'))
+        run_enrich.__name__ = 'run_enrich'
+        
+        tasks.enrich_company_task.apply(args=(job_id,), retries=3)
+        
+        #retries 3 and 4 run, the 6th attempt gives up
+        assert run_enrich.call_count == 3
+        job = self._job(job_id)
+        assert job.status == 'failed'
+        assert job.retry_count == 5
+    
+    def test_checkpoint_clears_the_stage_retries(self, tasks, job_id, mocker):
+        """Test a retried stage that succeeds does not leave later stages showing 'retrying'"""
+        mocker.patch.object(tasks.pdf_processor, 'process_pdf', return_value='GitHub brochure')
+        mocker.patch.object(tasks.pdf_processor, 'remove_file')
+        with session_scope() as session:
+            session.query(Job).filter_by(job_id=job_id).update({'retry_count': 1, 'error_message': 'database locked'})
+        
+        tasks.run_extract(job_id, '/tmp/brochure.pdf')
+        
+        job = self._job(job_id)
+        assert (job.retry_count, job.error_message) == (0, None)
+        assert job.stage_status()['classify'] == 'running'
+    
+    def test_refused_retry_fails_the_job(self, tasks, job_id, mocker):
+        """Test a retry celery will not schedule (it re-raises the error) still fails the job"""
+        task = mocker.Mock()
+        task.request.retries = 0
+        task.retry.side_effect = GitHubUnavailableError('rate limited')
+        stage = mocker.Mock(side_effect=GitHubUnavailableError('rate limited'), __name__='run_enrich')
+        
+        assert tasks._run_stage(task, stage, job_id) is None
+        assert self._job(job_id).status == 'failed'
+    
+    def test_resume_signature_starts_at_first_incomplete_stage(self, tasks, job_id):
+        """Test resuming a job only chains the stages it has not finished"""
+        job = self._job(job_id)
+        assert [t.task for t in tasks.resume_signature(job, '/tmp/x.pdf').tasks] == [
+            'pipeline.extract', 'pipeline.classify', 'pipeline.enrich'
+        ]
+        
+        job.completed_stage = 'classify'
+        signature = tasks.resume_signature(job, '/tmp/x.pdf')
+        assert [t.task for t in signature.tasks] == ['pipeline.enrich']
+        assert signature.tasks[0].args == (job_id,)
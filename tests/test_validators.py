@@ -1,8 +1,5 @@
-import pytest
-from flask import Flask, request
-from validators import validate_job_id, validate_file_upload
-from werkzeug.datastructures import FileStorage
-from io import BytesIO
+from flask import Flask
+from validators import validate_job_id
 
 
 class TestValidators:
@@ -43,44 +40,3 @@ class TestValidators:
                 response = client.get(f'/test/{invalid_id}')
                 assert response.status_code == 400
                 assert 'Invalid job ID format' in response.json['error']
-    
-    def test_validate_file_upload_valid(self):
-        """Test valid file upload"""
-        app = Flask(__name__)
-        
-        with app.test_request_context(
-            method='POST',
-            data={'file': (BytesIO(b'PDF content'), 'test.pdf')}
-        ):
-            errors = validate_file_upload(request)
-            assert errors == []
-    
-    def test_validate_file_upload_no_file(self):
-        """Test upload with no file"""
-        app = Flask(__name__)
-        
-        with app.test_request_context(method='POST'):
-            errors = validate_file_upload(request)
-            assert 'No file part in request' in errors
-    
-    def test_validate_file_upload_empty_filename(self):
-        """Test upload with empty filename"""
-        app = Flask(__name__)
-        
-        with app.test_request_context(
-            method='POST',
-            data={'file': (BytesIO(b''), '')}
-        ):
-            errors = validate_file_upload(request)
-            assert 'No file selected' in errors
-    
-    def test_validate_file_upload_invalid_type(self):
-        """Test upload with non-PDF file"""
-        app = Flask(__name__)
-        
-        with app.test_request_context(
-            method='POST',
-            data={'file': (BytesIO(b'Text content'), 'test.txt')}
-        ):
-            errors = validate_file_upload(request)
-            assert 'Invalid file type. Only PDF files are allowed' in errors
\ No newline at end of file
@@ -2,34 +2,53 @@ import re
 from functools import wraps
 from flask import jsonify
 
+#UUID pattern: 8-4-4-4-12 hexadecimal characters
+UUID_PATTERN = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+    re.IGNORECASE
+)
+
 def validate_job_id(func):
     """decorator to validate job_id format (UUID)"""
     @wraps(func)
     def wrapper(job_id, *args, **kwargs):
-        #UUID pattern: 8-4-4-4-12 hexadecimal characters
-        uuid_pattern = re.compile(
-            r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-            re.IGNORECASE
-        )
-        
-        if not uuid_pattern.match(job_id):
+        if not UUID_PATTERN.match(job_id):
             return jsonify({'error': 'Invalid job ID format'}), 400
         
         return func(job_id, *args, **kwargs)
     
     return wrapper
 
-def validate_file_upload(request):
-    """validate file upload request"""
+def validate_batch_id(func):
+    """decorator to validate batch_id format (UUID)"""
+    @wraps(func)
+    def wrapper(batch_id, *args, **kwargs):
+        if not UUID_PATTERN.match(batch_id):
+            return jsonify({'error': 'Invalid batch ID format'}), 400
+        
+        return func(batch_id, *args, **kwargs)
+    
+    return wrapper
+
+def parse_list_params(request, default_limit=50, max_limit=200):
+    """parse pagination and filter query params for the documents listing"""
     errors = []
+    params = {
+        'limit': default_limit,
+        'cursor': request.args.get('cursor') or None,
+        'status': request.args.get('status') or None,
+        'company': request.args.get('company') or None,
+    }
     
-    if 'file' not in request.files:
-        errors.append('No file part in request')
-    else:
-        file = request.files['file']
-        if file.filename == '':
-            errors.append('No file selected')
-        elif not file.filename.lower().endswith('.pdf'):
-            errors.append('Invalid file type. Only PDF files are allowed')
+    raw_limit = request.args.get('limit')
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            errors.append('Invalid limit. Must be an integer')
+        else:
+            if limit < 1:
+                errors.append('Invalid limit. Must be at least 1')
+            params['limit'] = min(limit, max_limit)
     
-    return errors
\ No newline at end of file
+    return params, errors